@@ -3,6 +3,17 @@ import time
 import threading # For sound playback
 import math # For rounding in physics
 import collections # For deque to track keys
+import base64 # For handing PNG sprite data to Tk
+import struct # For packing PNG chunks
+import zlib # For compressing PNG sprite data
+import hashlib # For content-hashing cached sprites
+import os # For the on-disk sprite cache
+import argparse # For the record/replay command line
+import sys # For the sampling profiler's peek at every thread's stack
+import operator # For the framebuffer's no-NumPy scaler
+import bisect # For dropping latencies into histogram buckets
+import json # For the --telemetry export
+from frame_pacing import FramePacer, FRAME_PACER_EVENT # Shared with every other game script
 
 # Attempt to import sound libraries
 SOUND_ENABLED = False
@@ -15,6 +26,14 @@ except ImportError:
     print("WARNING: numpy or simpleaudio library not found. Sound will be DISABLED. No purrs for you!")
     print("Please install them by running: pip install numpy simpleaudio. It's super easy, peasy, lemon squeezy!")
 
+# numpy on its own is enough for BatchMarioSimulation, no speakers required
+NUMPY_ENABLED = False
+try:
+    import numpy as np
+    NUMPY_ENABLED = True
+except ImportError:
+    pass
+
 # --- Game Constants ---
 NES_SCREEN_WIDTH = 256
 NES_SCREEN_HEIGHT = 240
@@ -25,14 +44,28 @@ PLAYER_SIZE = 16 # NES pixels (16x16 sprite)
 GRAVITY = 0.5
 JUMP_POWER = 8
 MOVE_SPEED = 2
-FPS = 60
-DELAY_MS = 1000 // FPS # Milliseconds per frame
+FPS = 60 # Target render rate
+SIMULATION_HZ = 60 # Fixed physics ticks per second, independent of how often we get to render
+PHYSICS_TUNING_HZ = 60 # GRAVITY, JUMP_POWER and MOVE_SPEED are per-tick at this rate; other rates get scaled to match
+MAX_CATCH_UP_TICKS = 5 # Most ticks one slow frame may run. Further behind than that, the game slows instead of spiralling
+FRAME_BUDGET_MS = 1000 / 60 # A frame that takes longer than this is a missed deadline on a 60 Hz display
+
+def display_zoom(display_width, display_height):
+    """
+    Whole display pixels per NES pixel that fit the display: 3 at 800x750, 9 at 4K. Sprites are rasterized once at NES
+    size and PhotoImage-zoomed by this, and whatever's left over around the 256x240 picture is letterboxed.
+    """
+    return max(1, min(display_width // NES_SCREEN_WIDTH, display_height // NES_SCREEN_HEIGHT))
 
 # --- World Dimensions for SMB 1-1 (in NES pixels) ---
 WORLD_WIDTH_BLOCKS = 210
 WORLD_WIDTH_NES = WORLD_WIDTH_BLOCKS * PLAYER_SIZE
 WORLD_HEIGHT_NES = NES_SCREEN_HEIGHT
 
+# --- Static Layer Chunks ---
+CHUNK_COLUMNS = 16 # Level columns baked into each pre-rendered chunk image (16 columns = one NES screen)
+CHUNK_WIDTH_NES = CHUNK_COLUMNS * PLAYER_SIZE
+
 
 # --- Pixel Art Data ---
 # Mario Sprites (Simplified for this example)
@@ -126,6 +159,1730 @@ FLAGPOLE_POLE_SPRITE_DATA = { # Native is 2x16 pixels
 }
 # --- End of Pixel Art Data ---
 
+# --- Sprite Rasterizer ---
+# Builds a whole sprite image in one go (a PNG byte buffer) instead of poking
+# every display pixel into a PhotoImage with its own Tcl call. Zoom zoom!
+TRANSPARENT_RGBA = b"\x00\x00\x00\x00"
+
+def parse_hex_color(color):
+    """'#RRGGBB' or '#RGB' -> bytes((r, g, b, 255)). Anything else -> None (treated as transparent)."""
+    if not color or color[0] != '#':
+        return None
+    hex_digits = color[1:]
+    if len(hex_digits) == 3:
+        hex_digits = ''.join(digit * 2 for digit in hex_digits)
+    if len(hex_digits) != 6:
+        return None
+    try:
+        return bytes.fromhex(hex_digits) + b"\xff"
+    except ValueError:
+        return None
+
+def resolve_sprite_colors(sprite_definition, color_map):
+    """Maps each pixel char of a sprite to its hex color via the CATOS COLOR_MAP. None colors are dropped (transparent)."""
+    return {
+        char_key: color_map.get(mapped_color_key)
+        for char_key, mapped_color_key in sprite_definition["colors"].items()
+        if mapped_color_key is not None
+    }
+
+def rasterize_sprite_rows(pixel_rows, resolved_colors, width, height):
+    """
+    Scales the pixel-art rows to width x height and returns `height` RGBA scanlines (bytes).
+    Uses the same rounding as the old per-pixel put loop, so the output is identical to it.
+    """
+    native_h = len(pixel_rows)
+    native_w = len(pixel_rows[0]) if native_h > 0 else 0
+    if width <= 0 or height <= 0 or native_w == 0:
+        return []
+
+    rgba_for_char = {}
+    for char_key, color in resolved_colors.items():
+        rgba = parse_hex_color(color)
+        if rgba is not None: rgba_for_char[char_key] = rgba
+
+    pixel_w = width / native_w
+    pixel_h = height / native_h
+    # Display-x span of every native column, computed once per sprite instead of once per pixel!
+    max_row_len = max(len(row_str) for row_str in pixel_rows)
+    column_spans = [(min(round(c_idx * pixel_w), width), min(round((c_idx + 1) * pixel_w), width))
+                    for c_idx in range(max_row_len)]
+
+    blank_line = TRANSPARENT_RGBA * width
+    scanlines = [blank_line] * height
+    for r_idx, row_str in enumerate(pixel_rows):
+        y1 = max(0, round(r_idx * pixel_h))
+        y2 = min(height, round((r_idx + 1) * pixel_h))
+        if y1 >= y2: continue
+        line = bytearray(blank_line)
+        for c_idx, color_char_key in enumerate(row_str):
+            rgba = rgba_for_char.get(color_char_key)
+            if rgba is None: continue
+            x1, x2 = column_spans[c_idx]
+            if x1 < x2: line[x1 * 4:x2 * 4] = rgba * (x2 - x1)
+        line = bytes(line)
+        for y_px in range(y1, y2):
+            scanlines[y_px] = line
+    return scanlines
+
+def encode_png_rgba(scanlines, width, height):
+    """Packs RGBA scanlines into a PNG byte buffer. Only zlib and struct needed, no Pillow required!"""
+    def png_chunk(chunk_type, payload):
+        return (struct.pack(">I", len(payload)) + chunk_type + payload +
+                struct.pack(">I", zlib.crc32(chunk_type + payload) & 0xFFFFFFFF))
+
+    raw_image = b"".join(b"\x00" + line for line in scanlines) # Filter type 0 (None) for every scanline
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0) # 8-bit RGBA
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header) +
+            png_chunk(b"IDAT", zlib.compress(raw_image, 1)) + png_chunk(b"IEND", b""))
+
+def rasterize_sprite_png(pixel_rows, resolved_colors, width, height):
+    """Rasterizes a sprite straight into PNG bytes, or None if the size or art is empty."""
+    scanlines = rasterize_sprite_rows(pixel_rows, resolved_colors, width, height)
+    if not scanlines: return None
+    return encode_png_rgba(scanlines, width, height)
+
+def photo_image_from_png(png_bytes, master=None):
+    """Turns PNG bytes into a tk.PhotoImage with a single Tcl call. Transparency comes along for free!"""
+    return tk.PhotoImage(master=master, data=base64.b64encode(png_bytes).decode("ascii"), format="png")
+# --- End of Sprite Rasterizer ---
+
+# --- On-Disk Sprite Cache ---
+# Rasterized sprites survive between launches as PNG files, keyed by what they look like.
+SPRITE_CACHE_DIR = os.environ.get("CATOS_SPRITE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "catos_mario", "sprites"))
+SPRITE_CACHE_MAX_BYTES = 16 * 1024 * 1024 # LRU eviction kicks in above this, no hoarding!
+SPRITE_CACHE_FORMAT_VERSION = 1 # Bump when the rasterizer output changes, so old files never match again
+
+class SpriteDiskCache:
+    """
+    Stores rasterized sprites as PNG files named after a hash of their pixel rows, resolved colors and size.
+    A changed sprite or palette gives a new key, so stale files are never loaded; they just age out
+    through LRU eviction (file mtime is bumped on every hit).
+    """
+    def __init__(self, cache_dir=SPRITE_CACHE_DIR, max_bytes=SPRITE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.total_bytes = sum(size for _, size, _ in self._cached_files())
+        except OSError as e:
+            print(f"SpriteDiskCache: Can't use {self.cache_dir} ({e}). Sprites will be rasterized every launch.")
+            self.enabled = False
+            self.total_bytes = 0
+        self._evict_if_needed()
+
+    @staticmethod
+    def make_key(pixel_rows, resolved_colors, width, height):
+        hasher = hashlib.sha1()
+        hasher.update(f"v{SPRITE_CACHE_FORMAT_VERSION}|{width}x{height}|".encode())
+        hasher.update("\n".join(pixel_rows).encode())
+        hasher.update(repr(sorted(resolved_colors.items(), key=lambda item: item[0])).encode())
+        return hasher.hexdigest()
+
+    def _path_for(self, key):
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def _cached_files(self):
+        """(path, size, last_used) for every cached PNG."""
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(".png"): continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue # Someone else evicted it first, no worries!
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def load(self, key, master=None):
+        """Returns a PhotoImage loaded straight from the cached file, or None on a miss."""
+        if not self.enabled: return None
+        path = self._path_for(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            img = tk.PhotoImage(master=master, file=path)
+            os.utime(path) # Mark as recently used for LRU
+        except (OSError, tk.TclError):
+            self._remove(path) # Corrupt or half-written file, toss it!
+            self.misses += 1
+            return None
+        self.hits += 1
+        return img
+
+    def store(self, key, png_bytes):
+        if not self.enabled or png_bytes is None: return
+        path = self._path_for(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(temp_path, "wb") as cache_file:
+                cache_file.write(png_bytes)
+            os.replace(temp_path, path) # Atomic, so a crash never leaves a torn PNG behind
+        except OSError as e:
+            print(f"SpriteDiskCache: Failed to write {path}: {e}")
+            self._remove(temp_path)
+            return
+        self.total_bytes += len(png_bytes) - old_size
+        self._evict_if_needed()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    def _evict_if_needed(self):
+        if not self.enabled or self.total_bytes <= self.max_bytes: return
+        entries = sorted(self._cached_files(), key=lambda entry: entry[2]) # Least recently used first
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for path, _, _ in entries:
+            if self.total_bytes <= self.max_bytes: break
+            self.total_bytes -= self._remove(path)
+# --- End of On-Disk Sprite Cache ---
+
+# --- Level Visibility Index ---
+class ColumnVisibilityIndex:
+    """
+    Buckets level items by the block columns they cover. Moving the view only looks at the columns
+    scrolling in or out, so the per-frame cost stays flat no matter how wide the level gets.
+    on_enter(item) / on_exit(item) fire once each time an item starts / stops overlapping the view.
+    """
+    def __init__(self, column_width_nes=PLAYER_SIZE, on_enter=None, on_exit=None):
+        self.column_width_nes = column_width_nes
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.columns = {} # column -> [item, ...]
+        self.item_spans = {} # id(item) -> (first_column, last_column)
+        self.visible_items = {} # id(item) -> item
+        self.first_visible = 0
+        self.last_visible = -1 # Nothing is in view until the first update()
+
+    def column_span(self, x1_nes, x2_nes):
+        """First and last column the NES x-span [x1_nes, x2_nes) touches."""
+        first_column = int(x1_nes // self.column_width_nes)
+        last_column = int(math.ceil(x2_nes / self.column_width_nes)) - 1
+        return first_column, max(first_column, last_column)
+
+    def _in_view(self, first_column, last_column):
+        return first_column <= self.last_visible and last_column >= self.first_visible
+
+    def add(self, item, x1_nes, x2_nes):
+        first_column, last_column = self.column_span(x1_nes, x2_nes)
+        self.item_spans[id(item)] = (first_column, last_column)
+        for column in range(first_column, last_column + 1):
+            self.columns.setdefault(column, []).append(item)
+        if self._in_view(first_column, last_column): self._enter(item)
+
+    def remove(self, item):
+        span = self.item_spans.pop(id(item), None)
+        if span is None: return
+        for column in range(span[0], span[1] + 1):
+            bucket = self.columns.get(column, [])
+            for i, bucket_item in enumerate(bucket):
+                if bucket_item is item: # Identity, two tiles can look exactly alike!
+                    del bucket[i]
+                    break
+        if id(item) in self.visible_items: self._exit(item)
+
+    def update(self, left_nes, right_nes):
+        """Moves the view to [left_nes, right_nes), firing exit events first and then enter events."""
+        first_column, last_column = self.column_span(left_nes, right_nes)
+        old_first, old_last = self.first_visible, self.last_visible
+        if (first_column, last_column) == (old_first, old_last): return
+        self.first_visible, self.last_visible = first_column, last_column
+
+        for column in range(old_first, old_last + 1): # Columns that scrolled out
+            if first_column <= column <= last_column: continue
+            for item in self.columns.get(column, ()):
+                if id(item) in self.visible_items and not self._in_view(*self.item_spans[id(item)]):
+                    self._exit(item)
+        for column in range(first_column, last_column + 1): # Columns that scrolled in
+            if old_first <= column <= old_last: continue
+            for item in self.columns.get(column, ()):
+                if id(item) not in self.visible_items: self._enter(item)
+
+    def _enter(self, item):
+        self.visible_items[id(item)] = item
+        if self.on_enter: self.on_enter(item)
+
+    def _exit(self, item):
+        del self.visible_items[id(item)]
+        if self.on_exit: self.on_exit(item)
+# --- End of Level Visibility Index ---
+
+# --- Collision Grid ---
+class CollisionGrid:
+    """
+    Uniform grid over the level. Every solid rect is filed under each cell it overlaps, so
+    "which solids overlap this box?" only looks at a few cells instead of every platform in the level.
+    Candidates come back in insertion order, the same order a scan of the flat list would see them in.
+    """
+    def __init__(self, cell_size_nes=PLAYER_SIZE):
+        self.cell_size_nes = cell_size_nes
+        self.cells = {} # (cell_x, cell_y) -> [rect_id, ...]
+        self.rects = {} # rect_id -> (left, top, right, bottom) in NES pixels
+        self.ids_by_rect = {} # rect -> [rect_id, ...], so equal rects can be removed one at a time
+        self.next_rect_id = 0
+
+    def _cells_for(self, left, top, right, bottom):
+        """Every cell the half-open box [left, right) x [top, bottom) touches."""
+        size = self.cell_size_nes
+        first_x, first_y = int(left // size), int(top // size)
+        last_x = max(first_x, int(math.ceil(right / size)) - 1)
+        last_y = max(first_y, int(math.ceil(bottom / size)) - 1)
+        return [(cell_x, cell_y) for cell_x in range(first_x, last_x + 1) for cell_y in range(first_y, last_y + 1)]
+
+    def insert(self, rect):
+        rect = tuple(rect)
+        rect_id = self.next_rect_id
+        self.next_rect_id += 1
+        self.rects[rect_id] = rect
+        self.ids_by_rect.setdefault(rect, []).append(rect_id)
+        for cell in self._cells_for(*rect):
+            self.cells.setdefault(cell, []).append(rect_id)
+        return rect_id
+
+    def remove(self, rect):
+        rect = tuple(rect)
+        rect_ids = self.ids_by_rect.get(rect)
+        if not rect_ids: return
+        rect_id = rect_ids.pop(0) # Oldest first, just like list.remove
+        if not rect_ids: del self.ids_by_rect[rect]
+        del self.rects[rect_id]
+        for cell in self._cells_for(*rect):
+            self.cells[cell].remove(rect_id)
+
+    def query_ids(self, left, top, right, bottom):
+        """Ids (as insert() returned them) of the rects sharing a cell with the box, in insertion order."""
+        rect_ids = set()
+        for cell in self._cells_for(left, top, right, bottom):
+            rect_ids.update(self.cells.get(cell, ()))
+        return sorted(rect_ids)
+
+    def query(self, left, top, right, bottom):
+        """Solid rects sharing a cell with the box. Still do your own AABB test, these are just candidates!"""
+        return [self.rects[rect_id] for rect_id in self.query_ids(left, top, right, bottom)]
+
+    def __len__(self):
+        return len(self.rects)
+
+SWEEP_SKIN_NES = 1 # A solid Mario already sinks into by up to this much still stops him (old landing tolerance)
+SWEEP_MAX_STEP_NES = PLAYER_SIZE / 2 # Moves longer than this get split into sub-steps
+
+def sweep_box_along_axis(collision_grid, box, delta, axis, skin=SWEEP_SKIN_NES):
+    """
+    Slides box (left, top, right, bottom) by delta along axis 0 (x) or 1 (y) and stops it at the first
+    solid in its path, however far it moves: no more tunneling through one-block-thick bricks!
+    Solids the box is already deeper than `skin` inside are ignored, so Mario can never get stuck in one.
+    Returns (new left/top edge, the rect that stopped it or None).
+    """
+    low_edge, high_edge = box[axis], box[axis + 2]
+    box_size = high_edge - low_edge
+    cross = 1 - axis
+    swept_box = list(box)
+    if delta > 0: swept_box[axis + 2] += delta
+    else: swept_box[axis] += delta
+
+    new_low_edge, hit_rect = low_edge + delta, None
+    for rect in collision_grid.query(*swept_box):
+        if not (rect[cross + 2] > box[cross] and rect[cross] < box[cross + 2]): continue # Beside the path, not in it
+        if delta > 0:
+            # Time of impact is where our leading edge meets its near side; nearest one wins
+            if high_edge - skin <= rect[axis] < high_edge + delta and rect[axis] - box_size < new_low_edge:
+                new_low_edge, hit_rect = rect[axis] - box_size, rect
+        elif low_edge + delta < rect[axis + 2] <= low_edge + skin and rect[axis + 2] > new_low_edge:
+            new_low_edge, hit_rect = rect[axis + 2], rect
+    return new_low_edge, hit_rect
+# --- End of Collision Grid ---
+
+# --- SMB 1-1 Level Layout ---
+def level_block_tiles(map_x_blocks, map_y_bottom_blocks, type_str, sprite_data, width_blocks=1, height_blocks=1, collidable=True):
+    """
+    Breaks a block of the level into individual PLAYER_SIZE tiles (flagpole poles into 2x16 segments).
+    Bug 3 fix: Every tile is its own little dict now, so clean, so powerful!
+    Bug 13 fix: Handles pipes and flagpole tiling logic. So much precision, it's criminal!
+    """
+    PS = PLAYER_SIZE
+    H_NES = NES_SCREEN_HEIGHT
+    tiles = []
+
+    if type_str == 'flagpole_pole':
+        # Bug 4 fix: Proper flagpole dimensions and tiling, it's a pole party!
+        pole_native_width_nes = len(FLAGPOLE_POLE_SPRITE_DATA["pixels"][0]) # 2
+        pole_native_height_nes = len(FLAGPOLE_POLE_SPRITE_DATA["pixels"]) # 16
+
+        # Bug 20 fix: Better calculation for flagpole X position relative to its base. So calculated!
+        # Flagpole base is at (142, 1) in blocks. Center pole over base.
+        base_x_nes_center = (map_x_blocks * PS) + (PS / 2)
+        tile_x1_nes_base = base_x_nes_center - (pole_native_width_nes / 2) # Start X of the pole
+
+        # Bottom of pole is aligned with the top of the ground (y=H_NES - PS)
+        # height_blocks is the total span, in PLAYER_SIZE units
+        tile_y2_nes_base = H_NES - (map_y_bottom_blocks * PS) # Bottom Y of this whole structure
+
+        # Now, tile the pole segments, piece by pixelated piece!
+        for y_offset_px in range(0, height_blocks * PS, pole_native_height_nes):
+            tile_y1_nes = tile_y2_nes_base - (height_blocks * PS) + y_offset_px # Top Y of current segment
+            tiles.append({
+                'coords_nes': (tile_x1_nes_base, tile_y1_nes, tile_x1_nes_base + pole_native_width_nes, tile_y1_nes + pole_native_height_nes),
+                'type': type_str, 'collidable': collidable, 'sprite_data': sprite_data,
+            })
+        return tiles # Special case handled, mission accomplished!
+
+    # For regular blocks (ground, brick, question, pipe top/middle)
+    for row in range(height_blocks):
+        for col in range(width_blocks):
+            tile_x1_nes = (map_x_blocks + col) * PS
+            # Calculate Y from bottom-most block coordinate
+            tile_y1_nes = H_NES - (map_y_bottom_blocks + height_blocks -1 - row) * PS
+
+            current_sprite_data = sprite_data
+            current_type_str = type_str
+
+            # Bug 13 fix: Logic for drawing pipe middle sections, making them perfectly vertical!
+            if 'pipe' in type_str and height_blocks > 1 and row < height_blocks - 1: # If it's a pipe and not the top segment
+                current_sprite_data = PIPE_MIDDLE_DATA
+                current_type_str = type_str + '_middle' # Distinguish pipe middle tiles
+
+            tiles.append({
+                'coords_nes': (tile_x1_nes, tile_y1_nes, tile_x1_nes + PS, tile_y1_nes + PS),
+                'type': current_type_str, 'collidable': collidable, 'sprite_data': current_sprite_data,
+            })
+    return tiles
+
+def build_smb_1_1_tiles():
+    """Every tile of SMB 1-1, in level order. Pure data, no Tk needed!"""
+    tiles = []
+    def add(*args, **kwargs): tiles.extend(level_block_tiles(*args, **kwargs))
+
+    # Ground Segments, building the foundation of fun!
+    add(0, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=69)
+    add(71, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=15)
+    add(90, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=44)
+    add(136, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=(WORLD_WIDTH_BLOCKS - 136))
+
+    # Blocks, so many blocks to bash!
+    add(16, 5, 'question_block_powerup', QUESTION_BLOCK_DATA)
+    add(20, 5, 'brick', BRICK_BLOCK_DATA)
+    add(21, 5, 'question_block_coin', QUESTION_BLOCK_DATA)
+    add(22, 5, 'brick', BRICK_BLOCK_DATA)
+    add(23, 5, 'question_block_coin', QUESTION_BLOCK_DATA)
+    add(22, 9, 'question_block_1up', QUESTION_BLOCK_DATA) # Hidden 1-UP, super secret!
+
+    # Pipes - now they look properly structured, perfectly plumbed!
+    add(28, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=2)
+    add(38, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=3)
+    add(46, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=4)
+    add(57, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=4)
+
+    add(77, 5, 'brick', BRICK_BLOCK_DATA)
+    add(78, 5, 'brick_coin', BRICK_BLOCK_DATA)
+    add(79, 5, 'brick_star', BRICK_BLOCK_DATA)
+    add(80, 5, 'brick', BRICK_BLOCK_DATA)
+
+    add(90, 5, 'brick', BRICK_BLOCK_DATA)
+    add(91, 5, 'brick', BRICK_BLOCK_DATA)
+    add(92, 5, 'question_block_powerup', QUESTION_BLOCK_DATA)
+    add(93, 5, 'brick', BRICK_BLOCK_DATA)
+    add(92, 9, 'brick_high', BRICK_BLOCK_DATA)
+
+    def add_stair_segment(base_x_blocks, base_y_bottom_blocks, height_in_blocks_for_step):
+        add(base_x_blocks, base_y_bottom_blocks, 'ground_stair', GROUND_BLOCK_DATA, width_blocks=1, height_blocks=height_in_blocks_for_step)
+
+    # Pyramids / Stairs, climb them all to reach the top, purr-fectly!
+    add_stair_segment(100, 1, 1); add_stair_segment(101, 1, 2); add_stair_segment(102, 1, 3); add_stair_segment(103, 1, 4)
+    add(106, 5, 'brick', BRICK_BLOCK_DATA); add(107, 5, 'brick', BRICK_BLOCK_DATA); add(108, 5, 'brick', BRICK_BLOCK_DATA)
+    add_stair_segment(113, 1, 1); add_stair_segment(114, 1, 2); add_stair_segment(115, 1, 3); add_stair_segment(116, 1, 4)
+    add(118, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=2)
+    add(123, 5, 'brick', BRICK_BLOCK_DATA); add(124, 5, 'brick', BRICK_BLOCK_DATA)
+    add(125, 5, 'question_block_powerup', QUESTION_BLOCK_DATA); add(126, 5, 'brick', BRICK_BLOCK_DATA)
+    for i in range(8): add_stair_segment(134 + i, 1, i + 1) # Final staircase, all the way up!
+
+    # Bug 14 fix: Flagpole base is collidable, Mario needs to climb it! So tactical!
+    add(142, 1, 'flagpole_base', FLAGPOLE_BASE_BLOCK_DATA, width_blocks=1, height_blocks=1, collidable=True)
+    # Bug 4 & 14 fix: Flagpole pole is now tiled and collidable! So much fun!
+    add(142, 1, 'flagpole_pole', FLAGPOLE_POLE_SPRITE_DATA, height_blocks=9, collidable=True)
+    return tiles
+
+def level_width_nes(level_tiles):
+    """How far right a level goes: its rightmost tile edge, and never narrower than 1-1's world."""
+    return max([WORLD_WIDTH_NES] + [tile['coords_nes'][2] for tile in level_tiles])
+# --- End of SMB 1-1 Level Layout ---
+
+# --- Trigger Volumes ---
+TRIGGER_KINDS = ('goal', 'death', 'checkpoint', 'camera_lock', 'pipe')
+TRIGGER_PARAMS = {'checkpoint': 'respawn_nes', 'camera_lock': 'camera_range_nes', 'pipe': 'destination_nes'} # The pair each kind needs
+DEATH_ZONE_TOP_NES = NES_SCREEN_HEIGHT + PLAYER_SIZE * 3 # Mario's box reaches it once he's 2 blocks below the screen
+DEATH_ZONE_DEPTH_NES = PLAYER_SIZE * 4 # Deep enough that a falling Mario can't skip past it in one tick
+WORLD_FLOOR_NES = DEATH_ZONE_TOP_NES + DEATH_ZONE_DEPTH_NES # Below this Mario is out of the world, death zone or not
+
+def trigger_volume(kind, coords_nes, **params):
+    """
+    One trigger volume, as level data: its kind, its box in NES pixels and whatever the kind needs.
+    checkpoint: respawn_nes=(x, y). camera_lock: camera_range_nes=(min_x, max_x). pipe: destination_nes=(x, y).
+    """
+    if kind not in TRIGGER_KINDS: raise ValueError(f"Unknown trigger kind {kind!r}, pick one of {', '.join(TRIGGER_KINDS)}")
+    param = TRIGGER_PARAMS.get(kind)
+    if param and param not in params: raise ValueError(f"A {kind} trigger needs {param}=(..., ...)")
+    if param: params[param] = tuple(params[param])
+    return dict(params, kind=kind, coords_nes=tuple(coords_nes))
+
+def level_trigger_volumes(level_tiles):
+    """The triggers a level gets from its tiles: a death zone under the whole level, and a goal on the flagpole if it has one."""
+    triggers = [trigger_volume('death', (0, DEATH_ZONE_TOP_NES, level_width_nes(level_tiles), WORLD_FLOOR_NES))]
+    pole_rects = [tile['coords_nes'] for tile in level_tiles if tile['type'] == 'flagpole_pole']
+    if pole_rects:
+        # A solid pole stops Mario flush against it, so the goal reaches out a skin's width to meet him
+        lefts, tops, rights, bottoms = zip(*pole_rects)
+        triggers.append(trigger_volume('goal', (min(lefts) - SWEEP_SKIN_NES, min(tops), max(rights), max(bottoms))))
+    return triggers
+
+class TriggerSystem:
+    """
+    Trigger volumes filed in a CollisionGrid, the same spatial index the solids live in, so update() only looks at
+    the volumes sharing a cell with Mario's box: a level with hundreds of triggers costs what one with two does.
+    update() works out which volumes the box is in and fires the enter/stay/exit callbacks registered with on()
+    for their kind, exits first, then enters and stays in level order.
+    """
+    def __init__(self, trigger_volumes, cell_size_nes=PLAYER_SIZE):
+        self.grid = CollisionGrid(cell_size_nes)
+        self.volumes = {} # grid rect id -> trigger volume
+        for volume in trigger_volumes:
+            self.volumes[self.grid.insert(volume['coords_nes'])] = volume
+        self.callbacks = {} # kind -> (enter, stay, exit)
+        self.inside = () # Ids of the volumes the box was in at the last update, in level order
+
+    def on(self, kind, enter=None, stay=None, exit=None):
+        """Callbacks for every volume of `kind`, each called with the volume."""
+        self.callbacks[kind] = (enter, stay, exit)
+
+    def update(self, left, top, right, bottom):
+        volumes = self.volumes
+        inside = tuple(volume_id for volume_id in self.grid.query_ids(left, top, right, bottom)
+                       if right > volumes[volume_id]['coords_nes'][0] and left < volumes[volume_id]['coords_nes'][2]
+                       and bottom > volumes[volume_id]['coords_nes'][1] and top < volumes[volume_id]['coords_nes'][3])
+        was_inside = self.inside
+        if not inside and not was_inside: return # Nowhere near anything, the usual case
+        self.inside = inside
+        for volume_id in was_inside:
+            if volume_id not in inside: self._fire(volume_id, 2)
+        for volume_id in inside:
+            self._fire(volume_id, 1 if volume_id in was_inside else 0)
+
+    def _fire(self, volume_id, which):
+        volume = self.volumes[volume_id]
+        callback = self.callbacks.get(volume['kind'], (None, None, None))[which]
+        if callback: callback(volume)
+# --- End of Trigger Volumes ---
+
+# --- Headless Simulation ---
+# One tick of input is a bitmask, so it's tiny to store, compare and replay
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+LEFT_KEYS = ('a', 'left')
+RIGHT_KEYS = ('d', 'right')
+JUMP_KEYS = ('w', 'up', 'space')
+
+def input_bits_from_keys(pressed_keys):
+    """Turns the set of held keysyms into an input bitmask."""
+    input_bits = 0
+    if any(key in pressed_keys for key in LEFT_KEYS): input_bits |= INPUT_LEFT
+    if any(key in pressed_keys for key in RIGHT_KEYS): input_bits |= INPUT_RIGHT
+    if any(key in pressed_keys for key in JUMP_KEYS): input_bits |= INPUT_JUMP
+    return input_bits
+
+class MarioSimulation:
+    """
+    Mario's whole game state and rules, with no window attached: player movement, collision, camera,
+    score and the win check. Hand it the level tiles and step() it once per tick with an input bitmask.
+    No Tk, no display, so it runs anywhere, as fast as Python can go!
+    step() returns the events that tick produced ('jump', 'land', 'fell', 'won', 'pipe') so a view can play sounds and such.
+    level_triggers: the level's trigger volumes, by default level_trigger_volumes(level_tiles).
+    """
+    def __init__(self, level_tiles, simulation_hz=SIMULATION_HZ, level_triggers=None):
+        self.level_tiles = list(level_tiles) # Tile dicts shared with whoever draws them
+        self.world_width_nes = level_width_nes(self.level_tiles) # Mario and the camera stop here
+        self.collidable_platform_coords = [tile['coords_nes'] for tile in self.level_tiles if tile['collidable']] # Every solid rect, in level order
+        # Physics asks the grid "what's near Mario?" instead of checking every platform, twice a tick!
+        self.collision_grid = CollisionGrid()
+        for platform_coords in self.collidable_platform_coords:
+            self.collision_grid.insert(platform_coords)
+        # Goal, death zones, checkpoints, camera locks and pipes, filed in a grid of their own
+        self.level_triggers = level_trigger_volumes(self.level_tiles) if level_triggers is None else list(level_triggers)
+        self.triggers = TriggerSystem(self.level_triggers)
+        self.triggers.on('goal', enter=self._enter_goal)
+        self.triggers.on('death', enter=self._enter_death_zone)
+        self.triggers.on('checkpoint', enter=self._enter_checkpoint)
+        self.triggers.on('camera_lock', enter=self._lock_camera, stay=self._lock_camera)
+        self.triggers.on('pipe', enter=self._enter_pipe)
+        self.respawn_point = (3 * PLAYER_SIZE, NES_SCREEN_HEIGHT - 2 * PLAYER_SIZE) # Checkpoints move it
+
+        self.simulation_hz = simulation_hz
+        self.physics_step_scale = PHYSICS_TUNING_HZ / simulation_hz
+        self.tick_count = 0
+        self.input_bits = 0 # Held during the latest tick
+        self.score = 0
+        self.game_won = False
+        self.reset_player()
+
+    def reset_player(self):
+        self.player_x, self.player_y = self.respawn_point
+        self.player_vy = 0
+        self.is_jumping = False
+        self.on_ground = True # Bug 16 fix: Mario starts on the ground, ready to rumble!
+        self.camera_x = 0
+
+    def remove_tile(self, tile_def):
+        """Takes a tile out of the level. Returns False if it wasn't there."""
+        if tile_def not in self.level_tiles: return False
+        self.level_tiles.remove(tile_def)
+        if tile_def['collidable'] and tile_def['coords_nes'] in self.collidable_platform_coords:
+            self.collidable_platform_coords.remove(tile_def['coords_nes'])
+            self.collision_grid.remove(tile_def['coords_nes'])
+        return True
+
+    # Trigger callbacks only note what happened; step() applies it all in one fixed order
+    def _enter_goal(self, volume): self.reached_goal = True
+    def _enter_death_zone(self, volume): self.hit_death_zone = True
+    def _enter_checkpoint(self, volume): self.respawn_point = volume['respawn_nes']
+    def _lock_camera(self, volume): self.camera_range = volume['camera_range_nes']
+    def _enter_pipe(self, volume): self.pipe_destination = volume['destination_nes']
+
+    def check_aabb_collision(self, r1_left, r1_top, r1_right, r1_bottom, r2_left, r2_top, r2_right, r2_bottom):
+        return (r1_right > r2_left and r1_left < r2_right and r1_bottom > r2_top and r1_top < r2_bottom)
+
+    def move_player_swept(self, dx, dy):
+        """
+        Moves Mario by (dx, dy), sweeping each axis against the collision grid (x first, then y).
+        Moves longer than SWEEP_MAX_STEP_NES are split into sub-steps so fast diagonal moves still
+        resolve in the right order; a normal tick is one sweep per axis. Returns (landed, bumped_head).
+        """
+        sub_steps = max(1, math.ceil(max(abs(dx), abs(dy)) / SWEEP_MAX_STEP_NES))
+        step_dx, step_dy = dx / sub_steps, dy / sub_steps
+        landed = bumped_head = False
+        for _ in range(sub_steps):
+            if step_dx:
+                player_box = (self.player_x, self.player_y, self.player_x + PLAYER_SIZE, self.player_y + PLAYER_SIZE)
+                self.player_x, hit_rect = sweep_box_along_axis(self.collision_grid, player_box, step_dx, 0)
+                if hit_rect: step_dx = 0 # Hit a wall, that's it for sideways this tick
+            if step_dy:
+                player_box = (self.player_x, self.player_y, self.player_x + PLAYER_SIZE, self.player_y + PLAYER_SIZE)
+                self.player_y, hit_rect = sweep_box_along_axis(self.collision_grid, player_box, step_dy, 1)
+                if hit_rect:
+                    landed, bumped_head = step_dy > 0, step_dy < 0
+                    step_dy = 0
+        return landed, bumped_head
+
+    def step(self, input_bits):
+        """Advances the game by one tick with the given input bitmask. Returns this tick's events."""
+        self.tick_count += 1
+        self.input_bits = input_bits
+        if self.game_won: return () # Bug 18 fix: Stop input/physics if game won! No more cheating!
+        events = []
+
+        # --- Horizontal Movement ---
+        current_dx = 0
+        if input_bits & INPUT_LEFT: current_dx -= MOVE_SPEED
+        if input_bits & INPUT_RIGHT: current_dx += MOVE_SPEED
+
+        # --- Vertical Movement (Jump and Gravity) ---
+        if input_bits & INPUT_JUMP and self.on_ground:
+            self.player_vy = -JUMP_POWER
+            self.is_jumping = True
+            self.on_ground = False
+            events.append('jump')
+
+        # Velocities are per PHYSICS_TUNING_HZ tick; step_scale stretches them to this tick's length
+        step_scale = self.physics_step_scale
+        if not self.on_ground: self.player_vy += GRAVITY * step_scale
+
+        # Move with swept collision: x first, then y, never through a solid
+        landed, bumped_head = self.move_player_swept(current_dx * step_scale, self.player_vy * step_scale)
+        if landed:
+            self.player_vy = 0
+            if self.is_jumping: events.append('land') # Bug 12 fix: Land event only if just finished jumping
+            self.is_jumping = False
+        elif bumped_head:
+            self.player_vy = GRAVITY # Start falling, gravity always wins!
+            # For future: hit block animation/sound here! Boom!
+        self.on_ground = landed
+
+        # Boundary Checks, don't fall off the world!
+        if self.player_x < 0: self.player_x = 0
+        if self.player_x + PLAYER_SIZE > self.world_width_nes: self.player_x = self.world_width_nes - PLAYER_SIZE
+
+        # Trigger volumes Mario's box is in: only the ones filed in his grid cells get looked at
+        self.reached_goal = self.hit_death_zone = False
+        self.pipe_destination = self.camera_range = None
+        self.triggers.update(self.player_x, self.player_y, self.player_x + PLAYER_SIZE, self.player_y + PLAYER_SIZE)
+        if self.reached_goal: # Bug 18 fix: Touched the flagpole, victory is ours!
+            self.game_won = True
+            self.score += 1000 # Bonus points for winning! Jackpot!
+            events.append('won')
+        elif self.hit_death_zone or self.player_y >= WORLD_FLOOR_NES: # Fell down a pit (or got below every pit), oh noes!
+            self.reset_player()
+            self.score = 0 # Bug 10 fix: Reset score on death, tough but fair!
+            events.append('fell')
+        elif self.pipe_destination: # Down the pipe and out somewhere else, whee!
+            self.player_x, self.player_y = self.pipe_destination
+            self.player_vy = 0
+            self.is_jumping = self.on_ground = False
+            events.append('pipe')
+
+        # Camera Update, keep Mario in sight!
+        # Bug 15 fix: Camera now activates more dynamically to the right, not just centered, super smart!
+        camera_boundary_left = NES_SCREEN_WIDTH * 0.35 # Mario is 35% from left edge
+        if self.player_x - self.camera_x > camera_boundary_left:
+            self.camera_x = self.player_x - camera_boundary_left
+
+        # Max camera limit
+        self.camera_x = max(0, min(self.camera_x, self.world_width_nes - NES_SCREEN_WIDTH))
+        if self.camera_range: self.camera_x = max(self.camera_range[0], min(self.camera_x, self.camera_range[1]))
+        # Bug 5 fix: Removed rounding for smoother camera movement. No more pixel snapping! So silky smooth!
+        return events
+
+class BatchMarioSimulation:
+    """
+    MarioSimulation's rules for N independent Marios at once, as numpy struct-of-arrays: one array per field,
+    one slot per agent. All agents share one static level, flattened into a dense cell -> rects table, so a
+    swept move gathers every agent's nearby solids in one fancy-indexing call instead of N grid queries.
+    Tick for tick it matches MarioSimulation exactly (mario_bench.py batch-physics checks that).
+    Tiles removed after construction are not seen here; build a new batch for a new level.
+    Trigger volumes get their own dense cell -> trigger ids table, and each agent tracks which ones it is inside.
+    """
+    AXIS_CELLS = 3 # A 16px box moved at most SWEEP_MAX_STEP_NES along the axis touches at most 3 cells
+    CROSS_CELLS = 2 # ...and at most 2 across it
+
+    def __init__(self, level_tiles, agent_count, simulation_hz=SIMULATION_HZ, level_triggers=None):
+        if not NUMPY_ENABLED: raise RuntimeError("BatchMarioSimulation needs numpy: pip install numpy")
+        level_tiles = list(level_tiles)
+        self.agent_count = agent_count
+        self.world_width_nes = level_width_nes(level_tiles)
+        self.physics_step_scale = PHYSICS_TUNING_HZ / simulation_hz
+        self.tick_count = 0
+        self._build_cell_table([tile['coords_nes'] for tile in level_tiles if tile['collidable']])
+        self._build_trigger_table(level_trigger_volumes(level_tiles) if level_triggers is None else list(level_triggers))
+
+        self.respawn_x = np.full(agent_count, 3.0 * PLAYER_SIZE)
+        self.respawn_y = np.full(agent_count, float(NES_SCREEN_HEIGHT - 2 * PLAYER_SIZE))
+        self.inside_triggers = np.zeros((agent_count, len(self.trigger_rects) - 1), dtype=bool)
+        self.player_x = np.full(agent_count, 3.0 * PLAYER_SIZE)
+        self.player_y = np.full(agent_count, float(NES_SCREEN_HEIGHT - 2 * PLAYER_SIZE))
+        self.player_vy = np.zeros(agent_count)
+        self.is_jumping = np.zeros(agent_count, dtype=bool)
+        self.on_ground = np.ones(agent_count, dtype=bool)
+        self.camera_x = np.zeros(agent_count)
+        self.score = np.zeros(agent_count, dtype=np.int64)
+        self.game_won = np.zeros(agent_count, dtype=bool)
+
+    def _build_cell_table(self, solid_rects):
+        """Dense (rows, columns, K, 4) table of the rects filed under each grid cell, NaN-padded. One empty cell of margin all round."""
+        grid = CollisionGrid()
+        for rect in solid_rects:
+            grid.insert(rect)
+        cell_keys = list(grid.cells) or [(0, 0)]
+        first_x = min(cell_x for cell_x, _ in cell_keys) - 1
+        first_y = min(cell_y for _, cell_y in cell_keys) - 1
+        columns = max(cell_x for cell_x, _ in cell_keys) - first_x + 2
+        rows = max(cell_y for _, cell_y in cell_keys) - first_y + 2
+        rects_per_cell = max([len(rect_ids) for rect_ids in grid.cells.values()] + [1])
+        self.cell_rects = np.full((rows, columns, rects_per_cell, 4), np.nan) # NaN fails every comparison: no hit
+        for (cell_x, cell_y), rect_ids in grid.cells.items():
+            for slot, rect_id in enumerate(rect_ids):
+                self.cell_rects[cell_y - first_y, cell_x - first_x, slot] = grid.rects[rect_id]
+        self.cell_size_nes = grid.cell_size_nes
+        self.first_cell = (first_x, first_y)
+
+    def _build_trigger_table(self, trigger_volumes):
+        """
+        Dense (rows, columns, K) table of the trigger ids filed under each grid cell, padded with the id one past the
+        last, whose rect is all NaN. Plus a mask per kind and each trigger's parameter pair (NaN if it has none).
+        """
+        grid = CollisionGrid()
+        for volume in trigger_volumes:
+            grid.insert(volume['coords_nes'])
+        trigger_count = len(trigger_volumes)
+        cell_keys = list(grid.cells) or [(0, 0)]
+        first_x = min(cell_x for cell_x, _ in cell_keys) - 1
+        first_y = min(cell_y for _, cell_y in cell_keys) - 1
+        columns = max(cell_x for cell_x, _ in cell_keys) - first_x + 2
+        rows = max(cell_y for _, cell_y in cell_keys) - first_y + 2
+        triggers_per_cell = max([len(trigger_ids) for trigger_ids in grid.cells.values()] + [1])
+        self.cell_triggers = np.full((rows, columns, triggers_per_cell), trigger_count, dtype=np.intp)
+        for (cell_x, cell_y), trigger_ids in grid.cells.items():
+            self.cell_triggers[cell_y - first_y, cell_x - first_x, :len(trigger_ids)] = trigger_ids
+        self.first_trigger_cell = (first_x, first_y)
+        self.trigger_rects = np.full((trigger_count + 1, 4), np.nan)
+        self.trigger_params = np.full((trigger_count + 1, 2), np.nan)
+        for trigger_id, volume in enumerate(trigger_volumes):
+            self.trigger_rects[trigger_id] = volume['coords_nes']
+            if volume['kind'] in TRIGGER_PARAMS: self.trigger_params[trigger_id] = volume[TRIGGER_PARAMS[volume['kind']]]
+        self.trigger_is = {kind: np.array([volume['kind'] == kind for volume in trigger_volumes], dtype=bool) for kind in TRIGGER_KINDS}
+
+    def _triggers_inside(self, player_x, player_y):
+        """(N, T) mask of the trigger volumes each agent's box overlaps, checking only the 2x2 cells around it."""
+        size = self.cell_size_nes
+        rows, columns = self.cell_triggers.shape[:2]
+        cell_x = np.clip(np.floor(player_x / size).astype(np.intp)[:, None, None] + np.arange(2)[None, None, :] - self.first_trigger_cell[0], 0, columns - 1)
+        cell_y = np.clip(np.floor(player_y / size).astype(np.intp)[:, None, None] + np.arange(2)[None, :, None] - self.first_trigger_cell[1], 0, rows - 1)
+        trigger_ids = self.cell_triggers[cell_y, cell_x].reshape(len(player_x), -1)
+        rects = self.trigger_rects[trigger_ids]
+        hit = ((player_x[:, None] + PLAYER_SIZE > rects[..., 0]) & (player_x[:, None] < rects[..., 2]) &
+               (player_y[:, None] + PLAYER_SIZE > rects[..., 1]) & (player_y[:, None] < rects[..., 3]))
+        inside = np.zeros((len(player_x), len(self.trigger_rects)), dtype=bool)
+        inside[np.arange(len(player_x))[:, None], trigger_ids] = hit # A trigger listed twice hits the same both times
+        return inside[:, :-1]
+
+    @staticmethod
+    def _last_trigger(mask):
+        """Per agent: whether any trigger in the (N, T) mask is set, and the highest such id (what fires last in MarioSimulation)."""
+        if not mask.shape[1]: return np.zeros(len(mask), dtype=bool), np.zeros(len(mask), dtype=np.intp)
+        return mask.any(axis=1), mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1)
+
+    def _sweep_along_axis(self, player_x, player_y, delta, axis, moving):
+        """sweep_box_along_axis for every agent at once. Agents not `moving` stay put. Returns (new left/top edge, hit)."""
+        box = (player_x, player_y, player_x + PLAYER_SIZE, player_y + PLAYER_SIZE)
+        low_edge, high_edge = box[axis], box[axis + 2]
+        box_size = high_edge - low_edge
+        cross = 1 - axis
+        swept_low = np.where(delta > 0, low_edge, low_edge + delta)
+
+        # Gather the rects of the cells around each agent's swept box: (N, AXIS_CELLS * CROSS_CELLS * K, 4)
+        size = self.cell_size_nes
+        axis_cells = np.floor(swept_low / size).astype(np.intp)[:, None] + np.arange(self.AXIS_CELLS)
+        cross_cells = np.floor(box[cross] / size).astype(np.intp)[:, None] + np.arange(self.CROSS_CELLS)
+        if axis == 0: cell_x, cell_y = axis_cells[:, :, None], cross_cells[:, None, :]
+        else: cell_x, cell_y = cross_cells[:, None, :], axis_cells[:, :, None]
+        rows, columns = self.cell_rects.shape[:2]
+        cell_x = np.clip(cell_x - self.first_cell[0], 0, columns - 1) # Off the level lands in the empty margin
+        cell_y = np.clip(cell_y - self.first_cell[1], 0, rows - 1)
+        rects = self.cell_rects[cell_y, cell_x].reshape(len(delta), -1, 4)
+
+        in_path = (rects[..., cross + 2] > box[cross][:, None]) & (rects[..., cross] < box[cross + 2][:, None])
+        near_side, far_side = rects[..., axis], rects[..., axis + 2]
+        step = delta[:, None]
+        ahead = in_path & (high_edge[:, None] - SWEEP_SKIN_NES <= near_side) & (near_side < high_edge[:, None] + step)
+        ahead_edge = np.where(ahead, near_side - box_size[:, None], np.inf).min(axis=1)
+        behind = in_path & (low_edge[:, None] + step < far_side) & (far_side <= low_edge[:, None] + SWEEP_SKIN_NES)
+        behind_edge = np.where(behind, far_side, -np.inf).max(axis=1)
+
+        moved_edge = low_edge + delta
+        hit = moving & np.where(delta > 0, ahead_edge < moved_edge, behind_edge > moved_edge)
+        new_low_edge = np.where(hit, np.where(delta > 0, ahead_edge, behind_edge), np.where(moving, moved_edge, low_edge))
+        return new_low_edge, hit
+
+    def step(self, input_bits):
+        """Advances every agent one tick. input_bits: one bitmask per agent. Returns {event: bool mask} like MarioSimulation.step."""
+        self.tick_count += 1
+        input_bits = np.asarray(input_bits)
+        playing = ~self.game_won # Bug 18 fix: Winners stand still
+        x, y, vy = self.player_x, self.player_y, self.player_vy
+
+        # --- Horizontal Movement ---
+        current_dx = (((input_bits & INPUT_RIGHT) != 0).astype(np.float64) - ((input_bits & INPUT_LEFT) != 0)) * MOVE_SPEED
+
+        # --- Vertical Movement (Jump and Gravity) ---
+        jumped = playing & ((input_bits & INPUT_JUMP) != 0) & self.on_ground
+        vy = np.where(jumped, -float(JUMP_POWER), vy)
+        is_jumping = self.is_jumping | jumped
+        on_ground = self.on_ground & ~jumped
+        step_scale = self.physics_step_scale
+        vy = np.where(playing & ~on_ground, vy + GRAVITY * step_scale, vy)
+
+        # Swept move in sub-steps, x then y each sub-step, just like MarioSimulation.move_player_swept
+        dx, dy = current_dx * step_scale, vy * step_scale
+        sub_steps = np.maximum(1, np.ceil(np.maximum(np.abs(dx), np.abs(dy)) / SWEEP_MAX_STEP_NES))
+        step_dx, step_dy = dx / sub_steps, dy / sub_steps
+        landed = np.zeros(self.agent_count, dtype=bool)
+        bumped_head = np.zeros(self.agent_count, dtype=bool)
+        for sub_step in range(int(sub_steps[playing].max()) if playing.any() else 0):
+            stepping = playing & (sub_step < sub_steps)
+            x, hit = self._sweep_along_axis(x, y, step_dx, 0, stepping & (step_dx != 0))
+            step_dx = np.where(hit, 0.0, step_dx)
+            y, hit = self._sweep_along_axis(x, y, step_dy, 1, stepping & (step_dy != 0))
+            landed |= hit & (step_dy > 0)
+            bumped_head |= hit & (step_dy < 0)
+            step_dy = np.where(hit, 0.0, step_dy)
+
+        land_event = landed & is_jumping
+        vy = np.where(landed, 0.0, np.where(bumped_head, GRAVITY, vy))
+        is_jumping = np.where(landed, False, is_jumping)
+        on_ground = np.where(playing, landed, on_ground)
+
+        # Boundary Checks, don't fall off the world!
+        x = np.where(x < 0, 0.0, x)
+        x = np.where(x + PLAYER_SIZE > self.world_width_nes, float(self.world_width_nes - PLAYER_SIZE), x)
+
+        # Trigger volumes, applied in MarioSimulation's order: checkpoints, then goal, else death zone, else pipe
+        was_inside = self.inside_triggers
+        inside = np.where(playing[:, None], self._triggers_inside(x, y), was_inside)
+        entered = inside & ~was_inside
+        has_checkpoint, checkpoint = self._last_trigger(entered & self.trigger_is['checkpoint'])
+        self.respawn_x = np.where(has_checkpoint, self.trigger_params[checkpoint, 0], self.respawn_x)
+        self.respawn_y = np.where(has_checkpoint, self.trigger_params[checkpoint, 1], self.respawn_y)
+        won = (entered & self.trigger_is['goal']).any(axis=1)
+        fell = ((entered & self.trigger_is['death']).any(axis=1) | (playing & (y >= WORLD_FLOOR_NES))) & ~won
+        has_pipe, pipe = self._last_trigger(entered & self.trigger_is['pipe'])
+        piped = has_pipe & ~won & ~fell
+        x = np.where(fell, self.respawn_x, np.where(piped, self.trigger_params[pipe, 0], x))
+        y = np.where(fell, self.respawn_y, np.where(piped, self.trigger_params[pipe, 1], y))
+        vy = np.where(fell | piped, 0.0, vy)
+        on_ground = np.where(fell, True, np.where(piped, False, on_ground))
+        is_jumping &= ~(fell | piped)
+        camera_x = np.where(fell, 0.0, self.camera_x)
+        self.score[fell] = 0
+        self.game_won |= won
+        self.score[won] += 1000
+
+        # Camera Update, keep Mario in sight!
+        camera_boundary_left = NES_SCREEN_WIDTH * 0.35
+        camera_x = np.where(playing & (x - camera_x > camera_boundary_left), x - camera_boundary_left, camera_x)
+        camera_x = np.where(playing, np.clip(camera_x, 0, self.world_width_nes - NES_SCREEN_WIDTH), camera_x)
+        has_lock, lock = self._last_trigger(inside & self.trigger_is['camera_lock'])
+        locked_x = np.maximum(self.trigger_params[lock, 0], np.minimum(camera_x, self.trigger_params[lock, 1]))
+        camera_x = np.where(playing & has_lock, locked_x, camera_x)
+
+        self.player_x, self.player_y, self.player_vy = x, y, vy
+        self.is_jumping, self.on_ground, self.camera_x = is_jumping, on_ground, camera_x
+        self.inside_triggers = inside
+        return {'jump': jumped, 'land': land_event, 'fell': fell, 'won': won, 'pipe': piped}
+# --- End of Headless Simulation ---
+
+# --- Input Recording and Replay ---
+INPUT_LOG_MAGIC = b"MEOW"
+INPUT_LOG_VERSION = 1 # Bump when the file layout changes
+
+def level_fingerprint(level_tiles, level_triggers=None):
+    """
+    16-byte hash of the level layout, its trigger volumes and the physics constants. A recorded run only replays
+    the same way against the exact same level and rules, so logs carry this to catch mix-ups.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((PLAYER_SIZE, GRAVITY, JUMP_POWER, MOVE_SPEED, PHYSICS_TUNING_HZ, SWEEP_SKIN_NES, SWEEP_MAX_STEP_NES,
+                        WORLD_WIDTH_NES, NES_SCREEN_WIDTH, NES_SCREEN_HEIGHT)).encode())
+    for tile in level_tiles:
+        digest.update(repr((tile['coords_nes'], tile['type'], tile['collidable'])).encode())
+    for volume in level_trigger_volumes(level_tiles) if level_triggers is None else level_triggers:
+        digest.update(repr(sorted(volume.items())).encode())
+    return digest.digest()[:16]
+
+class InputLog:
+    """
+    A recorded run: one input bitmask byte per simulation tick, after a small header
+    (magic, format version, tick rate, level fingerprint, tick count). A 2-minute run is about 7 KB!
+    """
+    HEADER = struct.Struct("<4sHH16sI")
+
+    def __init__(self, fingerprint, simulation_hz=SIMULATION_HZ, inputs=b""):
+        self.fingerprint = fingerprint
+        self.simulation_hz = simulation_hz
+        self.inputs = bytearray(inputs)
+
+    def record(self, input_bits):
+        self.inputs.append(input_bits)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def to_bytes(self):
+        return self.HEADER.pack(INPUT_LOG_MAGIC, INPUT_LOG_VERSION, self.simulation_hz, self.fingerprint, len(self.inputs)) + bytes(self.inputs)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < cls.HEADER.size: raise ValueError("Input log is too short to even have a header")
+        magic, version, simulation_hz, fingerprint, tick_count = cls.HEADER.unpack_from(data)
+        if magic != INPUT_LOG_MAGIC: raise ValueError("Not an input log, no meow in the header")
+        if version != INPUT_LOG_VERSION: raise ValueError(f"Input log format version {version}, this build reads {INPUT_LOG_VERSION}")
+        inputs = data[cls.HEADER.size:]
+        if len(inputs) != tick_count: raise ValueError(f"Input log says {tick_count} ticks but holds {len(inputs)}, truncated?")
+        return cls(fingerprint, simulation_hz, inputs)
+
+    def save(self, path):
+        with open(path, "wb") as log_file:
+            log_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as log_file:
+            return cls.from_bytes(log_file.read())
+
+    def check_level(self, level_tiles, level_triggers=None):
+        """Raises ValueError if this log was recorded against a different level or different physics."""
+        if self.fingerprint != level_fingerprint(level_tiles, level_triggers):
+            raise ValueError("Input log was recorded against a different level or physics, it would not replay the same")
+
+def replay_input_log(input_log, level_tiles=None, level_triggers=None):
+    """Runs a recorded log through a fresh MarioSimulation as fast as Python goes, no window. Returns the simulation at the end."""
+    level_tiles = build_smb_1_1_tiles() if level_tiles is None else level_tiles
+    input_log.check_level(level_tiles, level_triggers)
+    simulation = MarioSimulation(level_tiles, simulation_hz=input_log.simulation_hz, level_triggers=level_triggers)
+    step = simulation.step
+    for input_bits in input_log.inputs:
+        step(input_bits)
+    return simulation
+# --- End of Input Recording and Replay ---
+
+# --- Keyboard Input ---
+INPUT_EVENT_RING_SIZE = 256 # Raw key events held between ticks. Way more than a tick ever sees, unless something's wrong
+AUTO_REPEAT_COALESCE_SECONDS = 0.010 # A release followed this quickly by a press of the same key is X11 auto-repeat
+AUTO_REPEAT_DELAY_SECONDS = 0.2 # X11 doesn't start repeating a key held for less than this (servers default to 250-660 ms)
+INPUT_RATE_WINDOW_SECONDS = 1.0 # events_per_second looks back this far
+
+class KeyboardInput:
+    """
+    Turns raw Tk key events into one input bitmask per tick. The Tk handlers only timestamp each event into a ring
+    buffer; snapshot() drains it once per tick. Holding a key on X11 sends a storm of release/press pairs; a release
+    followed within AUTO_REPEAT_COALESCE_SECONDS by a press of the same key is dropped, with its press, so Mario
+    doesn't stutter. Only a key held long enough to be auto-repeating has its release held back for that long at the
+    end of a drain, in case the matching press is still on its way; a quick tap's release lands on the very next tick.
+    A key pressed and let go between two ticks still shows up held for one tick.
+    """
+    def __init__(self, ring_size=INPUT_EVENT_RING_SIZE, coalesce_seconds=AUTO_REPEAT_COALESCE_SECONDS):
+        self.events = collections.deque(maxlen=ring_size) # (timestamp, keysym, is_press), oldest first
+        self.coalesce_seconds = coalesce_seconds
+        self.held_keys = set()
+        self.pending_releases = {} # keysym -> release time, waiting to see if it was auto-repeat
+        self.pressed_at = {} # keysym -> when the held key really went down; auto-repeat presses don't count
+        self.tapped_keys = set() # Went down since the last snapshot, held for it even if already back up
+        self.event_times = collections.deque() # Arrival times within INPUT_RATE_WINDOW_SECONDS, for events_per_second
+        self.consumed_event_times = collections.deque(maxlen=ring_size) # Events snapshots acted on, for latency tracking
+        self.total_events = 0
+        self.coalesced_pairs = 0
+        self.dropped_events = 0
+
+    def key_event(self, keysym, is_press, timestamp=None):
+        """Called from the Tk key handlers. Just records the event, snapshot() makes sense of it."""
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        if len(self.events) == self.events.maxlen: self.dropped_events += 1 # The deque pushes the oldest out
+        self.events.append((timestamp, keysym.lower(), is_press))
+        self.event_times.append(timestamp)
+        self.total_events += 1
+
+    def snapshot(self, now=None):
+        """This tick's input bitmask, from every event since the last snapshot."""
+        now = time.perf_counter() if now is None else now
+        events, held_keys, pending_releases = self.events, self.held_keys, self.pending_releases
+        while events:
+            timestamp, keysym, is_press = events.popleft()
+            if not is_press:
+                if keysym in held_keys: pending_releases[keysym] = timestamp
+                continue
+            released_at = pending_releases.pop(keysym, None)
+            if released_at is not None and timestamp - released_at <= self.coalesce_seconds:
+                self.coalesced_pairs += 1 # Auto-repeat: the key never really came up
+                continue
+            if released_at is not None: self._release(keysym, released_at) # A real release, then a fresh press
+            if keysym not in held_keys: self.pressed_at[keysym] = timestamp
+            held_keys.add(keysym)
+            self.tapped_keys.add(keysym)
+            self.consumed_event_times.append(timestamp)
+        for keysym, released_at in list(pending_releases.items()):
+            # Nothing came back. Unless the key was held long enough to auto-repeat and its press could still be on the way, it's real
+            could_repeat = released_at - self.pressed_at.get(keysym, released_at) >= AUTO_REPEAT_DELAY_SECONDS
+            if not could_repeat or now - released_at > self.coalesce_seconds:
+                del pending_releases[keysym]
+                self._release(keysym, released_at)
+        input_bits = input_bits_from_keys(held_keys | self.tapped_keys)
+        self.tapped_keys.clear()
+        return input_bits
+
+    def _release(self, keysym, released_at):
+        self.held_keys.discard(keysym)
+        self.pressed_at.pop(keysym, None)
+        self.consumed_event_times.append(released_at)
+
+    def take_consumed_event_times(self):
+        """Timestamps of the key events snapshots have acted on since the last call."""
+        event_times = list(self.consumed_event_times)
+        self.consumed_event_times.clear()
+        return event_times
+
+    def events_per_second(self, now=None):
+        now = time.perf_counter() if now is None else now
+        while self.event_times and now - self.event_times[0] > INPUT_RATE_WINDOW_SECONDS: self.event_times.popleft()
+        return len(self.event_times) / INPUT_RATE_WINDOW_SECONDS
+
+    def summary(self):
+        return {"events": self.total_events, "events_per_second": self.events_per_second(),
+                "coalesced_pairs": self.coalesced_pairs, "dropped_events": self.dropped_events}
+
+    def report_lines(self):
+        return [f"INPUT {self.events_per_second():.0f} EV/S, {self.coalesced_pairs} REPEATS COALESCED, {self.dropped_events} DROPPED"]
+# --- End of Keyboard Input ---
+
+# --- Input Latency ---
+LATENCY_BUCKET_EDGES_MS = (8, 16, 33, 50, 100) # Histogram bucket upper edges; slower than the last lands in one open bucket
+LATENCY_WINDOW_EVENTS = 500 # Recent latencies kept for the percentiles
+
+class LatencyHistogram:
+    """Latencies in ms: a count per bucket since the start, plus the most recent ones for percentiles."""
+    def __init__(self, edges_ms=LATENCY_BUCKET_EDGES_MS, window_events=LATENCY_WINDOW_EVENTS):
+        self.edges_ms = edges_ms
+        self.bucket_counts = [0] * (len(edges_ms) + 1)
+        self.recent_ms = collections.deque(maxlen=window_events)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, latency_ms):
+        self.bucket_counts[bisect.bisect_left(self.edges_ms, latency_ms)] += 1
+        self.recent_ms.append(latency_ms)
+        self.count += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, fraction):
+        ordered = sorted(self.recent_ms)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+    def bucket_labels(self):
+        return [f"<={edge}" for edge in self.edges_ms] + [f">{self.edges_ms[-1]}"]
+
+    def summary(self):
+        return {"count": self.count, "p50_ms": self.percentile(0.5), "p95_ms": self.percentile(0.95), "max_ms": self.max_ms,
+                "buckets_ms": dict(zip(self.bucket_labels(), self.bucket_counts))}
+
+class InputLatencyTracker:
+    """
+    Follows key events from the Tk handler to the screen. input->sim runs from the handler's timestamp to the physics
+    tick that consumed the event (physics acts on input the same tick), sim->present from that tick to when Tk has
+    redrawn the window with the first frame after it (an after_idle queued behind the redraw calls presented()), so
+    it counts Tk's drawing too, though not the compositor or the display. Events that didn't change the tick's input
+    bitmask (a second key for a move already held, say) have nothing to show, so they're only counted.
+    """
+    def __init__(self):
+        self.input_to_sim = LatencyHistogram()
+        self.sim_to_present = LatencyHistogram()
+        self.input_to_present = LatencyHistogram()
+        self.awaiting_present = [] # (event time, tick time) of consumed events not on screen yet
+        self.no_effect_events = 0
+
+    def tick_consumed(self, event_times, tick_time, input_changed):
+        if not input_changed:
+            self.no_effect_events += len(event_times)
+            return
+        for event_time in event_times:
+            self.input_to_sim.add((tick_time - event_time) * 1000)
+            self.awaiting_present.append((event_time, tick_time))
+
+    def presented(self, present_time):
+        if not self.awaiting_present: return
+        for event_time, tick_time in self.awaiting_present:
+            self.sim_to_present.add((present_time - tick_time) * 1000)
+            self.input_to_present.add((present_time - event_time) * 1000)
+        self.awaiting_present.clear()
+
+    def summary(self):
+        return {"input_to_sim": self.input_to_sim.summary(), "sim_to_present": self.sim_to_present.summary(),
+                "input_to_present": self.input_to_present.summary(), "no_effect_events": self.no_effect_events}
+
+    def report_lines(self):
+        stages = (("IN>SIM", self.input_to_sim), ("SIM>SCR", self.sim_to_present), ("IN>SCR", self.input_to_present))
+        lines = ["LATENCY P50/P95 MS " + "  ".join(f"{name} {histogram.percentile(0.5):.1f}/{histogram.percentile(0.95):.1f}"
+                                                     for name, histogram in stages)]
+        histogram = self.input_to_present
+        lines.append("  IN>SCR " + " ".join(f"{label}:{count}" for label, count in zip(histogram.bucket_labels(), histogram.bucket_counts)))
+        return lines
+# --- End of Input Latency ---
+
+# --- Frame Phase Profiler ---
+FRAME_PHASES = ('input', 'physics', 'culling', 'canvas', 'tk')
+PROFILER_WINDOW_FRAMES = 300 # Rolling percentiles cover the last 5 seconds at 60 FPS
+PROFILER_OVERLAY_REFRESH_FRAMES = 15 # Redrawing the overlay text every frame would cost more than what it measures!
+
+class FramePhaseProfiler:
+    """
+    Times each frame phase by phase: input, physics, culling, canvas updates and 'tk', how late Tk handed
+    the next frame back to us (event handling, redraws, the OS). Keeps rolling p50/p95/p99 per phase and
+    counts frames over FRAME_BUDGET_MS. When disabled the game loop never calls it at all.
+    """
+    def __init__(self, window_frames=PROFILER_WINDOW_FRAMES, budget_ms=FRAME_BUDGET_MS):
+        self.enabled = False
+        self.window_frames = window_frames
+        self.budget_ms = budget_ms
+        self.reset()
+
+    def reset(self):
+        self.samples_ms = {phase: collections.deque(maxlen=self.window_frames) for phase in FRAME_PHASES + ('frame',)}
+        self.frames = 0
+        self.missed_deadlines = 0
+        self.frame_phase_ms = dict.fromkeys(FRAME_PHASES, 0.0)
+        self.last_mark_time = 0.0
+
+    def begin_frame(self, frame_start_time, frame_due_time):
+        """Starts a frame. Whatever we got handed the frame past its due time is charged to 'tk'."""
+        self.frame_phase_ms = dict.fromkeys(FRAME_PHASES, 0.0)
+        self.frame_phase_ms['tk'] = max(0.0, frame_start_time - frame_due_time) * 1000
+        self.last_mark_time = frame_start_time
+
+    def mark(self, phase):
+        """Charges the time since the last mark to `phase`."""
+        now = time.perf_counter()
+        self.frame_phase_ms[phase] += (now - self.last_mark_time) * 1000
+        self.last_mark_time = now
+
+    def end_frame(self):
+        frame_ms = sum(self.frame_phase_ms.values())
+        for phase, phase_ms in self.frame_phase_ms.items():
+            self.samples_ms[phase].append(phase_ms)
+        self.samples_ms['frame'].append(frame_ms)
+        self.frames += 1
+        if frame_ms > self.budget_ms: self.missed_deadlines += 1
+
+    def percentiles(self, phase):
+        """(p50, p95, p99) in ms over the rolling window."""
+        ordered = sorted(self.samples_ms[phase])
+        if not ordered: return (0.0, 0.0, 0.0)
+        return tuple(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] for fraction in (0.5, 0.95, 0.99))
+
+    def report_lines(self):
+        lines = [f"{'PHASE':8} {'P50':>6} {'P95':>6} {'P99':>6} MS"]
+        for phase in FRAME_PHASES + ('frame',):
+            p50, p95, p99 = self.percentiles(phase)
+            lines.append(f"{phase.upper():8} {p50:6.2f} {p95:6.2f} {p99:6.2f}")
+        lines.append(f"MISSED {self.missed_deadlines}/{self.frames} OVER {self.budget_ms:.2f} MS")
+        return lines
+# --- End of Frame Phase Profiler ---
+
+# --- Sampling Profiler ---
+SAMPLER_INTERVAL_SECONDS = 0.005 # 200 samples a second
+SAMPLER_MAX_OVERHEAD = 0.02 # Sampling backs off if it ever eats more than 2% of the time
+SAMPLER_OUTPUT_DIR = os.environ.get("CATOS_PROFILE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "catos_mario", "profiles"))
+
+class StackSampler:
+    """
+    A sampling profiler that runs on its own thread. Every interval it grabs the current stack of every other
+    thread (the Tk main thread, the SoundEngine playback thread...) and counts it. The counts come out as collapsed
+    stacks, one "thread;outer;...;inner count" line each, ready for flamegraph.pl or speedscope.
+    If a sample ever costs more than SAMPLER_MAX_OVERHEAD of the elapsed time, the interval stretches until it doesn't.
+    """
+    def __init__(self, interval_seconds=SAMPLER_INTERVAL_SECONDS, max_overhead=SAMPLER_MAX_OVERHEAD):
+        self.interval_seconds = interval_seconds
+        self.max_overhead = max_overhead
+        self.stack_counts = collections.Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0 # Time spent inside _sample, i.e. our overhead
+        self.started_at = None
+        self.stopped_at = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.running: return
+        self._stop_event.clear()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running: return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.stopped_at = time.perf_counter()
+
+    @property
+    def overhead(self):
+        """Fraction of the wall time so far that went into taking samples."""
+        elapsed = (self.stopped_at or time.perf_counter()) - self.started_at if self.started_at else 0
+        return self.sampling_seconds / elapsed if elapsed > 0 else 0.0
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            sample_start = time.perf_counter()
+            self._sample()
+            self.sampling_seconds += time.perf_counter() - sample_start
+            if self.overhead > self.max_overhead: self.interval_seconds *= 1.5 # Too greedy, sample less often
+
+    def _sample(self):
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_thread_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id: continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+            self.stack_counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed_lines(self):
+        return [f"{stack} {count}" for stack, count in self.stack_counts.most_common()]
+
+    def write_collapsed(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as collapsed_file:
+            collapsed_file.write("\n".join(self.collapsed_lines()) + "\n")
+        return path
+# --- End of Sampling Profiler ---
+
+# --- Tcl Call Counter ---
+TCL_CALL_BUDGET = int(os.environ.get("CATOS_TCL_CALL_BUDGET", "100")) # Tcl round trips one frame may make before we name names
+TCL_CALL_REPORT_SITES = 5 # How many of the worst call sites an over-budget frame logs
+
+def tcl_call_name(args):
+    """A readable name for a Tcl command: 'canvas coords', 'canvas create image', 'image copy', 'after'..."""
+    if len(args) == 1 and isinstance(args[0], tuple): args = args[0] # Some tkinter methods hand over one tuple
+    target = str(args[0])
+    subcommand = str(args[1]) if len(args) > 1 else ''
+    if target.startswith('.'): # A widget path like .!toplevel.!canvas
+        kind = target.rsplit('.', 1)[-1].lstrip('!').rstrip('0123456789') or 'root'
+    elif target.startswith('pyimage'):
+        kind = 'image'
+    else: # A plain Tcl command: 'after', 'update', 'image create'...
+        return f"{target} {subcommand}" if subcommand.isalpha() else target
+    if subcommand == 'create' and len(args) > 2: subcommand += f" {args[2]}"
+    return f"{kind} {subcommand}"
+
+def tcl_call_site():
+    """Where the Tcl call came from: the first frame outside tkinter (and outside the counter itself)."""
+    frame = sys._getframe(3) # Skip tcl_call_site, TclCallCounter.count and CountingTclInterpreter.call
+    while frame is not None and frame.f_globals.get('__name__') == 'tkinter':
+        frame = frame.f_back
+    if frame is None: return '?'
+    return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+class CountingTclInterpreter:
+    """Stands in for a widget's or image's Tcl interpreter (its .tk) and counts every call on the way through."""
+    def __init__(self, interpreter, counter):
+        self.interpreter = interpreter
+        self.counter = counter
+
+    def call(self, *args):
+        self.counter.count(args)
+        return self.interpreter.call(*args)
+
+    def __getattr__(self, name): # splitlist, getboolean, createcommand... straight through, uncounted
+        return getattr(self.interpreter, name)
+
+class TclCallCounter:
+    """
+    Counts Python->Tcl round trips (canvas coords, create_image, itemconfig, PhotoImage put/copy...) per frame,
+    by command and by call site. attach() swaps a widget's or image's .tk for a CountingTclInterpreter; images made
+    by an attached widget inherit it. A frame with more than budget_calls calls logs its worst call sites,
+    so something like a per-pixel rectangle loop shows up the first frame it happens.
+    """
+    def __init__(self, budget_calls=TCL_CALL_BUDGET, window_frames=PROFILER_WINDOW_FRAMES):
+        self.budget_calls = budget_calls
+        self.window_frames = window_frames
+        self.reset()
+
+    def reset(self):
+        self.frame_calls = collections.Counter() # (command, call site) -> calls so far this frame
+        self.calls_per_frame = collections.deque(maxlen=self.window_frames)
+        self.command_totals = collections.Counter()
+        self.site_totals = collections.Counter()
+        self.frames = 0
+        self.over_budget_frames = 0
+        self.was_over_budget = False
+
+    def attach(self, *tk_objects):
+        for tk_object in tk_objects:
+            if not isinstance(tk_object.tk, CountingTclInterpreter):
+                tk_object.tk = CountingTclInterpreter(tk_object.tk, self)
+
+    @staticmethod
+    def detach(*tk_objects):
+        for tk_object in tk_objects:
+            if isinstance(tk_object.tk, CountingTclInterpreter):
+                tk_object.tk = tk_object.tk.interpreter
+
+    def count(self, args):
+        self.frame_calls[(tcl_call_name(args), tcl_call_site())] += 1
+
+    def end_frame(self):
+        """Files this frame's calls away and returns how many there were. Logs the call sites of an over-budget frame."""
+        frame_calls, self.frame_calls = self.frame_calls, collections.Counter()
+        total_calls = sum(frame_calls.values())
+        self.calls_per_frame.append(total_calls)
+        self.frames += 1
+        for (command, site), calls in frame_calls.items():
+            self.command_totals[command] += calls
+            self.site_totals[(command, site)] += calls
+        over_budget = total_calls > self.budget_calls
+        if over_budget:
+            self.over_budget_frames += 1
+            if not self.was_over_budget: # Once per run of bad frames, not 60 times a second
+                print(f"Tcl call budget blown: {total_calls} calls in one frame (budget {self.budget_calls}). Worst call sites:")
+                for (command, site), calls in frame_calls.most_common(TCL_CALL_REPORT_SITES):
+                    print(f"  {calls:6d}  {command:24} {site}")
+        self.was_over_budget = over_budget
+        return total_calls
+
+    def percentiles(self):
+        """(p50, p95, p99) calls per frame over the rolling window."""
+        ordered = sorted(self.calls_per_frame)
+        if not ordered: return (0, 0, 0)
+        return tuple(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] for fraction in (0.5, 0.95, 0.99))
+
+    def report_lines(self, top_commands=3):
+        p50, p95, p99 = self.percentiles()
+        lines = [f"TCL {p50:4d} {p95:4d} {p99:4d} CALLS, OVER {self.budget_calls}: {self.over_budget_frames}/{self.frames}"]
+        for command, calls in self.command_totals.most_common(top_commands):
+            lines.append(f"  {command.upper():22} {calls / max(1, self.frames):6.1f}/F")
+        return lines
+
+    def summary(self):
+        """Everything counted so far as plain data, for JSON export."""
+        p50, p95, p99 = self.percentiles()
+        frames = max(1, self.frames)
+        return {
+            "frames": self.frames, "budget_calls": self.budget_calls, "over_budget_frames": self.over_budget_frames,
+            "calls_per_frame_p50": p50, "calls_per_frame_p95": p95, "calls_per_frame_p99": p99,
+            "calls_per_frame_by_command": {command: calls / frames for command, calls in self.command_totals.most_common()},
+            "calls_per_frame_by_site": {f"{command} @ {site}": calls / frames for (command, site), calls in self.site_totals.most_common(20)},
+        }
+# --- End of Tcl Call Counter ---
+
+# --- Batched Canvas ---
+CANVAS_BATCH_PROC = "catos_canvas_batch" # Tcl proc that runs a list of queued canvas commands
+
+class BatchedCanvas(tk.Canvas):
+    """
+    A tk.Canvas that queues the calls a frame makes over and over (coords, move, itemconfig, delete, xview_moveto,
+    tag_raise/lift and tag_lower/lower) instead of sending each one to Tcl. flush() hands them all to a little Tcl proc
+    as one list, one round trip, and the commands go over as plain tuples, so there's no script text to build or quote.
+    A call only folds into the one queued before it for the same item (coords replace, itemconfig options merge,
+    moves add up); anything queued in between and it goes on the end instead, so nothing ever jumps the line.
+    Creating items, or reading anything back, flushes first, so Tk always sees the calls in order.
+    Set batching to False and every call goes straight through again.
+    """
+    def __init__(self, master=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.tk.call('proc', CANVAS_BATCH_PROC, 'commands', 'foreach command $commands {{*}$command}')
+        self.batching = True
+        self.pending = {} # unique key -> queued command, in the order the calls were made
+        self.latest_keys = {} # (kind, tag or id) -> key of the last command queued for it
+        self.pending_serial = 0
+        self.flushes = 0
+        self.flushed_commands = 0
+
+    def _unique_key(self, kind):
+        self.pending_serial += 1
+        return (kind, self.pending_serial)
+
+    def _last_key(self):
+        return next(reversed(self.pending)) if self.pending else None
+
+    def _queue_latest(self, kind, tag_or_id, command):
+        """Replaces the command queued for this item if it's still the last one queued, else adds it on the end."""
+        key = self.latest_keys.get((kind, tag_or_id))
+        if key is None or key != self._last_key(): # Something got queued after it, replacing it would reorder them
+            key = self.latest_keys[(kind, tag_or_id)] = self._unique_key(kind)
+        self.pending[key] = command
+
+    def flush(self):
+        """Sends every queued command to Tcl in one go. Returns how many there were."""
+        if not self.pending: return 0
+        queued_commands, self.pending, self.latest_keys = self.pending.values(), {}, {}
+        widget_path = self._w
+        commands = []
+        for command in queued_commands:
+            if isinstance(command[-1], dict): # itemconfigure's options
+                command = command[:-1] + tuple(word for name, value in command[-1].items() for word in ('-' + name.rstrip('_'), value))
+            commands.append((widget_path,) + command)
+        self.flushes += 1
+        self.flushed_commands += len(commands)
+        self.tk.call(CANVAS_BATCH_PROC, tuple(commands))
+        return len(commands)
+
+    def coords(self, *args):
+        if not self.batching or len(args) < 2: # Reading coords back needs everything before it done
+            self.flush()
+            return super().coords(*args)
+        tag_or_id = args[0]
+        values = args[1] if len(args) == 2 and isinstance(args[1], (list, tuple)) else args[1:]
+        self._queue_latest('coords', tag_or_id, ('coords', tag_or_id) + tuple(values))
+
+    def move(self, *args):
+        if not self.batching: return super().move(*args)
+        tag_or_id, dx, dy = args
+        last_key = self._last_key()
+        if last_key is not None:
+            last_command = self.pending[last_key]
+            if last_command[0] == 'move' and last_command[1] == tag_or_id: # Still on top, nothing in between to reorder
+                self.pending[last_key] = ('move', tag_or_id, last_command[2] + dx, last_command[3] + dy)
+                return
+        self.pending[self._unique_key('move')] = ('move', tag_or_id, dx, dy)
+
+    def itemconfigure(self, tagOrId, cnf=None, **kw):
+        if not self.batching or isinstance(cnf, str) or not (cnf or kw): # Reading options back
+            self.flush()
+            return super().itemconfigure(tagOrId, cnf, **kw)
+        options = dict(cnf or {}, **kw)
+        key = self.latest_keys.get(('itemconfigure', tagOrId))
+        if key is not None and key == self._last_key(): # Only merge into it while nothing has been queued after it
+            options = {**self.pending[key][-1], **options}
+        self._queue_latest('itemconfigure', tagOrId, ('itemconfigure', tagOrId, options))
+    itemconfig = itemconfigure
+
+    def delete(self, *args):
+        if not self.batching: return super().delete(*args)
+        for tag_or_id in args: # Whatever was last queued for a deleted item would be wasted
+            if not isinstance(tag_or_id, int): continue # A tag can match other items by the time the delete runs
+            for kind in ('coords', 'itemconfigure'):
+                key = self.latest_keys.pop((kind, tag_or_id), None)
+                if key is not None: self.pending.pop(key, None)
+        self.pending[self._unique_key('delete')] = ('delete',) + args
+
+    def xview_moveto(self, fraction):
+        if not self.batching: return super().xview_moveto(fraction)
+        self._queue_latest('xview', None, ('xview', 'moveto', fraction))
+
+    def tag_raise(self, *args):
+        if not self.batching: return super().tag_raise(*args)
+        self.pending[self._unique_key('raise')] = ('raise',) + args
+
+    def tag_lower(self, *args):
+        if not self.batching: return super().tag_lower(*args)
+        self.pending[self._unique_key('lower')] = ('lower',) + args
+
+    lift = tkraise = tag_raise # tk.Canvas binds these to its own tag_raise/tag_lower, which would skip the queue
+    lower = tag_lower
+
+    def _create(self, *args, **kwargs): # Every create_* ends up here. The new item must come after what's queued
+        self.flush()
+        return super()._create(*args, **kwargs)
+# --- End of Batched Canvas ---
+
+# --- Software Framebuffer Renderer ---
+RENDERERS = ('canvas', 'framebuffer') # MarioGameWindow's renderer= choices. 'canvas' is the chunk-image renderer
+FRAMEBUFFER_CACHED_CHUNKS = 8 # Painted background chunks kept around; the camera only ever needs two or three
+
+class FramebufferRenderer:
+    """
+    Draws a whole frame into one 256x240 RGB buffer, like the NES does, then scales it to the display and hands it over
+    as a binary PPM: one PhotoImage put per frame instead of a canvas full of items. The level background is painted
+    lazily in CHUNK_WIDTH_NES-wide chunks, so a frame is a camera-wide slice of a chunk or two plus the sprites on top.
+    Uses NumPy when it's around and plain bytearrays when it isn't.
+    """
+    def __init__(self, level_tiles, color_map, sky_color, output_width=DISPLAY_WIDTH, output_height=DISPLAY_HEIGHT, use_numpy=NUMPY_ENABLED):
+        self.color_map = color_map
+        self.sky_rgb = parse_hex_color(sky_color)[:3]
+        self.width, self.height = NES_SCREEN_WIDTH, NES_SCREEN_HEIGHT
+        self.use_numpy = use_numpy
+        self.scalers = {} # (output_width, output_height) -> what set_output_size worked out for that size
+        self.sprites = {} # (id(sprite_definition), width, height) -> (sprite_definition, rasterized sprite)
+        self.chunk_tiles = collections.defaultdict(list) # chunk_index -> tiles overlapping it, in level order
+        self.chunk_images = collections.OrderedDict() # chunk_index -> painted background, least recently used first
+        for tile_def in level_tiles:
+            self.add_tile(tile_def)
+        self.set_output_size(output_width, output_height)
+
+    def set_output_size(self, output_width, output_height):
+        """Changes the size render() scales to. Each size's scaling tables are worked out once and kept."""
+        scaler = self.scalers.get((output_width, output_height))
+        if scaler is None:
+            # Which source pixel each output pixel shows: plain nearest-neighbour scaling
+            source_rows = [y * self.height // output_height for y in range(output_height)]
+            source_columns = [x * self.width // output_width for x in range(output_width)]
+            if self.use_numpy:
+                scaler = (np.array(source_rows), np.array(source_columns), None)
+            else:
+                scaler = (source_rows, None, operator.itemgetter(*[column * 3 + channel for column in source_columns for channel in range(3)]))
+            self.scalers[(output_width, output_height)] = scaler
+        self.source_rows, self.source_columns, self.scale_row = scaler
+        self.output_width, self.output_height = output_width, output_height
+        self.ppm_header = b"P6 %d %d 255\n" % (output_width, output_height)
+
+    def _chunk_range(self, tile_def):
+        x1_nes, _, x2_nes, _ = tile_def['coords_nes']
+        return range(int(x1_nes // CHUNK_WIDTH_NES), int(math.ceil(x2_nes / CHUNK_WIDTH_NES)))
+
+    def add_tile(self, tile_def):
+        for chunk_index in self._chunk_range(tile_def):
+            self.chunk_tiles[chunk_index].append(tile_def)
+            self.chunk_images.pop(chunk_index, None)
+
+    def remove_tile(self, tile_def):
+        for chunk_index in self._chunk_range(tile_def):
+            if tile_def in self.chunk_tiles[chunk_index]: self.chunk_tiles[chunk_index].remove(tile_def)
+            self.chunk_images.pop(chunk_index, None)
+
+    def invalidate_tile(self, tile_def):
+        """The tile's look changed: its chunk(s) get repainted the next time they're on screen."""
+        for chunk_index in self._chunk_range(tile_def):
+            self.chunk_images.pop(chunk_index, None)
+
+    def _sprite(self, sprite_definition, width, height):
+        """The sprite rasterized at NES size: (RGB array, opacity mask) with NumPy, else per row a list of (x, RGB run)."""
+        key = (id(sprite_definition), width, height)
+        cached = self.sprites.get(key)
+        if cached: return cached[1]
+        scanlines = rasterize_sprite_rows(sprite_definition["pixels"], resolve_sprite_colors(sprite_definition, self.color_map), width, height)
+        if self.use_numpy:
+            rgba = np.frombuffer(b"".join(scanlines), dtype=np.uint8).reshape(height, width, 4) if scanlines else np.zeros((0, 0, 4), np.uint8)
+            sprite = (rgba[:, :, :3], rgba[:, :, 3] > 0)
+        else:
+            sprite = []
+            for line in scanlines: # Opaque runs, so blitting is a few slice assignments per row
+                runs, x = [], 0
+                while x < width:
+                    if line[x * 4 + 3] == 0:
+                        x += 1
+                        continue
+                    run_start = x
+                    while x < width and line[x * 4 + 3]: x += 1
+                    runs.append((run_start, b"".join(line[pixel * 4:pixel * 4 + 3] for pixel in range(run_start, x))))
+                sprite.append(runs)
+        self.sprites[key] = (sprite_definition, sprite)
+        return sprite
+
+    def _blit(self, target, target_width, sprite_definition, x, y, width, height):
+        """Draws a sprite with its top-left at (x, y) of target, clipped to the target. Transparent pixels are skipped."""
+        sprite = self._sprite(sprite_definition, width, height)
+        if self.use_numpy:
+            rgb, mask = sprite
+            x1, y1 = max(0, x), max(0, y)
+            x2, y2 = min(target_width, x + width), min(self.height, y + height)
+            if x1 >= x2 or y1 >= y2: return
+            visible_mask = mask[y1 - y:y2 - y, x1 - x:x2 - x]
+            target[y1:y2, x1:x2][visible_mask] = rgb[y1 - y:y2 - y, x1 - x:x2 - x][visible_mask]
+            return
+        for row_offset, runs in enumerate(sprite):
+            row_y = y + row_offset
+            if not 0 <= row_y < self.height: continue
+            row = target[row_y]
+            for run_x, run_rgb in runs:
+                x1 = x + run_x
+                x2 = x1 + len(run_rgb) // 3
+                skip = max(0, -x1)
+                x1, x2 = x1 + skip, min(target_width, x2)
+                if x1 < x2: row[x1 * 3:x2 * 3] = run_rgb[skip * 3:(skip + x2 - x1) * 3]
+
+    def _chunk_image(self, chunk_index):
+        """A chunk's painted background: sky plus every tile in it, in level order like the canvas renderer draws them."""
+        chunk_image = self.chunk_images.get(chunk_index)
+        if chunk_image is not None:
+            self.chunk_images.move_to_end(chunk_index)
+            return chunk_image
+        if self.use_numpy:
+            chunk_image = np.empty((self.height, CHUNK_WIDTH_NES, 3), dtype=np.uint8)
+            chunk_image[:, :] = tuple(self.sky_rgb)
+        else:
+            chunk_image = [bytearray(self.sky_rgb * CHUNK_WIDTH_NES) for _ in range(self.height)]
+        chunk_x = chunk_index * CHUNK_WIDTH_NES
+        for tile_def in self.chunk_tiles.get(chunk_index, ()):
+            x1_nes, y1_nes, x2_nes, y2_nes = tile_def['coords_nes']
+            self._blit(chunk_image, CHUNK_WIDTH_NES, tile_def['sprite_data'], round(x1_nes) - chunk_x, round(y1_nes),
+                       round(x2_nes) - round(x1_nes), round(y2_nes) - round(y1_nes))
+        self.chunk_images[chunk_index] = chunk_image
+        while len(self.chunk_images) > FRAMEBUFFER_CACHED_CHUNKS:
+            self.chunk_images.popitem(last=False)
+        return chunk_image
+
+    def render(self, camera_x, sprites):
+        """
+        One frame as PPM bytes at the output size. sprites: (sprite_definition, x_nes, y_nes, width, height) in world
+        coordinates, drawn in order on top of the level.
+        """
+        camera_px = max(0, round(camera_x))
+        if self.use_numpy:
+            frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        else:
+            frame = [bytearray(self.width * 3) for _ in range(self.height)]
+        frame_x = 0
+        while frame_x < self.width: # The camera straddles at most two chunks
+            chunk_index, chunk_offset = divmod(camera_px + frame_x, CHUNK_WIDTH_NES)
+            span = min(CHUNK_WIDTH_NES - chunk_offset, self.width - frame_x)
+            chunk_image = self._chunk_image(chunk_index)
+            if self.use_numpy:
+                frame[:, frame_x:frame_x + span] = chunk_image[:, chunk_offset:chunk_offset + span]
+            else:
+                for frame_row, chunk_row in zip(frame, chunk_image):
+                    frame_row[frame_x * 3:(frame_x + span) * 3] = chunk_row[chunk_offset * 3:(chunk_offset + span) * 3]
+            frame_x += span
+        for sprite_definition, x_nes, y_nes, width, height in sprites:
+            self._blit(frame, self.width, sprite_definition, round(x_nes) - camera_px, round(y_nes), width, height)
+
+        if self.use_numpy:
+            return self.ppm_header + frame.take(self.source_columns, axis=1).take(self.source_rows, axis=0).tobytes() # Widen the 240 rows first, then repeat them
+        scaled_rows = [bytes(self.scale_row(row)) for row in frame]
+        return self.ppm_header + b"".join([scaled_rows[source_row] for source_row in self.source_rows])
+# --- End of Software Framebuffer Renderer ---
+
+# --- Dynamic Resolution ---
+DRS_WINDOW_FRAMES = 30 # Recent frame times the governor judges by (half a second at 60 FPS)
+DRS_DOWNSHIFT_FRACTION = 0.9 # p90 frame time above this much of the budget: drop a tier
+DRS_UPSHIFT_FRACTION = 0.5 # ...below this much for a whole window: try one tier sharper
+DRS_COOLDOWN_FRAMES = 60 # No dropping again this soon after a switch
+DRS_UPSHIFT_COOLDOWN_FRAMES = 180 # Nor going sharper. Doubles each time a sharper tier had to be dropped again right away
+DRS_MAX_UPSHIFT_COOLDOWN_FRAMES = 60 * 60
+
+def resolution_tiers(zoom):
+    """
+    Render zooms the framebuffer can drop to at a display zoom: the whole divisors of it (1 and 3 at 800x750, 1, 3 and 9
+    at 4K), since Tk's photo copy can only stretch the result back up by a whole number.
+    """
+    return [tier for tier in range(1, zoom + 1) if zoom % tier == 0]
+
+class ResolutionGovernor:
+    """
+    Picks the framebuffer's render tier from recent frame times: drops to a blurrier tier when the p90 frame gets close
+    to the budget and creeps back up once frames are cheap. Separate thresholds and cooldowns keep it from flapping,
+    and a sharper tier that didn't hold makes the next try at it wait twice as long.
+    """
+    def __init__(self, tiers, budget_ms=FRAME_BUDGET_MS, window_frames=DRS_WINDOW_FRAMES):
+        self.tiers = sorted(tiers)
+        self.tier_index = len(self.tiers) - 1 # Start sharp, drop only if we must
+        self.budget_ms = budget_ms
+        self.frame_ms = collections.deque(maxlen=window_frames)
+        self.frames_since_switch = 0
+        self.upshift_cooldown_frames = DRS_UPSHIFT_COOLDOWN_FRAMES
+        self.last_switch_was_upshift = False
+        self.switches = 0
+        self.last_p90_ms = 0.0 # The p90 of the last full window, the one a switch was judged on
+        self.frames_at_tier = collections.Counter()
+
+    @property
+    def tier(self):
+        return self.tiers[self.tier_index]
+
+    def p90(self):
+        ordered = sorted(self.frame_ms)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] if ordered else 0.0
+
+    def record(self, frame_ms):
+        """Feeds one frame's time in. Returns the new tier if this frame made it switch, else None."""
+        self.frames_at_tier[self.tier] += 1
+        self.frame_ms.append(frame_ms)
+        self.frames_since_switch += 1
+        if len(self.frame_ms) < self.frame_ms.maxlen: return None
+        p90_ms = self.last_p90_ms = self.p90()
+        if p90_ms > self.budget_ms * DRS_DOWNSHIFT_FRACTION and self.tier_index > 0 and self.frames_since_switch >= DRS_COOLDOWN_FRAMES:
+            if self.last_switch_was_upshift and self.frames_since_switch < self.upshift_cooldown_frames: # Went sharper too soon
+                self.upshift_cooldown_frames = min(self.upshift_cooldown_frames * 2, DRS_MAX_UPSHIFT_COOLDOWN_FRAMES)
+            return self._switch(-1)
+        if p90_ms < self.budget_ms * DRS_UPSHIFT_FRACTION and self.tier_index < len(self.tiers) - 1 and self.frames_since_switch >= self.upshift_cooldown_frames:
+            return self._switch(+1)
+        return None
+
+    def _switch(self, step):
+        self.tier_index += step
+        self.last_switch_was_upshift = step > 0
+        self.frames_since_switch = 0
+        self.frame_ms.clear() # Frames at the old tier say nothing about this one
+        self.switches += 1
+        return self.tier
+
+    def report_lines(self):
+        return [f"RES TIER {self.tier}X OF {self.tiers[-1]}X, P90 {self.last_p90_ms:.2f} MS, {self.switches} SWITCHES"]
+# --- End of Dynamic Resolution ---
+
+
 # --- Sound Engine Constants and Data ---
 SAMPLE_RATE = 44100
 NOTE_FREQUENCIES = {
@@ -197,7 +1954,7 @@ class SoundEngine:
             return
         self.is_playing = True
         self.loop_playback = loop
-        self.playback_thread = threading.Thread(target=self._playback_task, daemon=True)
+        self.playback_thread = threading.Thread(target=self._playback_task, name="SoundEngine", daemon=True)
         self.playback_thread.start()
         print("SoundEngine: Music started! Time to groove, baby!")
 
@@ -286,33 +2043,9 @@ class MarioMainMenuWindow(tk.Toplevel):
 
         if not (native_art_w > 0 and native_art_h > 0): return
 
-        self.cursor_photo_image = tk.PhotoImage(width=cursor_display_size_w, height=cursor_display_size_h)
-        
-        pixel_w_on_image = cursor_display_size_w / native_art_w
-        pixel_h_on_image = cursor_display_size_h / native_art_h
-
-        resolved_colors = {
-            char_key: self.master_catos.COLOR_MAP.get(mapped_color_key)
-            for char_key, mapped_color_key in self.cursor_pixel_data["colors"].items()
-            if mapped_color_key is not None
-        }
-
-        for r_idx, row_str in enumerate(art_rows):
-            for c_idx, color_char_key in enumerate(row_str):
-                actual_fill_color = resolved_colors.get(color_char_key)
-                if actual_fill_color:
-                    x1 = round(c_idx * pixel_w_on_image)
-                    y1 = round(r_idx * pixel_h_on_image)
-                    x2 = round((c_idx + 1) * pixel_w_on_image)
-                    y2 = round((r_idx + 1) * pixel_h_on_image)
-                    
-                    for y_px in range(y1, y2):
-                        for x_px in range(x1, x2):
-                            if 0 <= x_px < cursor_display_size_w and 0 <= y_px < cursor_display_size_h:
-                                try:
-                                    self.cursor_photo_image.put(actual_fill_color, (x_px, y_px))
-                                except tk.TclError:
-                                    pass # Silently fail if color or coords are invalid, better than crashing, meow!
+        resolved_colors = resolve_sprite_colors(self.cursor_pixel_data, self.master_catos.COLOR_MAP)
+        png_bytes = rasterize_sprite_png(art_rows, resolved_colors, cursor_display_size_w, cursor_display_size_h)
+        self.cursor_photo_image = photo_image_from_png(png_bytes, master=self) # One Tcl call, not a thousand, meow!
 
 
     def draw_menu_elements(self):
@@ -385,75 +2118,126 @@ class MarioMainMenuWindow(tk.Toplevel):
 
 
 class MarioGameWindow(tk.Toplevel):
-    def __init__(self, master):
+    def __init__(self, master, sprite_disk_cache=None, simulation_hz=SIMULATION_HZ, render_fps=FPS, record_path=None, replay_log=None, level_tiles=None, renderer='canvas', dynamic_resolution=False,
+                 pacer_thread=False, pacer_spin=False, telemetry_path=None, level_triggers=None):
         super().__init__(master)
+        if renderer not in RENDERERS: raise ValueError(f"Unknown renderer {renderer!r}, pick one of {', '.join(RENDERERS)}")
+        if dynamic_resolution and renderer != 'framebuffer': raise ValueError("dynamic_resolution needs renderer='framebuffer'")
+        launch_start_time = time.perf_counter() # For the time-to-first-frame report
         self.master_catos = master
         self.title("Mini Mario Game - SMB 1-1 Purr-fected++ Optimized!")
         self.geometry(f"{DISPLAY_WIDTH}x{DISPLAY_HEIGHT}")
         self.resizable(False, False)
 
         self.NES_SKY_BLUE = master.NES_SKY_BLUE
-        self.configure(bg=self.NES_SKY_BLUE)
-
-        self.canvas = tk.Canvas(self, width=DISPLAY_WIDTH, height=DISPLAY_HEIGHT, bg=self.NES_SKY_BLUE, highlightthickness=0)
-        self.canvas.pack()
-
-        self.scale = DISPLAY_WIDTH / NES_SCREEN_WIDTH # Canvas pixels per NES pixel
-
-        self.player_x = 3 * PLAYER_SIZE
-        self.player_y = NES_SCREEN_HEIGHT - 2 * PLAYER_SIZE
-        self.player_vy = 0
-        self.is_jumping = False
-        self.on_ground = True # Bug 16 fix: Mario starts on the ground, ready to rumble!
-
-        self.camera_x = 0
+        self.configure(bg="black") # Letterbox bars around the picture
+
+        self.scale = display_zoom(DISPLAY_WIDTH, DISPLAY_HEIGHT) # Canvas pixels per NES pixel, always a whole number
+        self.view_width_px = NES_SCREEN_WIDTH * self.scale
+        self.view_height_px = NES_SCREEN_HEIGHT * self.scale
+        self.canvas = BatchedCanvas(self, width=self.view_width_px, height=self.view_height_px, bg=self.NES_SKY_BLUE, highlightthickness=0)
+        self.canvas.place(relx=0.5, rely=0.5, anchor='center')
+
+        level_tiles = build_smb_1_1_tiles() if level_tiles is None else level_tiles # Any other layout is handy for stress tests
+        # Level and Mario live at world coordinates; the camera just scrolls the canvas view (_scroll_view_to_camera).
+        # One screen of slack on the right so the scrollregion never clamps the camera.
+        self.scroll_width_px = (level_width_nes(level_tiles) + NES_SCREEN_WIDTH) * self.scale
+        self.canvas.configure(scrollregion=(0, 0, self.scroll_width_px, self.view_height_px))
+        self.view_origin_px = 0 # Canvas x at the left edge of the view, whole pixels just like Tk keeps it
         self.COLOR_MAP = master.COLOR_MAP
         
         self.player_image_id = None # Stores canvas ID for the player's image
         self.sprite_images = {} # Cache for PhotoImage objects: {sprite_key: PhotoImage}, so speedy!
+        self.sprite_disk_cache = sprite_disk_cache if sprite_disk_cache is not None else SpriteDiskCache() # Survives relaunches!
 
-        # Bug 1 fix: Initialize pressed_keys, a secret weapon!
-        self.pressed_keys = set() # To keep track of what keys are being held down, it's like a secret diary!
+        # Bug 1 fix: Track the keyboard, a secret weapon! Raw events in, one clean bitmask per tick out
+        self.keyboard = KeyboardInput()
+        self.input_latency = InputLatencyTracker() # Key event -> physics tick -> frame on screen, always on, it's cheap
+        self.present_after_id = None # after_idle that timestamps the frame once Tk has drawn it
+        self.telemetry_path = telemetry_path # Where on_closing writes everything the instruments measured, if anywhere
         
         # Bug 11 fix: Mario sprite state, he's a chameleon!
         self.player_state = 'standing' # 'standing', 'walking', 'jumping'
         self.player_facing_right = True # For future mirroring, if we get fancy!
 
-        # Bug 10 fix: Score system, gotta keep track of those points!
-        self.score = 0
+        # Bug 10 fix: Score display, gotta show off those points!
         self.score_text_id = None
-
-        # Bug 18 fix: Win condition flag, aim for glory!
-        self.game_won = False
+        # Bug 18 fix: Win message, aim for glory!
         self.win_text_id = None
 
-        # Bug 3 fix: Refactored level data to individual tiles, so clean, so powerful!
-        self.level_tiles = [] # List of individual tile definitions, much cleaner!
-        self.collidable_platform_coords = [] # Still need this for collision detection
-
-        self._build_level() # Populate self.level_tiles and pre-cache block sprites, building dreams!
+        # The game itself: player, level collision, camera, score, win. This window just draws it and feeds it keys
+        if replay_log is not None:
+            try:
+                replay_log.check_level(level_tiles, level_triggers)
+                simulation_hz = replay_log.simulation_hz # Same tick rate as the recording, or it won't play out the same
+                print(f"Replaying {len(replay_log)} recorded ticks. Sit back and watch!")
+            except ValueError as error:
+                print(f"WARNING: {error}. Ignoring the replay, you're playing live!")
+                replay_log = None
+        self.replay_log = replay_log
+        self.replay_position = 0
+        self.simulation = MarioSimulation(level_tiles, simulation_hz=simulation_hz, level_triggers=level_triggers)
+        # Every tick's input, 1 byte each. Saved to record_path when the window closes
+        self.record_path = record_path
+        self.input_recording = InputLog(level_fingerprint(level_tiles, level_triggers), simulation_hz)
+        # Static level is baked into chunk images, CHUNK_COLUMNS columns each. {chunk_index: chunk dict}
+        self.level_chunks = {}
+        self.visible_chunk_indices = set() # Chunks with at least one tile in view
+        # Tiles bucketed by column; tiles scrolling in and out show and hide their chunks
+        self.tile_visibility = ColumnVisibilityIndex(on_enter=self._on_tile_enter_view, on_exit=self._on_tile_exit_view)
+        # renderer='framebuffer': no chunks or tile items at all, every frame is one image composited in software
+        self.renderer = renderer
+        self.framebuffer = None
+        if renderer == 'framebuffer':
+            self.framebuffer = FramebufferRenderer(self.simulation.level_tiles, self.COLOR_MAP, self.NES_SKY_BLUE, self.view_width_px, self.view_height_px)
+            self.framebuffer_image = tk.PhotoImage(master=self, width=self.view_width_px, height=self.view_height_px)
+            self.framebuffer_item_id = self.canvas.create_image(0, 0, image=self.framebuffer_image, anchor='nw')
+        # dynamic_resolution: render the framebuffer at a lower zoom when frames run long, and stretch it back up in Tk
+        self.resolution_governor = ResolutionGovernor(resolution_tiers(self.scale)) if dynamic_resolution else None
+        self.tier_images = {} # Render tier -> PhotoImage the frame lands in before Tk zooms it to the display
+
+        self._build_level() # Index the level's tiles and pre-cache block sprites, building dreams!
         
         self.bind_keys()
         self.focus_set() # Crucial for Toplevel to receive key events, gotta listen up!
         self.game_loop_active = True
         self.last_frame_time = time.perf_counter() # For FPS calculation, keeping it smooth!
+        # Fixed-timestep clock: real time goes into the accumulator and comes out as whole physics ticks
+        self.render_fps = render_fps
+        self.tick_seconds = 1.0 / simulation_hz
+        self.sim_accumulator = 0.0
+        self.dropped_sim_seconds = 0.0 # Time we gave up on after hitting MAX_CATCH_UP_TICKS
+        self.previous_render_state = None # (player_x, player_y, camera_x) before the latest tick, for interpolation
+        self.frame_profiler = FramePhaseProfiler() # F3 toggles it and its overlay
+        self.tcl_call_counter = TclCallCounter() # ...and this one, counting our Tcl calls while it's on
+        self.stack_sampler = None # F4 starts and stops a StackSampler
+        self.profiler_overlay_id = None
+        self.frame_pacer = FramePacer(render_fps, timer_thread=pacer_thread, spin=pacer_spin) # Frames are due on a fixed grid of deadlines
         
         self._draw_all_level_elements() # Initial draw before loop starts
         self.update_score_display() # Show the score right away!
+        self.update_idletasks() # Flush the first frame to the screen before we time it
+        self.first_frame_ms = (time.perf_counter() - launch_start_time) * 1000
+        cache = self.sprite_disk_cache
+        start_kind = "warm" if cache.misses == 0 and cache.hits > 0 else "cold"
+        print(f"First frame in {self.first_frame_ms:.1f} ms ({start_kind} start: {cache.hits} sprite cache hits, {cache.misses} misses)")
+        self.last_frame_time = time.perf_counter() # Loading time isn't game time, don't try to catch up on it
+        self.frame_pacer.reset(self.last_frame_time)
         self.game_loop_step() # Bug 6 fix: Start the game loop from here directly, less confusing!
 
-    def _get_or_create_sprite_image(self, sprite_type_key, sprite_definition, entity_display_width, entity_display_height):
+    def _get_or_create_sprite_image(self, sprite_type_key, sprite_definition, entity_width_nes, entity_height_nes):
         """
-        Creates (or retrieves from cache) a PhotoImage for a given sprite type and display size.
-        It's like a magic factory for pixel art!
+        Creates (or retrieves from cache) a display-size PhotoImage for a sprite drawn entity_width_nes x entity_height_nes
+        NES pixels big. It's rasterized at that NES size and zoomed up by self.scale in Tk, so a 4K display costs
+        no more rasterizing than an 800x750 one. It's like a magic factory for pixel art!
         """
-        entity_display_width = int(round(entity_display_width))
-        entity_display_height = int(round(entity_display_height))
+        entity_width_nes = int(round(entity_width_nes))
+        entity_height_nes = int(round(entity_height_nes))
 
-        if entity_display_width <= 0 or entity_display_height <= 0:
+        if entity_width_nes <= 0 or entity_height_nes <= 0:
             return None # Cannot create a zero or negative size image, that's just silly!
 
-        cache_key = f"{sprite_type_key}_{entity_display_width}x{entity_display_height}"
+        cache_key = f"{sprite_type_key}_{entity_width_nes * self.scale}x{entity_height_nes * self.scale}"
 
         if cache_key in self.sprite_images:
             return self.sprite_images[cache_key]
@@ -464,239 +2248,319 @@ class MarioGameWindow(tk.Toplevel):
 
         if not (native_art_w > 0 and native_art_h > 0): return None
 
-        img = tk.PhotoImage(width=entity_display_width, height=entity_display_height)
-
-        pixel_w_on_image = entity_display_width / native_art_w
-        pixel_h_on_image = entity_display_height / native_art_h
-        
-        resolved_sprite_colors = {
-            char_key: self.COLOR_MAP.get(mapped_color_key)
-            for char_key, mapped_color_key in sprite_definition["colors"].items()
-            if mapped_color_key is not None
-        }
+        resolved_sprite_colors = resolve_sprite_colors(sprite_definition, self.COLOR_MAP)
+        disk_key = SpriteDiskCache.make_key(art_rows, resolved_sprite_colors, entity_width_nes, entity_height_nes)
+        img = self.sprite_disk_cache.load(disk_key, master=self) # Warm start? Straight from the PNG file!
+        if img is None:
+            # Whole image in one buffer, handed to Tk in one call. No more thousands of put() round-trips!
+            png_bytes = rasterize_sprite_png(art_rows, resolved_sprite_colors, entity_width_nes, entity_height_nes)
+            self.sprite_disk_cache.store(disk_key, png_bytes)
+            img = photo_image_from_png(png_bytes, master=self)
+        if self.scale > 1: img = img.zoom(self.scale) # Whole-pixel zoom in C, one Tcl call
 
-        for r_idx, row_str in enumerate(art_rows):
-            for c_idx, color_char_key in enumerate(row_str):
-                actual_fill_color = resolved_sprite_colors.get(color_char_key)
-                if actual_fill_color:
-                    x1 = round(c_idx * pixel_w_on_image)
-                    y1 = round(r_idx * pixel_h_on_image)
-                    x2 = round((c_idx + 1) * pixel_w_on_image)
-                    y2 = round((r_idx + 1) * pixel_h_on_image)
-                    
-                    for y_px in range(y1, y2):
-                        for x_px in range(x1, x2):
-                            if 0 <= x_px < entity_display_width and 0 <= y_px < entity_display_height:
-                                try:
-                                    img.put(actual_fill_color, (x_px, y_px))
-                                except tk.TclError:
-                                    pass # Just keep going, no biggie!
-        
         self.sprite_images[cache_key] = img
         return img
 
-    def _add_level_block_to_tiles(self, map_x_blocks, map_y_bottom_blocks, type_str, sprite_data, width_blocks=1, height_blocks=1, collidable=True):
+    def _build_level(self):
+        """Files the simulation's tiles into chunks and the visibility index, and pre-caches their sprite PhotoImages."""
+        if self.framebuffer is not None: return # It keeps its own tile index and NES-sized sprites
+        for tile_def in self.simulation.level_tiles:
+            self._index_tile(tile_def)
+            self._get_or_create_sprite_image(tile_def['type'], tile_def['sprite_data'], *self._tile_size_nes(tile_def))
+
+    def _tile_size_nes(self, tile_data):
+        """NES size of a tile's sprite. Flagpole pole segments are thin, everything else is a full block."""
+        if tile_data['type'] == 'flagpole_pole':
+            x1_nes, y1_nes, x2_nes, y2_nes = tile_data['coords_nes']
+            return x2_nes - x1_nes, y2_nes - y1_nes
+        return PLAYER_SIZE, PLAYER_SIZE
+
+    def _chunk_range_for_span(self, x1_nes, x2_nes):
+        """Indices of every chunk the NES x-span [x1_nes, x2_nes) touches."""
+        first_chunk = int(x1_nes // CHUNK_WIDTH_NES)
+        last_chunk = int(math.ceil(x2_nes / CHUNK_WIDTH_NES)) - 1
+        return range(first_chunk, max(first_chunk, last_chunk) + 1)
+
+    def _index_tile(self, tile_def):
+        """Files a new tile into its chunk(s) and into the column visibility index."""
+        x1_nes, _, x2_nes, _ = tile_def['coords_nes']
+        for chunk_index in self._chunk_range_for_span(x1_nes, x2_nes):
+            chunk = self.level_chunks.get(chunk_index)
+            if chunk is None:
+                chunk = {'tiles': [], 'image': None, 'canvas_item_id': None, 'x_px': 0, 'y_px': 0, 'dirty': True, 'visible_tiles': 0}
+                self.level_chunks[chunk_index] = chunk
+            chunk['tiles'].append(tile_def)
+            chunk['dirty'] = True
+        self.tile_visibility.add(tile_def, x1_nes, x2_nes)
+
+    def invalidate_tile(self, tile_def):
+        """Marks the chunk(s) holding this tile for re-rasterization. Only those chunks get rebuilt, nothing else!"""
+        if self.framebuffer is not None:
+            self.framebuffer.invalidate_tile(tile_def)
+            return
+        x1_nes, _, x2_nes, _ = tile_def['coords_nes']
+        for chunk_index in self._chunk_range_for_span(x1_nes, x2_nes):
+            if chunk_index in self.level_chunks:
+                self.level_chunks[chunk_index]['dirty'] = True
+
+    def replace_tile_sprite(self, tile_def, type_str, sprite_data):
+        """Swaps a tile's look (e.g. a bumped question block) and marks its chunk dirty."""
+        tile_def['type'] = type_str
+        tile_def['sprite_data'] = sprite_data
+        if self.framebuffer is None: self._get_or_create_sprite_image(type_str, sprite_data, *self._tile_size_nes(tile_def))
+        self.invalidate_tile(tile_def)
+
+    def remove_tile(self, tile_def):
+        """Takes a tile out of the level (e.g. a broken brick): no more drawing, no more colliding."""
+        if not self.simulation.remove_tile(tile_def): return
+        if self.framebuffer is not None:
+            self.framebuffer.remove_tile(tile_def)
+            return
+        self.tile_visibility.remove(tile_def)
+        x1_nes, _, x2_nes, _ = tile_def['coords_nes']
+        for chunk_index in self._chunk_range_for_span(x1_nes, x2_nes):
+            chunk = self.level_chunks.get(chunk_index)
+            if chunk and tile_def in chunk['tiles']:
+                chunk['tiles'].remove(tile_def)
+                chunk['dirty'] = True
+
+    def _on_tile_enter_view(self, tile_def):
+        x1_nes, _, x2_nes, _ = tile_def['coords_nes']
+        for chunk_index in self._chunk_range_for_span(x1_nes, x2_nes):
+            chunk = self.level_chunks[chunk_index]
+            chunk['visible_tiles'] += 1
+            if chunk['visible_tiles'] == 1:
+                self.visible_chunk_indices.add(chunk_index)
+                self._show_chunk(chunk_index, chunk)
+
+    def _on_tile_exit_view(self, tile_def):
+        x1_nes, _, x2_nes, _ = tile_def['coords_nes']
+        for chunk_index in self._chunk_range_for_span(x1_nes, x2_nes):
+            chunk = self.level_chunks[chunk_index]
+            chunk['visible_tiles'] -= 1
+            if chunk['visible_tiles'] == 0:
+                self.visible_chunk_indices.discard(chunk_index)
+                if chunk['canvas_item_id']:
+                    self.canvas.delete(chunk['canvas_item_id'])
+                    chunk['canvas_item_id'] = None
+
+    def _show_chunk(self, chunk_index, chunk):
+        """Puts a chunk's image on the canvas (re-rasterizing it first if it's dirty)."""
+        if chunk['dirty']: self._rasterize_chunk(chunk_index, chunk)
+        if chunk['image'] is None or chunk['canvas_item_id']: return
+        chunk['canvas_item_id'] = self.canvas.create_image(chunk['x_px'], chunk['y_px'], image=chunk['image'], anchor='nw')
+        self.canvas.tag_lower(chunk['canvas_item_id']) # Keep the level behind Mario and the score
+
+    def _rasterize_chunk(self, chunk_index, chunk):
         """
-        Helper to add blocks to the level, breaking them into individual PLAYER_SIZE tiles.
-        Bug 3 fix: This function now adds individual tiles to self.level_tiles.
-        Bug 13 fix: Handles pipes and flagpole tiling logic. So much precision, it's criminal!
+        Composites every tile in a chunk into one PhotoImage. Tk does the copying (and the transparency)
+        in C, so this is a handful of Tcl calls per chunk and only happens when the chunk is dirty.
         """
-        PS = PLAYER_SIZE
-        H_NES = NES_SCREEN_HEIGHT
-
-        # Define sprite data based on type
-        actual_sprite_data = sprite_data
-        
-        if type_str == 'flagpole_pole':
-            # Bug 4 fix: Proper flagpole dimensions and tiling, it's a pole party!
-            pole_native_width_nes = len(FLAGPOLE_POLE_SPRITE_DATA["pixels"][0]) # 2
-            pole_native_height_nes = len(FLAGPOLE_POLE_SPRITE_DATA["pixels"]) # 16
-
-            # Bug 20 fix: Better calculation for flagpole X position relative to its base. So calculated!
-            # Flagpole base is at (142, 1) in blocks. Center pole over base.
-            base_x_nes_center = (map_x_blocks * PS) + (PS / 2)
-            tile_x1_nes_base = base_x_nes_center - (pole_native_width_nes / 2) # Start X of the pole
-            
-            # Bottom of pole is aligned with the top of the ground (y=H_NES - PS)
-            # height_blocks is the total span, in PLAYER_SIZE units
-            tile_y2_nes_base = H_NES - (map_y_bottom_blocks * PS) # Bottom Y of this whole structure
-            
-            # Now, tile the pole segments, piece by pixelated piece!
-            for y_offset_px in range(0, height_blocks * PS, pole_native_height_nes):
-                tile_y1_nes = tile_y2_nes_base - (height_blocks * PS) + y_offset_px # Top Y of current segment
-                
-                tile_def = {
-                    'coords_nes': (tile_x1_nes_base, tile_y1_nes, tile_x1_nes_base + pole_native_width_nes, tile_y1_nes + pole_native_height_nes),
-                    'type': type_str, 'collidable': collidable, 'sprite_data': actual_sprite_data,
-                    'canvas_item_id': None
-                }
-                self.level_tiles.append(tile_def)
-                if collidable: self.collidable_platform_coords.append(tile_def['coords_nes'])
-            
-            # Pre-cache one instance of the flagpole pole sprite (it's always 2x16 NES pixels)
-            self._get_or_create_sprite_image(type_str, actual_sprite_data, pole_native_width_nes * self.scale, pole_native_height_nes * self.scale)
-            return # Special case handled, mission accomplished!
-
-        # For regular blocks (ground, brick, question, pipe top/middle)
-        for row in range(height_blocks):
-            for col in range(width_blocks):
-                tile_x1_nes = (map_x_blocks + col) * PS
-                # Calculate Y from bottom-most block coordinate
-                tile_y1_nes = H_NES - (map_y_bottom_blocks + height_blocks -1 - row) * PS
-
-                current_sprite_data = sprite_data
-                current_type_str = type_str
-                
-                # Bug 13 fix: Logic for drawing pipe middle sections, making them perfectly vertical!
-                if 'pipe' in type_str and height_blocks > 1 and row < height_blocks - 1: # If it's a pipe and not the top segment
-                    current_sprite_data = PIPE_MIDDLE_DATA
-                    current_type_str = type_str + '_middle' # Distinguish pipe middle tiles
-
-                tile_def = {
-                    'coords_nes': (tile_x1_nes, tile_y1_nes, tile_x1_nes + PS, tile_y1_nes + PS),
-                    'type': current_type_str, 'collidable': collidable, 'sprite_data': current_sprite_data,
-                    'canvas_item_id': None
-                }
-                self.level_tiles.append(tile_def)
-                if collidable: self.collidable_platform_coords.append(tile_def['coords_nes'])
-                
-                # Pre-cache PhotoImage for this tile type (for regular 16x16 tiles)
-                tile_display_width = PS * self.scale
-                tile_display_height = PS * self.scale
-                self._get_or_create_sprite_image(current_type_str, current_sprite_data, tile_display_width, tile_display_height)
-
-
-    def _build_level(self):
-        """Populates self.level_tiles with level geometry and pre-caches sprite PhotoImages."""
-        
-        # Bug 3 fix: All block definitions now use _add_level_block_to_tiles, a total revolution!
-        # Ground Segments, building the foundation of fun!
-        self._add_level_block_to_tiles(0, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=69)
-        self._add_level_block_to_tiles(71, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=15)
-        self._add_level_block_to_tiles(90, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=44)
-        self._add_level_block_to_tiles(136, 1, 'ground', GROUND_BLOCK_DATA, width_blocks=(WORLD_WIDTH_BLOCKS - 136))
-
-        # Blocks, so many blocks to bash!
-        self._add_level_block_to_tiles(16, 5, 'question_block_powerup', QUESTION_BLOCK_DATA)
-        self._add_level_block_to_tiles(20, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(21, 5, 'question_block_coin', QUESTION_BLOCK_DATA)
-        self._add_level_block_to_tiles(22, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(23, 5, 'question_block_coin', QUESTION_BLOCK_DATA)
-        self._add_level_block_to_tiles(22, 9, 'question_block_1up', QUESTION_BLOCK_DATA) # Hidden 1-UP, super secret!
-
-        # Pipes - now they look properly structured, perfectly plumbed!
-        self._add_level_block_to_tiles(28, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=2)
-        self._add_level_block_to_tiles(38, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=3)
-        self._add_level_block_to_tiles(46, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=4)
-        self._add_level_block_to_tiles(57, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=4)
-        
-        self._add_level_block_to_tiles(77, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(78, 5, 'brick_coin', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(79, 5, 'brick_star', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(80, 5, 'brick', BRICK_BLOCK_DATA)
-
-        self._add_level_block_to_tiles(90, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(91, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(92, 5, 'question_block_powerup', QUESTION_BLOCK_DATA)
-        self._add_level_block_to_tiles(93, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(92, 9, 'brick_high', BRICK_BLOCK_DATA)
-
-        def add_stair_segment(base_x_blocks, base_y_bottom_blocks, height_in_blocks_for_step):
-            self._add_level_block_to_tiles(base_x_blocks, base_y_bottom_blocks, f'ground_stair', GROUND_BLOCK_DATA,
-                                            width_blocks=1, height_blocks=height_in_blocks_for_step)
-
-        # Pyramids / Stairs, climb them all to reach the top, purr-fectly!
-        add_stair_segment(100, 1, 1); add_stair_segment(101, 1, 2); add_stair_segment(102, 1, 3); add_stair_segment(103, 1, 4)
-        self._add_level_block_to_tiles(106, 5, 'brick', BRICK_BLOCK_DATA); self._add_level_block_to_tiles(107, 5, 'brick', BRICK_BLOCK_DATA); self._add_level_block_to_tiles(108, 5, 'brick', BRICK_BLOCK_DATA)
-        add_stair_segment(113, 1, 1); add_stair_segment(114, 1, 2); add_stair_segment(115, 1, 3); add_stair_segment(116, 1, 4)
-        self._add_level_block_to_tiles(118, 1, 'pipe', PIPE_TOP_DATA, width_blocks=2, height_blocks=2)
-        self._add_level_block_to_tiles(123, 5, 'brick', BRICK_BLOCK_DATA); self._add_level_block_to_tiles(124, 5, 'brick', BRICK_BLOCK_DATA)
-        self._add_level_block_to_tiles(125, 5, 'question_block_powerup', QUESTION_BLOCK_DATA); self._add_level_block_to_tiles(126, 5, 'brick', BRICK_BLOCK_DATA)
-        for i in range(8): self._add_level_block_to_tiles(134 + i, 1, i + 1, GROUND_BLOCK_DATA, width_blocks=1, height_blocks=i+1)
-
-        # Bug 14 fix: Flagpole base is collidable, Mario needs to climb it! So tactical!
-        self._add_level_block_to_tiles(142, 1, 'flagpole_base', FLAGPOLE_BASE_BLOCK_DATA, width_blocks=1, height_blocks=1, collidable=True)
-        # Bug 4 & 14 fix: Flagpole pole is now tiled and collidable! So much fun!
-        self._add_level_block_to_tiles(142, 1, 'flagpole_pole', FLAGPOLE_POLE_SPRITE_DATA, height_blocks=9, collidable=True)
-
-    def _draw_all_level_elements(self):
+        chunk['dirty'] = False
+        if not chunk['tiles']:
+            chunk['image'] = None
+            if chunk['canvas_item_id']: # Nothing left to show, e.g. its last brick got broken
+                self.canvas.delete(chunk['canvas_item_id'])
+                chunk['canvas_item_id'] = None
+            return
+        chunk_x_px = round(chunk_index * CHUNK_WIDTH_NES * self.scale)
+        chunk_w_px = round((chunk_index + 1) * CHUNK_WIDTH_NES * self.scale) - chunk_x_px
+        # Only as tall as the tiles inside it. Ground-only chunks stay nice and skinny!
+        top_y_px = min(round(tile['coords_nes'][1] * self.scale) for tile in chunk['tiles'])
+        bottom_y_px = max(round(tile['coords_nes'][3] * self.scale) for tile in chunk['tiles'])
+        top_y_px = max(0, top_y_px)
+        chunk_h_px = max(1, bottom_y_px - top_y_px)
+
+        chunk_img = tk.PhotoImage(master=self, width=chunk_w_px, height=chunk_h_px)
+        for tile in chunk['tiles']: # Level order, so later tiles are drawn on top like before
+            tile_img = self._get_or_create_sprite_image(tile['type'], tile['sprite_data'], *self._tile_size_nes(tile))
+            if not tile_img: continue
+            dest_x = round(tile['coords_nes'][0] * self.scale) - chunk_x_px
+            dest_y = round(tile['coords_nes'][1] * self.scale) - top_y_px
+            from_x = max(0, -dest_x) # Clip tiles hanging off the left edge of the chunk
+            from_y = max(0, -dest_y)
+            if from_x >= tile_img.width() or from_y >= tile_img.height(): continue
+            chunk_img.tk.call(chunk_img, 'copy', tile_img,
+                              '-from', from_x, from_y, tile_img.width(), tile_img.height(),
+                              '-to', dest_x + from_x, dest_y + from_y)
+
+        chunk['image'] = chunk_img
+        chunk['x_px'] = chunk_x_px
+        chunk['y_px'] = top_y_px
+        if chunk['canvas_item_id']:
+            self.canvas.itemconfig(chunk['canvas_item_id'], image=chunk_img)
+            self.canvas.coords(chunk['canvas_item_id'], chunk_x_px, top_y_px) # Its height may have changed
+
+    def _scroll_view_to_camera(self, camera_x):
         """
-        Updates positions of existing canvas items and creates/deletes as needed.
-        Bug 3 fix: Now handles individual tiles with their canvas_item_ids, so detailed!
+        Scrolls the canvas view to the camera: one xview_moveto, however much level there is.
+        The HUD is moved along with the view so it stays in the same spot on screen.
         """
-        
+        view_origin_px = round(camera_x * self.scale)
+        if view_origin_px == self.view_origin_px: return
+        self.canvas.xview_moveto(view_origin_px / self.scroll_width_px)
+        self.canvas.move('hud', view_origin_px - self.view_origin_px, 0)
+        self.view_origin_px = view_origin_px
+
+    def _render_state(self):
+        simulation = self.simulation
+        return (simulation.player_x, simulation.player_y, simulation.camera_x)
+
+    def _interpolated_render_state(self, alpha):
+        """Where things are drawn: alpha of the way from the previous tick's state to the current one."""
+        current_state = self._render_state()
+        if self.previous_render_state is None or alpha >= 1.0: return current_state
+        return tuple(previous + (current - previous) * alpha for previous, current in zip(self.previous_render_state, current_state))
+
+    def _draw_all_level_elements(self, alpha=1.0, profiler=None):
+        """
+        Scrolls the view, moves the player and streams chunk images in and out as their tiles
+        enter and leave the view. Chunks sit at world coordinates, so once on the canvas they are never touched again!
+        """
+        render_player_x, render_player_y, render_camera_x = self._interpolated_render_state(alpha)
+        self._scroll_view_to_camera(render_camera_x)
+
         # Player drawing, our little superstar!
         player_sprite_data = SMALL_MARIO_STANDING_DATA # Default
-        if self.is_jumping:
+        if self.simulation.is_jumping:
             player_sprite_data = SMALL_MARIO_JUMPING_DATA
-        elif 'a' in self.pressed_keys or 'left' in self.pressed_keys or 'd' in self.pressed_keys or 'right' in self.pressed_keys:
+        elif self.simulation.input_bits & (INPUT_LEFT | INPUT_RIGHT): # Whatever drove the last tick, keys or replay
             player_sprite_data = SMALL_MARIO_WALKING_1_DATA
-        
-        player_photo_image = self._get_or_create_sprite_image("player_current_state", player_sprite_data, PLAYER_SIZE * self.scale, PLAYER_SIZE * self.scale)
+        if self.framebuffer is not None:
+            self._draw_framebuffer(render_player_x, render_player_y, render_camera_x, player_sprite_data, profiler)
+            return
+
+        player_photo_image = self._get_or_create_sprite_image("player_current_state", player_sprite_data, PLAYER_SIZE, PLAYER_SIZE)
         if player_photo_image:
-            player_canvas_x = (self.player_x - self.camera_x) * self.scale
-            player_canvas_y = self.player_y * self.scale
+            player_canvas_x = render_player_x * self.scale
+            player_canvas_y = render_player_y * self.scale
             if self.player_image_id:
                 self.canvas.coords(self.player_image_id, player_canvas_x, player_canvas_y)
                 # Future: handle flipping image for direction! A true hacker sees the future!
             else:
                 self.player_image_id = self.canvas.create_image(player_canvas_x, player_canvas_y, image=player_photo_image, anchor='nw')
+        if profiler: profiler.mark('canvas')
+
+        # Static level chunks, a whole screen of blocks per image! Only columns scrolling in or out get looked at.
+        screen_left_nes = render_camera_x - PLAYER_SIZE # Add buffer for blocks just off screen
+        screen_right_nes = render_camera_x + NES_SCREEN_WIDTH + PLAYER_SIZE
+        self.tile_visibility.update(screen_left_nes, screen_right_nes)
+        for chunk_index in self.visible_chunk_indices: # Re-rasterize on-screen chunks whose tiles changed
+            chunk = self.level_chunks[chunk_index]
+            if chunk['dirty']: self._show_chunk(chunk_index, chunk)
+        if profiler: profiler.mark('culling')
+        self.canvas.flush() # Everything this frame queued on the canvas, in one Tcl call
+        self._timestamp_when_drawn()
+        if profiler: profiler.mark('canvas')
+
+    def _draw_framebuffer(self, render_player_x, render_player_y, render_camera_x, player_sprite_data, profiler=None):
+        """renderer='framebuffer': composite the frame in software and show it with one PhotoImage put."""
+        tier = self.resolution_governor.tier if self.resolution_governor else self.scale
+        if self.framebuffer.output_width != NES_SCREEN_WIDTH * tier:
+            self.framebuffer.set_output_size(NES_SCREEN_WIDTH * tier, NES_SCREEN_HEIGHT * tier)
+        frame_ppm = self.framebuffer.render(render_camera_x, [(player_sprite_data, render_player_x, render_player_y, PLAYER_SIZE, PLAYER_SIZE)])
+        self.canvas.coords(self.framebuffer_item_id, self.view_origin_px, 0) # Rides along with the view, like the HUD
+        self.canvas.flush()
+        if tier == self.scale:
+            self.framebuffer_image.tk.call(self.framebuffer_image, 'put', frame_ppm, '-format', 'ppm')
+        else: # Lower tier: a smaller image, then one whole-number zoom up to the display in C
+            tier_image = self.tier_images.get(tier)
+            if tier_image is None:
+                tier_image = self.tier_images[tier] = tk.PhotoImage(master=self, width=NES_SCREEN_WIDTH * tier, height=NES_SCREEN_HEIGHT * tier)
+            tier_image.tk.call(tier_image, 'put', frame_ppm, '-format', 'ppm')
+            self.framebuffer_image.tk.call(self.framebuffer_image, 'copy', tier_image, '-zoom', self.scale // tier)
+        self._timestamp_when_drawn()
+        if profiler: profiler.mark('canvas')
+
+    def _timestamp_when_drawn(self):
+        """
+        Flushing only hands the frame to Tk, which redraws the window from an idle callback. One queued after it runs
+        after the redraw, so that's when the frame counts as presented for the input latency.
+        """
+        if self.present_after_id is None and self.input_latency.awaiting_present:
+            self.present_after_id = self.after_idle(self._frame_drawn)
 
-        # Blocks drawing, bringing the world to life, one pixel at a time!
-        screen_left_nes = self.camera_x - PLAYER_SIZE # Add buffer for blocks just off screen
-        screen_right_nes = self.camera_x + NES_SCREEN_WIDTH + PLAYER_SIZE
-        
-        for tile_data in self.level_tiles: # Iterate through individual tiles, like a master architect!
-            x1_nes, y1_nes, x2_nes, y2_nes = tile_data['coords_nes']
-
-            is_visible = not (x2_nes < screen_left_nes or x1_nes > screen_right_nes)
-
-            if is_visible:
-                canvas_x = (x1_nes - self.camera_x) * self.scale
-                canvas_y = y1_nes * self.scale
-                
-                sprite_type_key = tile_data['type']
-                sprite_definition = tile_data['sprite_data']
-
-                # Calculate specific dimensions for PhotoImage based on tile type
-                if sprite_type_key == 'flagpole_pole':
-                    tile_display_width = (x2_nes - x1_nes) * self.scale
-                    tile_display_height = (y2_nes - y1_nes) * self.scale
-                else:
-                    tile_display_width = PLAYER_SIZE * self.scale
-                    tile_display_height = PLAYER_SIZE * self.scale
-
-                photo_img = self._get_or_create_sprite_image(sprite_type_key, sprite_definition, tile_display_width, tile_display_height)
-                
-                if photo_img:
-                    if tile_data['canvas_item_id']:
-                        self.canvas.coords(tile_data['canvas_item_id'], canvas_x, canvas_y)
-                    else:
-                        tile_data['canvas_item_id'] = self.canvas.create_image(canvas_x, canvas_y, image=photo_img, anchor='nw')
-            else:
-                if tile_data['canvas_item_id']:
-                    self.canvas.delete(tile_data['canvas_item_id'])
-                    tile_data['canvas_item_id'] = None
+    def _frame_drawn(self):
+        self.present_after_id = None
+        self.input_latency.presented(time.perf_counter())
 
     def update_score_display(self):
         """Bug 10 fix: Updates the score display on the canvas. So flashy, so perfect!"""
-        score_text = f"SCORE: {self.score:06d}"
+        score_text = f"SCORE: {self.simulation.score:06d}"
         if self.score_text_id:
             self.canvas.itemconfig(self.score_text_id, text=score_text)
         else:
-            self.score_text_id = self.canvas.create_text(DISPLAY_WIDTH * 0.05, 30, text=score_text,
-                                                        font=("Press Start 2P", 20, "bold"), fill="white", anchor="nw")
-
-    def check_aabb_collision(self, r1_left, r1_top, r1_right, r1_bottom, r2_left, r2_top, r2_right, r2_bottom):
-        return (r1_right > r2_left and r1_left < r2_right and r1_bottom > r2_top and r1_top < r2_bottom)
+            self.score_text_id = self.canvas.create_text(self.view_origin_px + self.view_width_px * 0.05, 30, text=score_text,
+                                                        font=("Press Start 2P", 20, "bold"), fill="white", anchor="nw", tags="hud")
 
     def bind_keys(self):
         self.bind("<KeyPress>", self.key_pressed)
         self.bind("<KeyRelease>", self.key_released)
+        self.bind("<KeyPress-F3>", self.toggle_frame_profiler)
+        self.bind("<KeyPress-F4>", self.toggle_stack_sampler)
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    def toggle_frame_profiler(self, event=None):
+        """F3: frame phase timings on screen (and measured at all) or not. Off costs nothing!"""
+        profiler = self.frame_profiler
+        profiler.enabled = not profiler.enabled
+        if profiler.enabled:
+            profiler.reset()
+            self.tcl_call_counter.reset()
+            self.tcl_call_counter.attach(*self._tcl_objects())
+            print("Frame profiler ON. Press F3 again to hide it.")
+        else:
+            if self.profiler_overlay_id: self.canvas.delete(self.profiler_overlay_id)
+            self.profiler_overlay_id = None
+            self.tcl_call_counter.detach(*self._tcl_objects()) # Including images made while it was on, they inherited it
+            print("Frame profiler OFF.")
+
+    def _tcl_objects(self):
+        """Everything in this window that talks to Tcl: the window, its canvas and every PhotoImage we keep."""
+        chunk_images = [chunk['image'] for chunk in self.level_chunks.values() if chunk['image'] is not None]
+        framebuffer_images = [self.framebuffer_image] + list(self.tier_images.values()) if self.framebuffer is not None else []
+        return [self, self.canvas] + list(self.sprite_images.values()) + chunk_images + framebuffer_images
+
+    def toggle_stack_sampler(self, event=None):
+        """F4: start sampling every thread's stack; F4 again writes a flamegraph-ready .collapsed file."""
+        if self.stack_sampler is None:
+            self.stack_sampler = StackSampler()
+            self.stack_sampler.start()
+            print("Sampling profiler started. Press F4 again to stop and save it.")
+            return
+        sampler, self.stack_sampler = self.stack_sampler, None
+        sampler.stop()
+        path = os.path.join(SAMPLER_OUTPUT_DIR, time.strftime("catos_mario_%Y%m%d_%H%M%S.collapsed"))
+        sampler.write_collapsed(path)
+        print(f"Sampling profiler: {sampler.samples} samples ({sampler.overhead:.2%} overhead) saved to {path}")
+
+    def update_profiler_overlay(self):
+        overlay_lines = self.frame_profiler.report_lines() + self.tcl_call_counter.report_lines()
+        overlay_lines += self.frame_pacer.report_lines() + self.keyboard.report_lines() + self.input_latency.report_lines()
+        if self.resolution_governor: overlay_lines += self.resolution_governor.report_lines()
+        overlay_text = "\n".join(overlay_lines)
+        if self.profiler_overlay_id:
+            self.canvas.itemconfig(self.profiler_overlay_id, text=overlay_text)
+        else:
+            self.profiler_overlay_id = self.canvas.create_text(self.view_origin_px + self.view_width_px * 0.05, 80, text=overlay_text,
+                                                               font=("Courier New", 14, "bold"), fill="white", anchor="nw", tags="hud")
+
     def on_closing(self):
         self.game_loop_active = False # Signal game loop to stop, it's time for a nap!
+        self.frame_pacer.stop()
+        if self.present_after_id is not None:
+            self.after_cancel(self.present_after_id)
+            self.present_after_id = None
+        if self.stack_sampler is not None: self.toggle_stack_sampler() # Don't lose a running profile
+        if self.record_path:
+            self.input_recording.save(self.record_path)
+            print(f"Saved {len(self.input_recording)} ticks of input to {self.record_path}. Replay it any time!")
+            self.record_path = None # Once is plenty, on_closing can run twice after a win
+        if self.telemetry_path:
+            with open(self.telemetry_path, "w") as telemetry_file:
+                json.dump(self.telemetry(), telemetry_file, indent=2)
+            print(f"Saved telemetry to {self.telemetry_path}. Numbers, meow!")
+            self.telemetry_path = None
         if hasattr(self.master_catos, 'sound_engine') and self.master_catos.sound_engine:
             self.master_catos.sound_engine.stop() # Stop the jams!
         if hasattr(self.master_catos, 'mario_game_window') and self.master_catos.mario_game_window == self:
@@ -708,120 +2572,81 @@ class MarioGameWindow(tk.Toplevel):
 
         self.destroy()
 
-    def key_pressed(self, event): self.pressed_keys.add(event.keysym.lower())
-    def key_released(self, event):
-        keysym_lower = event.keysym.lower()
-        if keysym_lower in self.pressed_keys: self.pressed_keys.remove(keysym_lower)
-
-    def handle_input_and_physics(self):
-        if self.game_won: return # Bug 18 fix: Stop input/physics if game won! No more cheating!
-
-        # Store previous position for collision response, like a detective!
-        prev_player_x = self.player_x
-        prev_player_y = self.player_y
-
-        # --- Horizontal Movement ---
-        current_dx = 0
-        if 'a' in self.pressed_keys or 'left' in self.pressed_keys: current_dx -= MOVE_SPEED
-        if 'd' in self.pressed_keys or 'right' in self.pressed_keys: current_dx += MOVE_SPEED
-        
-        # Apply horizontal movement
-        self.player_x += current_dx
-
-        # Horizontal Collision, don't bonk your head!
-        player_h_col_rect = (self.player_x, self.player_y, self.player_x + PLAYER_SIZE, self.player_y + PLAYER_SIZE)
-        for plat_l, plat_t, plat_r, plat_b in self.collidable_platform_coords:
-            if self.check_aabb_collision(*player_h_col_rect, plat_l, plat_t, plat_r, plat_b):
-                if current_dx > 0: self.player_x = plat_l - PLAYER_SIZE # Collided from left, move to left edge of platform
-                elif current_dx < 0: self.player_x = plat_r # Collided from right, move to right edge of platform
-                break # Stop at first collision, no need to check all!
-
-        # --- Vertical Movement (Jump and Gravity) ---
-        jump_input_keys = {'w', 'up', 'space'}
-        if any(key in self.pressed_keys for key in jump_input_keys) and self.on_ground:
-            self.player_vy = -JUMP_POWER
-            self.is_jumping = True
-            self.on_ground = False
-            if self.master_catos.sound_engine: self.master_catos.sound_engine.play_sfx('JUMP_SFX', duration_seconds=0.1) # Bug 12 fix: Jump sound! So bouncy!
-        
-        if not self.on_ground: self.player_vy += GRAVITY
-        
-        # Apply vertical movement
-        self.player_y += self.player_vy
-        
-        new_on_ground_this_frame = False
-        player_v_col_rect = (self.player_x, self.player_y, self.player_x + PLAYER_SIZE, self.player_y + PLAYER_SIZE)
-
-        for plat_l, plat_t, plat_r, plat_b in self.collidable_platform_coords:
-            if self.check_aabb_collision(*player_v_col_rect, plat_l, plat_t, plat_r, plat_b):
-                # Check for collision from top (landing)
-                if self.player_vy > 0 and prev_player_y + PLAYER_SIZE <= plat_t + 1: # Moving Down and was above platform
-                    self.player_y = plat_t - PLAYER_SIZE # Snap to top of platform
-                    self.player_vy = 0
-                    new_on_ground_this_frame = True
-                    if self.is_jumping: # Bug 12 fix: Land sound only if just finished jumping
-                        if self.master_catos.sound_engine: self.master_catos.sound_engine.play_sfx('LAND_SFX', duration_seconds=0.05)
-                    self.is_jumping = False
-                    break # Only land on one platform, gotta be precise!
-                # Check for collision from bottom (hitting head), ouchie!
-                elif self.player_vy < 0 and prev_player_y >= plat_b - 1: # Moving Up and was below platform
-                    self.player_y = plat_b # Snap to bottom of platform
-                    self.player_vy = GRAVITY # Start falling, gravity always wins!
-                    # For future: hit block animation/sound here! Boom!
-                    break # Stop at first collision, no need to check all!
-        self.on_ground = new_on_ground_this_frame
-
-        # Boundary Checks, don't fall off the world!
-        if self.player_x < 0: self.player_x = 0
-        if self.player_x + PLAYER_SIZE > WORLD_WIDTH_NES: self.player_x = WORLD_WIDTH_NES - PLAYER_SIZE
-        
-        if self.player_y > NES_SCREEN_HEIGHT + PLAYER_SIZE * 2 : # Fell off screen, oh noes!
-            self.player_x = 3 * PLAYER_SIZE; self.player_y = NES_SCREEN_HEIGHT - 2 * PLAYER_SIZE
-            self.player_vy = 0; self.on_ground = True; self.is_jumping = False; self.camera_x = 0
-            self.score = 0 # Bug 10 fix: Reset score on death, tough but fair!
-            self.update_score_display()
-            print("Fell off! Resetting Mario. Try again, you can do it!") # So encouraging!
-
-        # Camera Update, keep Mario in sight!
-        # Bug 15 fix: Camera now activates more dynamically to the right, not just centered, super smart!
-        camera_boundary_left = NES_SCREEN_WIDTH * 0.35 # Mario is 35% from left edge
-        if self.player_x - self.camera_x > camera_boundary_left:
-            self.camera_x = self.player_x - camera_boundary_left
-        
-        # Max camera limit
-        self.camera_x = max(0, min(self.camera_x, WORLD_WIDTH_NES - NES_SCREEN_WIDTH))
-        # Bug 5 fix: Removed rounding for smoother camera movement. No more pixel snapping! So silky smooth!
-        # self.camera_x = round(self.camera_x) 
-
-        # Bug 18 fix: Check for win condition (collision with flagpole pole), victory is ours!
-        flagpole_x_nes = (142 * PLAYER_SIZE) + (PLAYER_SIZE / 2) # Flagpole's center X
-        if self.player_x + PLAYER_SIZE > flagpole_x_nes - (PLAYER_SIZE / 2) and not self.game_won:
-            # Simple check if Mario is roughly at the flagpole X position
-            flagpole_coords = None
-            for tile in self.level_tiles:
-                if tile['type'] == 'flagpole_pole' and tile['collidable']:
-                    flagpole_coords = tile['coords_nes']
-                    break
-            
-            if flagpole_coords and self.check_aabb_collision(self.player_x, self.player_y, self.player_x + PLAYER_SIZE, self.player_y + PLAYER_SIZE, *flagpole_coords):
-                self.game_won = True
+    def telemetry(self):
+        """What the always-on instruments measured this session (and the F3 ones, if they ran), as plain data."""
+        telemetry = {
+            "frame_pacer": self.frame_pacer.summary(),
+            "keyboard": self.keyboard.summary(),
+            "input_latency": self.input_latency.summary(),
+            "dropped_sim_seconds": self.dropped_sim_seconds,
+        }
+        if self.frame_profiler.frames:
+            telemetry["frame_phases_ms"] = {phase: dict(zip(("p50", "p95", "p99"), self.frame_profiler.percentiles(phase)))
+                                            for phase in FRAME_PHASES + ('frame',)}
+        if self.tcl_call_counter.frames: telemetry["tcl_calls"] = self.tcl_call_counter.summary()
+        if self.resolution_governor:
+            telemetry["resolution_tiers"] = {f"{tier}x": frames for tier, frames in sorted(self.resolution_governor.frames_at_tier.items())}
+        return telemetry
+
+    def key_pressed(self, event): self.keyboard.key_event(event.keysym, True)
+    def key_released(self, event): self.keyboard.key_event(event.keysym, False)
+
+    def _next_input_bits(self):
+        """This tick's input: the next byte of the replay if one is running, else the keyboard's snapshot for this tick."""
+        if self.replay_log is not None:
+            if self.replay_position < len(self.replay_log):
+                self.replay_position += 1
+                return self.replay_log.inputs[self.replay_position - 1]
+            print("Replay finished! The keyboard is all yours.")
+            self.replay_log = None
+        return self.keyboard.snapshot()
+
+    def handle_input_and_physics(self, profiler=None):
+        """Runs one simulation tick, then does the window's part: sounds, score, win screen."""
+        previous_input_bits = self.simulation.input_bits
+        input_bits = self._next_input_bits()
+        self.input_recording.record(input_bits)
+        if profiler: profiler.mark('input')
+        events = self.simulation.step(input_bits)
+        consumed_event_times = self.keyboard.take_consumed_event_times()
+        if consumed_event_times:
+            self.input_latency.tick_consumed(consumed_event_times, time.perf_counter(), input_bits != previous_input_bits)
+        if profiler: profiler.mark('physics')
+        sound_engine = self.master_catos.sound_engine
+        for event in events:
+            if event == 'jump':
+                if sound_engine: sound_engine.play_sfx('JUMP_SFX', duration_seconds=0.1) # Bug 12 fix: Jump sound! So bouncy!
+            elif event == 'land':
+                if sound_engine: sound_engine.play_sfx('LAND_SFX', duration_seconds=0.05)
+            elif event == 'fell':
+                self.previous_render_state = None # A teleport, don't draw Mario streaking back across the level
+                self.update_score_display()
+                print("Fell off! Resetting Mario. Try again, you can do it!") # So encouraging!
+            elif event == 'pipe':
+                self.previous_render_state = None # Out the other end of the pipe, no streaking there either
+            elif event == 'won':
                 print("YOU WIN! Meow-some job!")
-                self.score += 1000 # Bonus points for winning! Jackpot!
                 self.update_score_display()
-                if self.master_catos.sound_engine: self.master_catos.sound_engine.stop() # Stop BGM, it's time for glory!
-                if self.master_catos.sound_engine: self.master_catos.sound_engine.play_sfx('C6', duration_seconds=0.5, amplitude=0.5) # Victory fanfare! So loud!
+                if sound_engine: sound_engine.stop() # Stop BGM, it's time for glory!
+                if sound_engine: sound_engine.play_sfx('C6', duration_seconds=0.5, amplitude=0.5) # Victory fanfare! So loud!
                 self.show_win_screen()
-
+        if profiler: profiler.mark('canvas')
 
     def show_win_screen(self):
         """Displays a celebratory message for the win! Hooray, you're a champion!"""
         if self.win_text_id is None:
-            self.win_text_id = self.canvas.create_text(DISPLAY_WIDTH / 2, DISPLAY_HEIGHT / 2,
+            self.win_text_id = self.canvas.create_text(self.view_origin_px + self.view_width_px / 2, self.view_height_px / 2,
                                                     text="YOU WIN!\nMEOW!",
                                                     font=("Press Start 2P", 48, "bold"), fill="gold",
-                                                    anchor="center", tag="win_message")
+                                                    anchor="center", tags=("hud", "win_message"))
         self.after(5000, self.on_closing) # Close game after 5 seconds of glory!
 
+    def _update_dynamic_resolution(self, frame_ms):
+        new_tier = self.resolution_governor.record(frame_ms)
+        if new_tier is not None:
+            print(f"Dynamic resolution: rendering at {new_tier}x ({NES_SCREEN_WIDTH * new_tier}x{NES_SCREEN_HEIGHT * new_tier}), "
+                  f"p90 frame was {self.resolution_governor.last_p90_ms:.2f} ms. Purr-formance first!")
+
     def game_loop_step(self):
         # Bug 6 fix: This is the main game loop function, simplified and streamlined!
         if not self.game_loop_active or not self.winfo_exists(): return
@@ -829,21 +2654,50 @@ class MarioGameWindow(tk.Toplevel):
         current_time = time.perf_counter()
         delta_time = current_time - self.last_frame_time
         self.last_frame_time = current_time
-
-        self.handle_input_and_physics()
-        self._draw_all_level_elements() # Redraws blocks and player using PhotoImages
-
-        # Schedule the next frame to maintain FPS, so smooth!
-        target_frame_time = 1.0 / FPS
-        time_to_wait = target_frame_time - (time.perf_counter() - current_time)
-        sleep_time_ms = int(max(1, time_to_wait * 1000))
-        
-        self.after(sleep_time_ms, self.game_loop_step)
+        self.frame_pacer.frame_started(current_time)
+        profiler = self.frame_profiler if self.frame_profiler.enabled else None # One check per frame when it's off
+        if profiler: profiler.begin_frame(current_time, self.frame_pacer.deadline)
+
+        # Fixed timestep: bank the real time that passed and spend it in whole physics ticks,
+        # so a late callback or a slow frame never slows the game down (up to MAX_CATCH_UP_TICKS)
+        self.sim_accumulator += delta_time
+        ticks_this_frame = 0
+        while self.sim_accumulator >= self.tick_seconds and ticks_this_frame < MAX_CATCH_UP_TICKS:
+            self.previous_render_state = self._render_state()
+            self.handle_input_and_physics(profiler)
+            self.sim_accumulator -= self.tick_seconds
+            ticks_this_frame += 1
+        if self.sim_accumulator >= self.tick_seconds: # Hopelessly behind (breakpoint, window drag...), let it go
+            leftover_seconds = self.sim_accumulator % self.tick_seconds
+            self.dropped_sim_seconds += self.sim_accumulator - leftover_seconds
+            self.sim_accumulator = leftover_seconds
+
+        # Draw between the last two ticks, so 120/144 Hz renders glide instead of stutter
+        self._draw_all_level_elements(self.sim_accumulator / self.tick_seconds, profiler)
+        if profiler:
+            profiler.end_frame()
+            self.tcl_call_counter.end_frame()
+            if profiler.frames % PROFILER_OVERLAY_REFRESH_FRAMES == 0: self.update_profiler_overlay()
+
+        if self.resolution_governor: # Our work plus however late Tk woke us, the frame time the player actually felt
+            frame_end_time = time.perf_counter()
+            self._update_dynamic_resolution((frame_end_time - current_time + max(0.0, current_time - self.frame_pacer.deadline)) * 1000)
+
+        # Schedule the next frame on the pacer's deadline grid, so smooth!
+        self.frame_pacer.schedule(self, self.game_loop_step)
 
 
 class CATOS_GUI(tk.Tk):
-    def __init__(self):
+    def __init__(self, record_path=None, replay_log=None, renderer='canvas', dynamic_resolution=False, pacer_thread=False,
+                 pacer_spin=False, telemetry_path=None):
         super().__init__()
+        self.renderer = renderer # 'canvas' or 'framebuffer', for the game window
+        self.dynamic_resolution = dynamic_resolution # Framebuffer only: trade sharpness for frame time when it runs long
+        self.pacer_thread = pacer_thread # Wake game frames from a timer thread instead of after()
+        self.pacer_spin = pacer_spin # Busy-wait the last moment before each game frame, for sub-millisecond pacing
+        self.telemetry_path = telemetry_path # Game window saves its instruments' numbers here when it closes
+        self.record_path = record_path # Handed to the game window: where to save this session's inputs
+        self.replay_log = replay_log # ...and a recorded InputLog to play back instead of the keyboard
         self.title("CATOS - Meow Edition v3.0 NES Emu! Purr-fectly powerful!")
         self.geometry("500x500")
         self.configure(bg="#2c3e50")
@@ -891,7 +2745,7 @@ class CATOS_GUI(tk.Tk):
 
         self.mario_game_window = None
         self.mario_main_menu_window = None
-        self.sound_engine = SoundEngine(tempo_bpm=100) if SOUND_ENABLED else type('DummySoundEngine', (), {'load_song': lambda s,d: None, 'play': lambda s,l=0: None, 'stop': lambda s: None, 'play_sfx': lambda s,n,d=0.1,a=None: None})() # Bug 12 fix: Dummy SFX method too!
+        self.sound_engine = SoundEngine(tempo_bpm=100) if SOUND_ENABLED else type('DummySoundEngine', (), {'load_song': lambda s,d: None, 'play': lambda s,l=0: None, 'stop': lambda s: None, 'play_sfx': lambda s,n,duration_seconds=0.1,amplitude=None: None})() # Bug 12 fix: Dummy SFX method too!
         if SOUND_ENABLED and self.sound_engine: self.sound_engine.load_song(SMB_1_1_LOOP_THEME)
         self.protocol("WM_DELETE_WINDOW", self.on_closing_catos)
 
@@ -927,7 +2781,9 @@ class CATOS_GUI(tk.Tk):
             self.mario_main_menu_window = None
         
         if self.mario_game_window is None or not self.mario_game_window.winfo_exists():
-            self.mario_game_window = MarioGameWindow(self)
+            self.mario_game_window = MarioGameWindow(self, record_path=self.record_path, replay_log=self.replay_log, renderer=self.renderer,
+                                                     dynamic_resolution=self.dynamic_resolution, pacer_thread=self.pacer_thread,
+                                                     pacer_spin=self.pacer_spin, telemetry_path=self.telemetry_path)
             self.mario_game_window.lift() # Bring to front, so exciting!
             self.mario_game_window.focus_set() # Ensure focus, get ready for action!
             if self.sound_engine: self.sound_engine.play(loop=True) # Turn up the volume!
@@ -940,5 +2796,37 @@ class CATOS_GUI(tk.Tk):
             print("MarioGameWindow already exists, bringing to front. Let's play already!") # Debug print
 
 if __name__ == "__main__":
-    app = CATOS_GUI()
-    app.mainloop()
+    parser = argparse.ArgumentParser(description="CATOS with SMB 1-1 inside. Meow!")
+    parser.add_argument("--record", metavar="LOG", help="save every tick's input to LOG when the game window closes")
+    parser.add_argument("--replay", metavar="LOG", help="drive the game from a recorded input log instead of the keyboard")
+    parser.add_argument("--renderer", choices=RENDERERS, default='canvas', help="canvas: chunk images on a Tk canvas (default); framebuffer: one software-composited image per frame")
+    parser.add_argument("--dynamic-resolution", action="store_true", help="render at a lower zoom when frames run over budget (implies --renderer framebuffer)")
+    parser.add_argument("--pacer-thread", action="store_true", help="wake each frame from a high-resolution timer thread instead of Tk's after()")
+    parser.add_argument("--pacer-spin", action="store_true", help="busy-wait the last 1.5 ms before each frame to hit it to well under a millisecond (burns CPU)")
+    parser.add_argument("--telemetry", metavar="JSON", help="save frame pacing, input and input-to-screen latency stats to JSON when the game window closes")
+    parser.add_argument("--headless", action="store_true", help="with --replay: no window, replay as fast as possible and print the result")
+    args = parser.parse_args()
+    if args.headless and not args.replay: parser.error("--headless needs --replay LOG, there's nothing to play without a window otherwise")
+    replay_log = None
+    if args.replay:
+        try:
+            replay_log = InputLog.load(args.replay)
+        except (OSError, ValueError) as error:
+            if args.headless: sys.exit(f"ERROR: can't replay {args.replay}: {error}")
+            print(f"WARNING: can't replay {args.replay}: {error}. You're playing live!")
+
+    if args.headless:
+        replay_start_time = time.perf_counter()
+        try:
+            simulation = replay_input_log(replay_log)
+        except ValueError as error: # Recorded against a different level or physics
+            sys.exit(f"ERROR: can't replay {args.replay}: {error}")
+        replay_ms = (time.perf_counter() - replay_start_time) * 1000
+        played_seconds = len(replay_log) / replay_log.simulation_hz
+        print(f"Replayed {len(replay_log)} ticks ({played_seconds:.1f} s of play) in {replay_ms:.1f} ms. Zoom!")
+        print(f"Mario ended at x={simulation.player_x:.1f} y={simulation.player_y:.1f}, score {simulation.score}, won: {simulation.game_won}")
+    else:
+        app = CATOS_GUI(record_path=args.record, replay_log=replay_log, renderer='framebuffer' if args.dynamic_resolution else args.renderer,
+                        dynamic_resolution=args.dynamic_resolution, pacer_thread=args.pacer_thread,
+                        pacer_spin=args.pacer_spin, telemetry_path=args.telemetry)
+        app.mainloop()
@@ -1,5 +1,6 @@
 import tkinter as tk
 import time
+from frame_pacing import FramePacer
 
 # --- Game Constants ---
 PLAYER_SIZE = 30 # This will be the size of our drawn entities (Mario, blocks)
@@ -10,7 +11,6 @@ GRAVITY = 1.5
 JUMP_POWER = 20
 MOVE_SPEED = 7
 FPS = 60
-DELAY = 1000 // FPS
 
 # --- Pixel Art Data "Ripped" by HQRIPPER 7.1! MEOW! ---
 # These are simplified 16x16 representations. X means transparent!
@@ -197,6 +197,38 @@ FLAGPOLE_POLE_SPRITE_DATA = {
 
 # --- End of Pixel Art Data ---
 
+# --- Sprite Rectangle Plans ---
+def merge_pixel_runs(pixel_art_rows, sprite_color_palette):
+    """
+    Merges a sprite's opaque pixels into as few same-colored rectangles as it can: runs of one color
+    along a row first, then identical runs in the rows below are stacked into one taller rectangle.
+    Returns [(col1, row1, col2, row2, color_hex)] in native sprite pixels, col2/row2 exclusive.
+    """
+    merged_rectangles = []
+    open_runs = {} # (col1, col2, color_hex) -> index of the rectangle that can still grow downwards
+    for r_idx, row_str in enumerate(pixel_art_rows):
+        row_runs = {}
+        c_idx = 0
+        while c_idx < len(row_str):
+            color_hex = sprite_color_palette.get(row_str[c_idx])
+            run_end = c_idx + 1
+            while run_end < len(row_str) and sprite_color_palette.get(row_str[run_end]) == color_hex:
+                run_end += 1
+            if color_hex: # Transparent runs are just skipped
+                run_key = (c_idx, run_end, color_hex)
+                rect_index = open_runs.get(run_key)
+                if rect_index is None:
+                    rect_index = len(merged_rectangles)
+                    merged_rectangles.append((c_idx, r_idx, run_end, r_idx + 1, color_hex))
+                else:
+                    col1, row1, col2, _, _ = merged_rectangles[rect_index]
+                    merged_rectangles[rect_index] = (col1, row1, col2, r_idx + 1, color_hex)
+                row_runs[run_key] = rect_index
+            c_idx = run_end
+        open_runs = row_runs
+    return merged_rectangles
+
+
 class MarioGameWindow(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
@@ -263,6 +295,8 @@ class MarioGameWindow(tk.Toplevel):
         }
 
         self.player_pixel_ids = []
+        self.sprite_rectangle_plans = {} # id(sprite_definition) -> (sprite_definition, plan), see get_rectangle_plan
+        self.drawn_player_pos = None # Where Mario's pixel items currently sit
 
         # --- Visual Blocks Data: Now with more pixel purr-fection! ---
         self.visual_blocks_data = [
@@ -291,9 +325,17 @@ class MarioGameWindow(tk.Toplevel):
 
         self.pressed_keys = set()
         self.bind_keys()
+        self.frame_pacer = FramePacer(FPS)
         self.game_loop()
 
-    def draw_pixel_art(self, base_x, base_y, entity_width, entity_height, sprite_definition):
+    def get_rectangle_plan(self, sprite_definition):
+        """
+        Merges a sprite's pixels into same-colored rectangles once (merge_pixel_runs) and reuses that plan
+        at every position. Returns (art_width_px_native, art_height_px_native, merged_rectangles), or None.
+        """
+        cached_plan = self.sprite_rectangle_plans.get(id(sprite_definition))
+        if cached_plan is not None: return cached_plan[1]
+
         pixel_art_rows = sprite_definition["pixels"]
         sprite_color_palette = {
             char_key: self.COLOR_MAP.get(mapped_color_key)
@@ -302,29 +344,36 @@ class MarioGameWindow(tk.Toplevel):
 
         art_height_px_native = len(pixel_art_rows)
         art_width_px_native = len(pixel_art_rows[0]) if art_height_px_native > 0 else 0
-        if art_width_px_native == 0: return [] 
+
+        rectangle_plan = None
+        if art_width_px_native and art_height_px_native:
+            rectangle_plan = (art_width_px_native, art_height_px_native, merge_pixel_runs(pixel_art_rows, sprite_color_palette))
+        self.sprite_rectangle_plans[id(sprite_definition)] = (sprite_definition, rectangle_plan) # Holding the sprite keeps its id unique
+        return rectangle_plan
+
+    def draw_pixel_art(self, base_x, base_y, entity_width, entity_height, sprite_definition, tags=None):
+        rectangle_plan = self.get_rectangle_plan(sprite_definition)
+        if not rectangle_plan: return []
+        art_width_px_native, art_height_px_native, merged_rectangles = rectangle_plan
 
         canvas_pixel_width = entity_width / art_width_px_native
         canvas_pixel_height = entity_height / art_height_px_native
-        
+
         drawn_item_ids = []
-        for r_idx, row_str in enumerate(pixel_art_rows):
-            for c_idx, color_char_key in enumerate(row_str):
-                actual_color_hex = sprite_color_palette.get(color_char_key)
-                if actual_color_hex: 
-                    px_x1 = base_x + (c_idx * canvas_pixel_width)
-                    py_y1 = base_y + (r_idx * canvas_pixel_height)
-                    px_x2 = base_x + ((c_idx + 1) * canvas_pixel_width)
-                    py_y2 = base_y + ((r_idx + 1) * canvas_pixel_height)
-                    
-                    if px_x2 - px_x1 < 0.5: px_x2 = px_x1 + 0.5
-                    if py_y2 - py_y1 < 0.5: py_y2 = py_y1 + 0.5
-
-                    pixel_id = self.canvas.create_rectangle(
-                        px_x1, py_y1, px_x2, py_y2,
-                        fill=actual_color_hex, outline="" 
-                    )
-                    drawn_item_ids.append(pixel_id)
+        for c_idx, r_idx, c_end, r_end, actual_color_hex in merged_rectangles: # One item per merged rectangle, not per pixel
+            px_x1 = base_x + (c_idx * canvas_pixel_width)
+            py_y1 = base_y + (r_idx * canvas_pixel_height)
+            px_x2 = base_x + (c_end * canvas_pixel_width)
+            py_y2 = base_y + (r_end * canvas_pixel_height)
+
+            if px_x2 - px_x1 < 0.5: px_x2 = px_x1 + 0.5
+            if py_y2 - py_y1 < 0.5: py_y2 = py_y1 + 0.5
+
+            pixel_id = self.canvas.create_rectangle(
+                px_x1, py_y1, px_x2, py_y2,
+                fill=actual_color_hex, outline="", tags=tags
+            )
+            drawn_item_ids.append(pixel_id)
         return drawn_item_ids
 
     def draw_all_visual_blocks(self):
@@ -393,15 +442,19 @@ class MarioGameWindow(tk.Toplevel):
                 self.collidable_platform_coords.append(coords)
 
     def update_player_visuals(self):
-        for pixel_id in self.player_pixel_ids:
-            self.canvas.delete(pixel_id)
-        self.player_pixel_ids = [] 
-
-        self.player_pixel_ids = self.draw_pixel_art(
-            self.player_x, self.player_y,
-            PLAYER_SIZE, PLAYER_SIZE,
-            SMALL_MARIO_STANDING_DATA 
-        )
+        """Mario's pixel items are created once and then just moved, one canvas.move per frame."""
+        if not self.player_pixel_ids:
+            self.player_pixel_ids = self.draw_pixel_art(
+                self.player_x, self.player_y,
+                PLAYER_SIZE, PLAYER_SIZE,
+                SMALL_MARIO_STANDING_DATA, tags='player'
+            )
+        else:
+            shift_x = self.player_x - self.drawn_player_pos[0]
+            shift_y = self.player_y - self.drawn_player_pos[1]
+            if shift_x or shift_y:
+                self.canvas.move('player', shift_x, shift_y)
+        self.drawn_player_pos = (self.player_x, self.player_y)
 
     def bind_keys(self):
         self.focus_set()
@@ -496,17 +549,13 @@ class MarioGameWindow(tk.Toplevel):
     def game_loop(self):
         try:
             if not self.winfo_exists(): return
-            start_time = time.perf_counter() 
 
+            self.frame_pacer.frame_started(time.perf_counter())
             self.handle_input()
             self.apply_gravity_and_movement()
             self.update_player_visuals() 
 
-            end_time = time.perf_counter()
-            process_time_ms = (end_time - start_time) * 1000
-            delay_ms = max(1, DELAY - int(process_time_ms)) 
-
-            self.after(delay_ms, self.game_loop)
+            self.frame_pacer.schedule(self, self.game_loop)
         except tk.TclError:
             print("Game window closed gracefully, like a cat landing on its feet! Purrrr.")
         except Exception as e:
@@ -1,5 +1,6 @@
 import tkinter as tk
 import time
+from frame_pacing import FramePacer
 
 # --- Game Constants ---
 PLAYER_SIZE = 30
@@ -10,7 +11,6 @@ GRAVITY = 1.5  # Increased gravity for more noticeable effect
 JUMP_POWER = 20 # Increased jump power
 MOVE_SPEED = 7
 FPS = 60 # Target frames per second
-DELAY = 1000 // FPS # Delay in milliseconds
 
 class MarioGameWindow(tk.Toplevel):
     def __init__(self, master):
@@ -93,6 +93,7 @@ class MarioGameWindow(tk.Toplevel):
         self.bind_keys()
 
         # Game loop, the heart of the fun!
+        self.frame_pacer = FramePacer(FPS)
         self.game_loop()
 
     def bind_keys(self):
@@ -189,10 +190,11 @@ class MarioGameWindow(tk.Toplevel):
         try:
             if not self.winfo_exists(): # If window is gone, stop the loop, good kitty.
                 return
+            self.frame_pacer.frame_started(time.perf_counter())
             self.handle_input()
             self.apply_gravity_and_movement()
             self.update_player_position()
-            self.after(DELAY, self.game_loop) # Again! Again! This is so much fun!
+            self.frame_pacer.schedule(self, self.game_loop)
         except tk.TclError:
             # This can happen if the window is destroyed while an 'after' call is pending
             print("Game window closed gracefully, like a cat landing on its feet! Purrrr.")
@@ -1,5 +1,6 @@
 import tkinter as tk
 import time
+from frame_pacing import FramePacer
 
 # --- Game Constants ---
 # NES Emulation Constants - PURE RETRO POWER!
@@ -16,7 +17,6 @@ GRAVITY = 0.5 # Adjusted for NES pixel units, feels so authentically bouncy!
 JUMP_POWER = 8 # Get that satisfying NES jump height, little buddy!
 MOVE_SPEED = 2 # Slower, more precise movement, just like the good old days!
 FPS = 60 # Smooth as a baby's butt!
-DELAY = 1000 // FPS # Keep that frame rate locked down, meow!
 
 # --- World Dimensions for SMB 1-1 (in NES pixels) ---
 WORLD_WIDTH_BLOCKS = 210 # SMB 1-1 is about 209 blocks long, plus a little extra!
@@ -204,6 +204,38 @@ FLAGPOLE_POLE_SPRITE_DATA = { # Corrected to be 2px wide, 16px high native
 }
 # --- End of Pixel Art Data ---
 
+# --- Sprite Rectangle Plans ---
+def merge_pixel_runs(pixel_art_rows, sprite_color_palette):
+    """
+    Merges a sprite's opaque pixels into as few same-colored rectangles as it can: runs of one color
+    along a row first, then identical runs in the rows below are stacked into one taller rectangle.
+    Returns [(col1, row1, col2, row2, color_hex)] in native sprite pixels, col2/row2 exclusive.
+    """
+    merged_rectangles = []
+    open_runs = {} # (col1, col2, color_hex) -> index of the rectangle that can still grow downwards
+    for r_idx, row_str in enumerate(pixel_art_rows):
+        row_runs = {}
+        c_idx = 0
+        while c_idx < len(row_str):
+            color_hex = sprite_color_palette.get(row_str[c_idx])
+            run_end = c_idx + 1
+            while run_end < len(row_str) and sprite_color_palette.get(row_str[run_end]) == color_hex:
+                run_end += 1
+            if color_hex: # Transparent runs are just skipped
+                run_key = (c_idx, run_end, color_hex)
+                rect_index = open_runs.get(run_key)
+                if rect_index is None:
+                    rect_index = len(merged_rectangles)
+                    merged_rectangles.append((c_idx, r_idx, run_end, r_idx + 1, color_hex))
+                else:
+                    col1, row1, col2, _, _ = merged_rectangles[rect_index]
+                    merged_rectangles[rect_index] = (col1, row1, col2, r_idx + 1, color_hex)
+                row_runs[run_key] = rect_index
+            c_idx = run_end
+        open_runs = row_runs
+    return merged_rectangles
+
+
 class MarioMainMenuWindow(tk.Toplevel):
     def __init__(self, master, game_launcher_callback):
         super().__init__(master)
@@ -398,6 +430,7 @@ class MarioGameWindow(tk.Toplevel):
         self.COLOR_MAP = master.COLOR_MAP
 
         self.player_pixel_ids = [] # Stores canvas item IDs for the player's pixels
+        self.sprite_rectangle_plans = {} # id(sprite_definition) -> (sprite_definition, plan), see get_rectangle_plan
         
         # --- SMB 1-1 Level Data Generation MEOW! ---
         self.visual_blocks_data = [] # Stores data for all blocks in the level
@@ -544,25 +577,33 @@ class MarioGameWindow(tk.Toplevel):
         # --- End of SMB 1-1 Level Data ---
 
         self.canvas_items_map = {} # Stores canvas item IDs for drawn blocks {block_key: [ids]}
-        self.collidable_platform_coords = [] # Stores (x1,y1,x2,y2) NES coords for collidable blocks
+        # Stores (x1,y1,x2,y2) NES coords for collidable blocks.
+        # The level is static, so the collision list is built once instead of every frame
+        self.collidable_platform_coords = [block_data['coords'] for block_data in self.visual_blocks_data if block_data.get('collidable', True)]
         
         # Initial draw of all static level elements
-        # This populates self.collidable_platform_coords among other things
+        # Everything is drawn at world coordinates and the canvas view scrolls over it.
+        # One screen of slack on the right so the scrollregion never clamps the camera.
+        self.scroll_width_canvas = (max([WORLD_WIDTH_NES] + [block_data['coords'][2] for block_data in self.visual_blocks_data]) + NES_SCREEN_WIDTH) * self.scale
+        self.canvas.configure(scrollregion=(0, 0, self.scroll_width_canvas, DISPLAY_HEIGHT))
+        self.drawn_camera_x = self.camera_x # Camera position the canvas view is scrolled to
+        self.drawn_player_canvas_pos = None
+        self.build_visual_tiles()
         self.draw_all_visual_blocks() 
 
         self.pressed_keys = set()
         self.bind_keys()
+        self.frame_pacer = FramePacer(FPS)
         self.game_loop()
 
-    def draw_pixel_art(self, base_x_nes, base_y_nes, entity_width_nes, entity_height_nes, sprite_definition):
+    def get_rectangle_plan(self, sprite_definition):
         """
-        Draws pixel art onto the canvas.
-        base_x_nes, base_y_nes: Top-left corner of the entity in NES pixel coordinates.
-        entity_width_nes, entity_height_nes: Total size of the entity in NES pixels.
-                                             The sprite will be scaled to fit this.
-        sprite_definition: Dictionary containing "colors" and "pixels" for the art.
-        Returns a list of canvas item IDs created for this drawing.
+        Merges a sprite's pixels into same-colored rectangles once (merge_pixel_runs) and reuses that plan
+        at every position. Returns (art_width_px_native, art_height_px_native, merged_rectangles), or None.
         """
+        cached_plan = self.sprite_rectangle_plans.get(id(sprite_definition))
+        if cached_plan is not None: return cached_plan[1]
+
         pixel_art_rows = sprite_definition["pixels"]
         # Resolve character keys in sprite_definition["colors"] to actual hex color codes
         sprite_color_palette = {
@@ -572,161 +613,142 @@ class MarioGameWindow(tk.Toplevel):
 
         art_height_px_native = len(pixel_art_rows) # How many rows in the pixel art data
         art_width_px_native = len(pixel_art_rows[0]) if art_height_px_native > 0 and isinstance(pixel_art_rows[0], str) else 0
-        if art_width_px_native == 0 or art_height_px_native == 0: return [] # No art to draw
+
+        rectangle_plan = None
+        if art_width_px_native and art_height_px_native:
+            rectangle_plan = (art_width_px_native, art_height_px_native, merge_pixel_runs(pixel_art_rows, sprite_color_palette))
+        self.sprite_rectangle_plans[id(sprite_definition)] = (sprite_definition, rectangle_plan) # Holding the sprite keeps its id unique
+        return rectangle_plan
+
+    def draw_pixel_art(self, base_x_nes, base_y_nes, entity_width_nes, entity_height_nes, sprite_definition, tags=None):
+        """
+        Draws pixel art onto the canvas.
+        base_x_nes, base_y_nes: Top-left corner of the entity in NES pixel coordinates.
+        entity_width_nes, entity_height_nes: Total size of the entity in NES pixels.
+                                             The sprite will be scaled to fit this.
+        sprite_definition: Dictionary containing "colors" and "pixels" for the art.
+        Returns a list of canvas item IDs created for this drawing.
+        """
+        rectangle_plan = self.get_rectangle_plan(sprite_definition)
+        if not rectangle_plan: return []
+        art_width_px_native, art_height_px_native, merged_rectangles = rectangle_plan
 
         # Calculate the size of one "native pixel" of the sprite when drawn on the NES conceptual grid
         # This scales the sprite art to fit the entity_width_nes/entity_height_nes.
         scaled_pixel_width_nes = entity_width_nes / art_width_px_native
         scaled_pixel_height_nes = entity_height_nes / art_height_px_native
-        
+
         drawn_item_ids = []
-        for r_idx, row_str in enumerate(pixel_art_rows): # Iterate over each row of the native pixel art
-            for c_idx, color_char_key in enumerate(row_str): # Iterate over each char (pixel) in the row
-                actual_color_hex = sprite_color_palette.get(color_char_key)
-                
-                if actual_color_hex: # If not transparent (None)
-                    # Calculate the NES coordinates for this specific "scaled native pixel"
-                    px_x1_nes = base_x_nes + (c_idx * scaled_pixel_width_nes)
-                    py_y1_nes = base_y_nes + (r_idx * scaled_pixel_height_nes)
-                    px_x2_nes = base_x_nes + ((c_idx + 1) * scaled_pixel_width_nes)
-                    py_y2_nes = base_y_nes + ((r_idx + 1) * scaled_pixel_height_nes)
-                    
-                    # Convert NES coordinates to canvas coordinates (apply camera and display scaling)
-                    # Camera_x is the left edge of the NES viewport in world NES coordinates.
-                    # self.scale is DISPLAY_WIDTH / NES_SCREEN_WIDTH.
-                    px_x1_canvas = (px_x1_nes - self.camera_x) * self.scale
-                    py_y1_canvas = py_y1_nes * self.scale 
-                    px_x2_canvas = (px_x2_nes - self.camera_x) * self.scale
-                    py_y2_canvas = py_y2_nes * self.scale
-                    
-                    # Optimization: Don't draw if entirely off-screen horizontally on canvas
-                    if px_x2_canvas < 0 or px_x1_canvas > DISPLAY_WIDTH:
-                        continue
-                    # Optimization: Don't draw if entirely off-screen vertically (less common for SMB style)
-                    if py_y2_canvas < 0 or py_y1_canvas > DISPLAY_HEIGHT:
-                        continue
-
-                    # Ensure minimum 1-pixel size on canvas to be visible
-                    if px_x2_canvas - px_x1_canvas < 1: px_x2_canvas = px_x1_canvas + 1
-                    if py_y2_canvas - py_y1_canvas < 1: py_y2_canvas = py_y1_canvas + 1
-
-                    pixel_id = self.canvas.create_rectangle(
-                        px_x1_canvas, py_y1_canvas, px_x2_canvas, py_y2_canvas,
-                        fill=actual_color_hex, outline="" # Outline empty for crisp pixels
-                    )
-                    drawn_item_ids.append(pixel_id)
+        for c_idx, r_idx, c_end, r_end, actual_color_hex in merged_rectangles: # One item per merged rectangle, not per pixel
+            # Calculate the NES coordinates for this specific "scaled native pixel"
+            px_x1_nes = base_x_nes + (c_idx * scaled_pixel_width_nes)
+            py_y1_nes = base_y_nes + (r_idx * scaled_pixel_height_nes)
+            px_x2_nes = base_x_nes + (c_end * scaled_pixel_width_nes)
+            py_y2_nes = base_y_nes + (r_end * scaled_pixel_height_nes)
+
+            # Convert NES coordinates to canvas coordinates (display scaling only, items live in world space)
+            # The camera is applied by scrolling the canvas view, see scroll_view_to_camera.
+            # self.scale is DISPLAY_WIDTH / NES_SCREEN_WIDTH.
+            px_x1_canvas = px_x1_nes * self.scale
+            py_y1_canvas = py_y1_nes * self.scale
+            px_x2_canvas = px_x2_nes * self.scale
+            py_y2_canvas = py_y2_nes * self.scale
+
+            # Ensure minimum 1-pixel size on canvas to be visible
+            if px_x2_canvas - px_x1_canvas < 1: px_x2_canvas = px_x1_canvas + 1
+            if py_y2_canvas - py_y1_canvas < 1: py_y2_canvas = py_y1_canvas + 1
+
+            pixel_id = self.canvas.create_rectangle(
+                px_x1_canvas, py_y1_canvas, px_x2_canvas, py_y2_canvas,
+                fill=actual_color_hex, outline="", tags=tags # Outline empty for crisp pixels
+            )
+            drawn_item_ids.append(pixel_id)
         return drawn_item_ids
 
-    def draw_all_visual_blocks(self):
-        """Redraws all visible static level blocks based on camera position."""
-        # Clear previously drawn block items from canvas_items_map
-        for key in list(self.canvas_items_map.keys()): # Iterate over a copy of keys
-            items_to_delete = self.canvas_items_map.pop(key) # Remove from map
-            if isinstance(items_to_delete, list):
-                for item_id in items_to_delete: self.canvas.delete(item_id)
-            elif items_to_delete: # Single item ID
-                self.canvas.delete(items_to_delete)
-        
-        # This list is rebuilt each frame based on what's collidable, visible or not.
-        # For static levels, it could be built once if culling wasn't an issue for collision.
-        # However, since we might have moving platforms later, rebuilding is safer.
-        # For now, it's just static blocks.
-        self.collidable_platform_coords = [] 
-
+    def build_visual_tiles(self):
+        """
+        Splits every visual block into its sprite tiles once, up front.
+        Drawing then works a tile at a time instead of re-tiling whole blocks every frame.
+        """
+        self.visual_tiles = {} # {tile_key: {'coords': NES rect, 'sprite_data': ...}}
         for i, block_data in enumerate(self.visual_blocks_data):
-            coords_nes = block_data['coords'] # (x1, y1, x2, y2) in NES pixels
-            x1_nes, y1_nes, x2_nes, y2_nes = coords_nes
-            
-            # --- Culling for Drawing ---
-            # Check if the block is visible within the current camera view (NES coordinates)
-            # Camera view in NES coords: self.camera_x to self.camera_x + NES_SCREEN_WIDTH
-            if x2_nes < self.camera_x or x1_nes > self.camera_x + NES_SCREEN_WIDTH:
-                # Block is entirely off-screen horizontally.
-                # If it's collidable, we still need its collision data.
-                if block_data.get('collidable', True): # Default to collidable if not specified
-                    self.collidable_platform_coords.append(coords_nes)
-                continue # Don't draw this block
-
-            # --- If visible or partially visible, proceed to draw ---
+            x1_nes, y1_nes, x2_nes, y2_nes = block_data['coords']
             block_width_nes = x2_nes - x1_nes
             block_height_nes = y2_nes - y1_nes
             block_type = block_data['type']
             sprite_data_for_block = block_data.get('sprite_data')
-            
-            current_block_pixel_ids = [] # Canvas item IDs for this specific block instance
-
-            if sprite_data_for_block:
-                # For blocks that can be wider/taller than a single PLAYER_SIZE sprite (e.g., ground, multi-block pipes),
-                # we need to tile the base sprite (assumed to be PLAYER_SIZE x PLAYER_SIZE native, or specific like flagpole)
-                
-                # Determine the native size of the sprite tile from its definition
-                # For most blocks, this is PLAYER_SIZE x PLAYER_SIZE
-                # For special sprites like flagpole, it might be different.
-                # Let's assume sprite_data_for_block.get('native_width', PLAYER_SIZE)
-                
-                # The draw_pixel_art function scales the provided sprite to the given entity_width/height.
-                # So, for tiling, we call draw_pixel_art for each tile.
-                
-                # How many base sprite tiles fit into this block's dimensions?
-                # Base tile size is usually PLAYER_SIZE, but for things like the thin flagpole,
-                # the sprite itself is smaller. The draw_pixel_art will scale it.
-                # What we need is the size of the "unit" we are tiling.
-                # For most blocks, the unit is PLAYER_SIZE x PLAYER_SIZE.
-                # For the flagpole pole, its 'sprite_data' is for the whole thin pole.
-                # So, if block_width/height is larger than PLAYER_SIZE, we tile.
-                # If smaller (like the flagpole pole's width), we draw once, scaled.
-                
-                tile_unit_w_nes = PLAYER_SIZE 
-                tile_unit_h_nes = PLAYER_SIZE
-
-                # If the block itself is smaller than the standard tile unit (e.g. thin flagpole pole)
-                # then our "tile" is the block itself, and we draw the sprite scaled to the block's dimensions.
-                if block_width_nes < tile_unit_w_nes: tile_unit_w_nes = block_width_nes
-                if block_height_nes < tile_unit_h_nes: tile_unit_h_nes = block_height_nes
-                
-                # Number of tiles needed. Ensure at least 1.
-                num_tiles_x = max(1, int(round(block_width_nes / tile_unit_w_nes)))
-                num_tiles_y = max(1, int(round(block_height_nes / tile_unit_h_nes)))
-
-                # The actual drawing dimensions for each tile, if tiling.
-                # If not tiling (num_tiles_x/y is 1), this will be block_width/height_nes.
-                tile_draw_width_nes = block_width_nes / num_tiles_x
-                tile_draw_height_nes = block_height_nes / num_tiles_y
-                
-                for row in range(num_tiles_y):
-                    for col in range(num_tiles_x):
-                        tile_x_nes = x1_nes + (col * tile_draw_width_nes)
-                        tile_y_nes = y1_nes + (row * tile_draw_height_nes)
-                        
-                        # draw_pixel_art will take sprite_data_for_block and scale its internal art
-                        # to fit tile_draw_width_nes and tile_draw_height_nes.
-                        ids = self.draw_pixel_art(tile_x_nes, tile_y_nes, 
-                                                  tile_draw_width_nes, tile_draw_height_nes, 
-                                                  sprite_data_for_block)
-                        current_block_pixel_ids.extend(ids)
-            
-            # Store the canvas item IDs for this block instance
-            self.canvas_items_map[f"{block_type}_{i}"] = current_block_pixel_ids
-
-            # Add to collidable list if it's collidable (even if partially visible)
-            if block_data.get('collidable', True):
-                self.collidable_platform_coords.append(coords_nes)
+            if not sprite_data_for_block: continue
+
+            tile_unit_w_nes = PLAYER_SIZE
+            tile_unit_h_nes = PLAYER_SIZE
+            if block_width_nes < tile_unit_w_nes: tile_unit_w_nes = block_width_nes
+            if block_height_nes < tile_unit_h_nes: tile_unit_h_nes = block_height_nes
+
+            num_tiles_x = max(1, int(round(block_width_nes / tile_unit_w_nes)))
+            num_tiles_y = max(1, int(round(block_height_nes / tile_unit_h_nes)))
+            tile_draw_width_nes = block_width_nes / num_tiles_x
+            tile_draw_height_nes = block_height_nes / num_tiles_y
+
+            for row in range(num_tiles_y):
+                for col in range(num_tiles_x):
+                    tile_x_nes = x1_nes + (col * tile_draw_width_nes)
+                    tile_y_nes = y1_nes + (row * tile_draw_height_nes)
+                    self.visual_tiles[f"{block_type}_{i}_{row}_{col}"] = {
+                        'coords': (tile_x_nes, tile_y_nes, tile_x_nes + tile_draw_width_nes, tile_y_nes + tile_draw_height_nes),
+                        'sprite_data': sprite_data_for_block,
+                    }
+
+    def draw_visual_tile(self, tile):
+        """Creates the canvas items for one tile at its world position. Returns their IDs."""
+        x1_nes, y1_nes, x2_nes, y2_nes = tile['coords']
+        return self.draw_pixel_art(x1_nes, y1_nes, x2_nes - x1_nes, y2_nes - y1_nes, tile['sprite_data'], tags='level')
 
+    def draw_all_visual_blocks(self):
+        """
+        Retained-mode drawing: a tile's items are created once, at world coordinates, when it scrolls
+        into view, and deleted when it scrolls out. The camera itself is just the canvas view (scroll_view_to_camera).
+        """
+        self.scroll_view_to_camera()
+
+        view_left_nes = self.camera_x - PLAYER_SIZE # One tile of slack so tiles exist before they show up
+        view_right_nes = self.camera_x + NES_SCREEN_WIDTH + PLAYER_SIZE
+        created_tiles = False
+        for tile_key, tile in self.visual_tiles.items():
+            x1_nes, _, x2_nes, _ = tile['coords']
+            is_visible = not (x2_nes < view_left_nes or x1_nes > view_right_nes)
+            if is_visible:
+                if tile_key not in self.canvas_items_map:
+                    self.canvas_items_map[tile_key] = self.draw_visual_tile(tile)
+                    created_tiles = True
+            elif tile_key in self.canvas_items_map:
+                item_ids = self.canvas_items_map.pop(tile_key)
+                if item_ids: self.canvas.delete(*item_ids)
+
+        if created_tiles and self.player_pixel_ids:
+            self.canvas.tag_raise('player') # New tiles go on top, so put Mario back in front
+
+    def scroll_view_to_camera(self):
+        """One xview_moveto per camera change, no matter how many tiles are on the canvas."""
+        if self.camera_x != self.drawn_camera_x:
+            self.canvas.xview_moveto(self.camera_x * self.scale / self.scroll_width_canvas)
+            self.drawn_camera_x = self.camera_x
 
     def update_player_visuals(self):
-        """Deletes old player pixels and redraws them at the new position."""
-        for pixel_id in self.player_pixel_ids:
-            self.canvas.delete(pixel_id)
-        self.player_pixel_ids = [] # Clear the list
-
-        # Redraw the player using the pixel art function
-        # Player's (x,y) is top-left in NES coordinates.
-        # PLAYER_SIZE is the dimension for the player sprite in NES coordinates.
-        self.player_pixel_ids = self.draw_pixel_art(
-            self.player_x, self.player_y,
-            PLAYER_SIZE, PLAYER_SIZE, 
-            SMALL_MARIO_STANDING_DATA # Current sprite for player
-        )
+        """Mario's pixel items are created once and then just moved, one canvas.move per frame."""
+        player_canvas_x = self.player_x * self.scale
+        player_canvas_y = self.player_y * self.scale
+        if not self.player_pixel_ids:
+            self.player_pixel_ids = self.draw_pixel_art(
+                self.player_x, self.player_y,
+                PLAYER_SIZE, PLAYER_SIZE,
+                SMALL_MARIO_STANDING_DATA, tags='player'
+            )
+        else:
+            shift_x = player_canvas_x - self.drawn_player_canvas_pos[0]
+            shift_y = player_canvas_y - self.drawn_player_canvas_pos[1]
+            if shift_x or shift_y:
+                self.canvas.move('player', shift_x, shift_y)
+        self.drawn_player_canvas_pos = (player_canvas_x, player_canvas_y)
 
     def bind_keys(self):
         self.focus_set() # Ensure the game window has focus to receive key events
@@ -866,21 +888,16 @@ class MarioGameWindow(tk.Toplevel):
     def game_loop(self):
         try:
             if not self.winfo_exists(): return # Window has been closed
-            
-            start_time = time.perf_counter()
 
+            self.frame_pacer.frame_started(time.perf_counter())
             self.handle_input() 
             self.apply_gravity_and_movement() # Includes physics and collision
             
             # Drawing needs to happen after all position updates and camera updates
-            self.draw_all_visual_blocks() # Redraws static elements based on camera (and rebuilds collidables)
+            self.draw_all_visual_blocks() # Scrolls the view to the camera and streams tiles in and out
             self.update_player_visuals()  # Redraws player at new position
 
-            end_time = time.perf_counter()
-            process_time_ms = (end_time - start_time) * 1000
-            delay_ms = max(1, DELAY - int(process_time_ms)) # Ensure at least 1ms delay
-
-            self.after(delay_ms, self.game_loop) # Schedule next frame
+            self.frame_pacer.schedule(self, self.game_loop)
         except tk.TclError as e:
             # This can happen if widgets are accessed after the window is destroyed.
             print(f"Game window TclError (likely closed): {e}")
@@ -0,0 +1,159 @@
+"""
+Frame pacing for the CATOS Mario games: frames due on a fixed grid of perf_counter deadlines, not "DELAY minus
+however long this frame took". Every game's game_loop shares this one FramePacer.
+
+    self.frame_pacer = FramePacer(FPS)                    # in __init__, before the first game_loop()
+    self.frame_pacer.frame_started(time.perf_counter())  # first thing in game_loop
+    self.frame_pacer.schedule(self, self.game_loop)      # last thing in game_loop
+"""
+import collections
+import statistics
+import threading
+import time
+import tkinter as tk
+
+FRAME_PACER_LATE_MS = 1.0 # A frame that starts more than this past its deadline counts as late (and this far before as early)
+FRAME_PACER_WINDOW_FRAMES = 120 # Recent frame intervals kept for the overlay
+FRAME_PACER_OVERSLEEP_SAMPLES = 31 # Recent after() oversleeps; their median is how early we ask to be woken
+FRAME_PACER_SPIN_SECONDS = 0.0015 # With spin=True: woken at most this long before the deadline, spin the rest instead of sleeping
+FRAME_PACER_EVENT = "<<CatosFrameDue>>" # The timer thread wakes the Tk loop with this
+
+class FramePacer:
+    """
+    Schedules frames against absolute deadlines on the perf_counter clock, instead of "DELAY minus however long this
+    frame took". Each deadline is exactly one period after the last, so after()'s whole milliseconds, Tk's event
+    handling and oversleep can't pile up into drift: a frame that woke late just waits less for the next one.
+    after() is asked to wake early by as much as it has been oversleeping lately (the median, so one hiccup doesn't
+    throw it); woken more than FRAME_PACER_LATE_MS early, it goes back to sleep, otherwise the frame just starts.
+    A frame that would start a whole period late is dropped (counted in missed_frames) and the deadlines skip ahead
+    instead of bunching up.
+    spin=True is for when the 1 ms target isn't close enough: the last FRAME_PACER_SPIN_SECONDS are busy-waited away
+    to land right on the deadline, at the cost of a core (the Tk thread's, unless timer_thread is on too).
+    With timer_thread=True a helper thread sleeps up to each deadline and wakes the Tk loop with a virtual event, for
+    wakes closer than after()'s millisecond.
+    """
+    def __init__(self, fps=60, timer_thread=False, spin=False, window_frames=FRAME_PACER_WINDOW_FRAMES):
+        self.period = 1.0 / fps
+        self.timer_thread = timer_thread
+        self.spin = spin
+        self.intervals_ms = collections.deque(maxlen=window_frames)
+        self.oversleeps = collections.deque(maxlen=FRAME_PACER_OVERSLEEP_SAMPLES)
+        self.reset()
+        self._wake_event = None # Each timer thread gets its own wake and stop events, so a stopped one stays stopped
+        self._stop_event = None
+        self._thread = None
+        self._callback = None
+
+    def reset(self, now=None):
+        """Starts pacing afresh: the next frame is due right away and nothing before now counts against us."""
+        self.deadline = time.perf_counter() if now is None else now # Due time of the frame that's running (or about to)
+        self.requested_wake_time = None
+        self.last_frame_start = None
+        self.intervals_ms.clear()
+        self.frames = 0
+        self.late_frames = 0
+        self.early_frames = 0
+        self.missed_frames = 0
+        self.worst_lateness_ms = 0.0
+
+    def frame_started(self, now):
+        """Call first thing in every frame. Notes how far off the deadline (and the last frame) it started."""
+        if self.last_frame_start is not None: self.intervals_ms.append((now - self.last_frame_start) * 1000)
+        self.last_frame_start = now
+        lateness_ms = (now - self.deadline) * 1000
+        self.frames += 1
+        if lateness_ms > FRAME_PACER_LATE_MS: self.late_frames += 1
+        elif lateness_ms < -FRAME_PACER_LATE_MS: self.early_frames += 1
+        self.worst_lateness_ms = max(self.worst_lateness_ms, lateness_ms)
+
+    def schedule(self, widget, callback):
+        """Call last thing in every frame: moves the deadline on one period and has `callback` run at it."""
+        self.deadline += self.period
+        now = time.perf_counter()
+        if now - self.deadline >= self.period: # Already a whole frame behind: drop those frames, don't rush through them
+            skipped = int((now - self.deadline) / self.period)
+            self.deadline += skipped * self.period
+            self.missed_frames += skipped
+        if self.timer_thread:
+            self._arm_timer_thread(widget, callback)
+            return
+        self._sleep_until_deadline(widget, callback, now)
+
+    def _sleep_until_deadline(self, widget, callback, now):
+        delay_ms = max(0, int((self.deadline - now - self.oversleep_seconds) * 1000)) # Rounded down: early, not late
+        self.requested_wake_time = now + delay_ms / 1000
+        widget.after(delay_ms, self._finish_wait, widget, callback)
+
+    @property
+    def oversleep_seconds(self):
+        return statistics.median(self.oversleeps) if self.oversleeps else 0.0
+
+    def _finish_wait(self, widget, callback):
+        now = time.perf_counter()
+        self.oversleeps.append(now - self.requested_wake_time)
+        close_enough = FRAME_PACER_SPIN_SECONDS if self.spin else FRAME_PACER_LATE_MS / 1000
+        if self.deadline - now > close_enough: # Rounding and the oversleep guess woke us too soon, nap again
+            self._sleep_until_deadline(widget, callback, now)
+            return
+        if self.spin:
+            while time.perf_counter() < self.deadline: pass # Holds the Tk thread, which is what spin=True asked for
+        callback()
+
+    def _arm_timer_thread(self, widget, callback):
+        self._callback = callback
+        if self._thread is None:
+            widget.bind(FRAME_PACER_EVENT, lambda event: self._callback())
+            self._wake_event, self._stop_event = threading.Event(), threading.Event()
+            self._thread = threading.Thread(target=self._run_timer_thread, args=(widget, self._wake_event, self._stop_event),
+                                            name="FramePacer", daemon=True)
+            self._thread.start()
+        self._wake_event.set()
+
+    def _run_timer_thread(self, widget, wake_event, stop_event):
+        while True:
+            wake_event.wait()
+            wake_event.clear()
+            if stop_event.is_set(): return
+            nap = self.deadline - time.perf_counter() - (FRAME_PACER_SPIN_SECONDS if self.spin else 0.0)
+            if nap > 0 and stop_event.wait(nap): return
+            while self.spin and time.perf_counter() < self.deadline:
+                if stop_event.is_set(): return
+                time.sleep(0) # Spin the last stretch, but let the GIL go
+            if stop_event.is_set(): return
+            try:
+                widget.event_generate(FRAME_PACER_EVENT, when='tail') # tkinter hands this to the Tk thread for us
+            except (tk.TclError, RuntimeError): # Window gone, or Tk's loop isn't running anymore
+                return
+
+    def stop(self):
+        """
+        Stops the timer thread, if there is one. Not joined: it may be waiting on the Tk thread that's calling us.
+        Its stop event is its own, so a schedule() that starts a new thread can't un-stop it.
+        """
+        if self._thread is None: return
+        self._stop_event.set()
+        self._wake_event.set()
+        self._thread = self._wake_event = self._stop_event = None
+
+    def summary(self):
+        ordered = sorted(self.intervals_ms)
+        def percentile(fraction): return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+        target_ms = self.period * 1000
+        return {
+            "target_interval_ms": target_ms,
+            "median_interval_ms": percentile(0.5),
+            "p1_interval_ms": percentile(0.01),
+            "p99_interval_ms": percentile(0.99),
+            "within_1ms_percent": 100 * sum(abs(interval - target_ms) <= 1.0 for interval in ordered) / len(ordered) if ordered else 0.0,
+            "frames": self.frames,
+            "late_frames": self.late_frames,
+            "early_frames": self.early_frames,
+            "missed_frames": self.missed_frames,
+            "worst_lateness_ms": self.worst_lateness_ms,
+            "oversleep_ms": self.oversleep_seconds * 1000,
+        }
+
+    def report_lines(self):
+        stats = self.summary()
+        return [f"PACE {stats['median_interval_ms']:.2f} MS ({stats['p1_interval_ms']:.2f}-{stats['p99_interval_ms']:.2f}), "
+                f"{self.late_frames} LATE {self.early_frames} EARLY {self.missed_frames} MISSED"]
@@ -0,0 +1,40 @@
+"""BatchMarioSimulation must play out exactly like one MarioSimulation per agent. No display needed."""
+import pytest
+
+import DELTAMARIO4K0 as game
+import mario_bench
+
+pytestmark = pytest.mark.skipif(not game.NUMPY_ENABLED, reason="BatchMarioSimulation needs numpy")
+
+
+def test_batch_matches_scalar_on_1_1():
+    assert mario_bench.check_batch_matches_scalar(agent_count=16, ticks=600) == 16 * 600
+
+
+def test_batch_matches_scalar_with_checkpoints_camera_locks_and_pipes():
+    triggers = mario_bench.scattered_triggers(200)
+    assert mario_bench.check_batch_matches_scalar(agent_count=16, ticks=600, seed=3, level_triggers=triggers) == 16 * 600
+
+
+def test_batch_events_match_scalar_events():
+    tiles = game.build_smb_1_1_tiles()
+    inputs = mario_bench.random_agent_inputs(4, 300, seed=5)
+    batch = game.BatchMarioSimulation(tiles, 4)
+    scalars = [game.MarioSimulation(tiles) for _ in range(4)]
+    for tick_inputs in inputs:
+        batch_events = batch.step(tick_inputs)
+        for agent, simulation in enumerate(scalars):
+            events = simulation.step(int(tick_inputs[agent]))
+            assert {name for name, mask in batch_events.items() if mask[agent]} == set(events)
+
+
+def test_mario_runs_past_1_1_width_on_a_wider_level():
+    tiles = mario_bench.synthetic_level_tiles(400)
+    simulation = game.MarioSimulation(tiles)
+    batch = game.BatchMarioSimulation(tiles, 1)
+    simulation.player_y = batch.player_y[0] = game.NES_SCREEN_HEIGHT - 3 * game.PLAYER_SIZE # On top of its two ground rows
+    for _ in range(3000):
+        simulation.step(game.INPUT_RIGHT)
+        batch.step([game.INPUT_RIGHT])
+    assert simulation.player_x > game.WORLD_WIDTH_NES
+    assert batch.player_x[0] == simulation.player_x
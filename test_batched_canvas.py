@@ -0,0 +1,72 @@
+"""BatchedCanvas must leave the canvas exactly as the same calls made one by one would. Needs a display."""
+import tkinter as tk
+
+import pytest
+
+import DELTAMARIO4K0 as game
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+def mixed_calls(canvas):
+    items = [canvas.create_rectangle(0, 0, 10, 10, fill="white", tags=("box",)) for _ in range(4)]
+    canvas.itemconfigure(items[0], fill="red")
+    canvas.itemconfigure("all", fill="blue") # Has to win over the red queued before it...
+    canvas.itemconfigure(items[0], width=2) # ...even though item 0 gets configured again after
+    canvas.itemconfigure(items[3], tags=("other",))
+    canvas.coords("box", 0, 0, 1, 1) # items[3] isn't in "box" any more
+    canvas.itemconfigure(items[3], tags=("box", "gone"))
+    canvas.delete("gone") # ...and only is again by the time this runs
+    canvas.coords(items[1], 5, 5, 15, 15)
+    canvas.move("box", 3, 0)
+    canvas.coords(items[1], 20, 20, 30, 30) # Must land after the move, not before it
+    canvas.move(items[2], 1, 1)
+    canvas.move(items[2], 1, 1)
+    survivor = canvas.create_oval(0, 0, 4, 4, fill="green")
+    canvas.itemconfigure(survivor, fill="yellow")
+    canvas.move(survivor, 2, 2)
+    canvas.itemconfigure(survivor, outline="black")
+    canvas.lift(survivor)
+    canvas.xview_moveto(0.5)
+    canvas.xview_moveto(0.25)
+
+
+def canvas_state(canvas):
+    return [(canvas.coords(item), canvas.itemcget(item, "fill"), canvas.itemcget(item, "width"),
+             canvas.itemcget(item, "outline"), canvas.gettags(item)) for item in canvas.find_all()]
+
+
+def test_flushed_calls_match_unbatched_canvas(root):
+    plain = tk.Canvas(root, width=100, height=100, scrollregion=(0, 0, 400, 100))
+    batched = game.BatchedCanvas(root, width=100, height=100, scrollregion=(0, 0, 400, 100))
+    mixed_calls(plain)
+    mixed_calls(batched)
+    assert batched.flush() > 0
+    assert canvas_state(batched) == canvas_state(plain)
+    assert batched.xview() == plain.xview()
+
+
+def test_repeated_calls_on_one_item_fold_into_one_command(root):
+    canvas = game.BatchedCanvas(root)
+    item = canvas.create_rectangle(0, 0, 10, 10)
+    for x in range(5):
+        canvas.coords(item, x, 0, x + 10, 10)
+        canvas.itemconfigure(item, fill="red")
+    canvas.move(item, 1, 0)
+    canvas.move(item, 1, 0)
+    assert canvas.flush() == 11 # coords and itemconfigure alternate, so neither folds; the two moves do
+    for x in range(5):
+        canvas.coords(item, x, 0, x + 10, 10)
+    canvas.itemconfigure(item, fill="red")
+    canvas.itemconfigure(item, width=3)
+    assert canvas.flush() == 2
+    assert (canvas.itemcget(item, "fill"), canvas.itemcget(item, "width")) == ("red", "3.0")
@@ -0,0 +1,115 @@
+"""FramePacer deadlines and late/early/missed accounting, on a fake clock and a fake after(). No display needed."""
+import threading
+
+import pytest
+
+import frame_pacing
+
+PERIOD = 1 / 60
+
+
+class FakeClock:
+    def __init__(self): self.now = 100.0
+    def perf_counter(self): return self.now
+
+
+class FakeWidget:
+    """Records after() calls instead of running a Tk loop."""
+    def __init__(self): self.scheduled = []
+    def after(self, delay_ms, func, *args): self.scheduled.append((delay_ms, func, args))
+
+    def fire(self):
+        _, func, args = self.scheduled.pop(0)
+        func(*args)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(frame_pacing.time, "perf_counter", clock.perf_counter)
+    return clock
+
+
+def test_deadlines_are_one_exact_period_apart(clock):
+    pacer, widget, frames = frame_pacing.FramePacer(60), FakeWidget(), []
+    pacer.reset()
+    start = pacer.deadline
+    for frame in range(5):
+        pacer.frame_started(clock.now)
+        frames.append(clock.now)
+        clock.now += 0.004 # The frame's work
+        pacer.schedule(widget, lambda: None)
+        assert pacer.deadline == pytest.approx(start + (frame + 1) * PERIOD)
+        assert widget.scheduled[-1][0] == int((pacer.deadline - clock.now) * 1000) # Whole ms, rounded down
+        clock.now = pacer.deadline
+        widget.fire()
+    assert pacer.late_frames == pacer.early_frames == pacer.missed_frames == 0
+
+
+def test_early_wake_goes_back_to_sleep_instead_of_starting_the_frame(clock):
+    pacer, widget, started = frame_pacing.FramePacer(60), FakeWidget(), []
+    pacer.reset()
+    pacer.schedule(widget, lambda: started.append(clock.now))
+    clock.now = pacer.deadline - 0.005 # after() fired well before the deadline
+    widget.fire()
+    assert started == [] and len(widget.scheduled) == 1
+    clock.now = pacer.deadline
+    widget.fire()
+    assert started == [pacer.deadline]
+
+
+def test_wake_within_a_millisecond_starts_the_frame_without_spinning(clock):
+    pacer, widget, started = frame_pacing.FramePacer(60), FakeWidget(), []
+    pacer.reset()
+    pacer.schedule(widget, lambda: started.append(clock.now))
+    clock.now = pacer.deadline - 0.0005 # The fake clock never moves on its own: a spin would never end
+    widget.fire()
+    assert started == [pacer.deadline - 0.0005] and widget.scheduled == []
+
+
+def test_spin_lands_on_the_deadline(clock, monkeypatch):
+    pacer, widget, started = frame_pacing.FramePacer(60, spin=True), FakeWidget(), []
+    pacer.reset()
+    pacer.schedule(widget, lambda: started.append(clock.now))
+    clock.now = pacer.deadline - 0.001
+    def ticking_clock():
+        clock.now += 0.0001
+        return clock.now
+    monkeypatch.setattr(frame_pacing.time, "perf_counter", ticking_clock)
+    widget.fire()
+    assert started and pacer.deadline <= started[0] < pacer.deadline + 0.0002
+
+
+def test_late_early_and_missed_frames_are_counted(clock):
+    pacer, widget = frame_pacing.FramePacer(60), FakeWidget()
+    pacer.reset()
+    pacer.frame_started(clock.now + 0.003)
+    pacer.frame_started(clock.now - 0.003)
+    pacer.frame_started(clock.now + 0.0005)
+    assert (pacer.frames, pacer.late_frames, pacer.early_frames) == (3, 1, 1)
+
+    clock.now = pacer.deadline + 3.5 * PERIOD # A hitch: three whole frames go by
+    pacer.schedule(widget, lambda: None)
+    assert pacer.missed_frames == 2
+    assert 0 <= clock.now - pacer.deadline < PERIOD # The grid skipped ahead: less than a frame behind, not three
+    summary = pacer.summary()
+    assert (summary["late_frames"], summary["early_frames"], summary["missed_frames"]) == (1, 1, 2)
+
+
+def test_stopped_timer_thread_stays_stopped_after_a_restart():
+    fired_from = set()
+    class ThreadWidget:
+        def bind(self, *args): pass
+        def event_generate(self, *args, **kwargs): fired_from.add(threading.get_ident())
+    pacer = frame_pacing.FramePacer(60, timer_thread=True)
+    pacer.reset()
+    pacer.schedule(ThreadWidget(), lambda: None)
+    old_thread = pacer._thread
+    pacer.stop()
+    pacer.schedule(ThreadWidget(), lambda: None) # Restarted right away, before the old thread has even woken up
+    new_thread = pacer._thread
+    old_thread.join(1.0)
+    pacer.stop()
+    new_thread.join(1.0)
+    assert not old_thread.is_alive() and not new_thread.is_alive()
+    assert old_thread.ident not in fired_from
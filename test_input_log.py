@@ -0,0 +1,50 @@
+"""InputLog round trips and level fingerprints. No display needed."""
+import pytest
+
+import DELTAMARIO4K0 as game
+import mario_bench
+
+
+def recorded_run(ticks=600):
+    tiles = game.build_smb_1_1_tiles()
+    played = game.MarioSimulation(tiles)
+    input_log = game.InputLog(game.level_fingerprint(tiles), played.simulation_hz)
+    for input_bits in mario_bench.scripted_inputs(ticks):
+        input_log.record(input_bits)
+        played.step(input_bits)
+    return tiles, played, input_log
+
+
+def test_round_trip_through_bytes_and_disk(tmp_path):
+    _, _, input_log = recorded_run()
+    loaded = game.InputLog.from_bytes(input_log.to_bytes())
+    assert (loaded.fingerprint, loaded.simulation_hz, loaded.inputs) == (input_log.fingerprint, input_log.simulation_hz, input_log.inputs)
+    path = tmp_path / "run.meow"
+    input_log.save(path)
+    assert game.InputLog.load(path).inputs == input_log.inputs
+
+
+def test_replay_ends_where_the_recording_did():
+    tiles, played, input_log = recorded_run()
+    replayed = game.replay_input_log(game.InputLog.from_bytes(input_log.to_bytes()), tiles)
+    for field in ("player_x", "player_y", "player_vy", "camera_x", "score", "game_won", "tick_count"):
+        assert getattr(replayed, field) == getattr(played, field)
+
+
+def test_fingerprint_mismatch_is_refused():
+    tiles, _, input_log = recorded_run(10)
+    other_tiles = tiles[:-1]
+    with pytest.raises(ValueError):
+        input_log.check_level(other_tiles)
+    with pytest.raises(ValueError):
+        game.replay_input_log(input_log, other_tiles)
+    extra_triggers = game.level_trigger_volumes(tiles) + [game.trigger_volume('checkpoint', (0, 0, 16, 16), respawn_nes=(0, 0))]
+    with pytest.raises(ValueError):
+        input_log.check_level(tiles, extra_triggers)
+    input_log.check_level(tiles) # Same level, same triggers: fine
+
+
+@pytest.mark.parametrize("data", [b"", b"WOOF" + bytes(40), game.InputLog(bytes(16), 60, b"\x01\x02").to_bytes()[:-1]])
+def test_bad_log_bytes_raise_value_error(data):
+    with pytest.raises(ValueError):
+        game.InputLog.from_bytes(data)
@@ -0,0 +1,61 @@
+"""KeyboardInput: auto-repeat coalescing, taps and release timing. No display needed."""
+import DELTAMARIO4K0 as game
+import mario_bench
+
+
+def test_auto_repeat_storm_never_lets_the_key_up():
+    keyboard = game.KeyboardInput()
+    events = mario_bench.auto_repeat_storm(3.0)
+    event_index = 0
+    for tick in range(1, 3 * game.SIMULATION_HZ):
+        tick_time = tick / game.SIMULATION_HZ
+        while event_index < len(events) and events[event_index][0] <= tick_time:
+            keyboard.key_event(*events[event_index][1:], timestamp=events[event_index][0])
+            event_index += 1
+        assert keyboard.snapshot(tick_time) & game.INPUT_RIGHT, f"Right flickered up at {tick_time:.3f} s"
+    assert keyboard.coalesced_pairs > 0
+
+
+def test_tap_between_two_ticks_is_held_for_one_tick():
+    keyboard = game.KeyboardInput()
+    keyboard.key_event("space", True, timestamp=1.000)
+    keyboard.key_event("space", False, timestamp=1.005)
+    assert keyboard.snapshot(1.008) & game.INPUT_JUMP
+    assert not keyboard.snapshot(1.025) & game.INPUT_JUMP
+
+
+def test_quick_release_lands_on_the_next_tick():
+    keyboard = game.KeyboardInput()
+    keyboard.key_event("Right", True, timestamp=1.0)
+    assert keyboard.snapshot(1.001) & game.INPUT_RIGHT
+    keyboard.key_event("Right", False, timestamp=1.050) # Held far shorter than any auto-repeat delay
+    assert not keyboard.snapshot(1.051) & game.INPUT_RIGHT
+
+
+def test_long_hold_release_waits_out_the_coalesce_window():
+    keyboard = game.KeyboardInput()
+    keyboard.key_event("Right", True, timestamp=1.0)
+    keyboard.snapshot(1.001)
+    keyboard.key_event("Right", False, timestamp=2.0) # Could be auto-repeat with its press still on the way
+    assert keyboard.snapshot(2.001) & game.INPUT_RIGHT
+    assert not keyboard.snapshot(2.0 + game.AUTO_REPEAT_COALESCE_SECONDS + 0.001) & game.INPUT_RIGHT
+
+
+def test_every_acted_on_event_is_handed_to_the_latency_tracker():
+    keyboard = game.KeyboardInput()
+    keyboard.key_event("Right", True, timestamp=1.0)
+    keyboard.snapshot(1.001)
+    keyboard.key_event("Right", False, timestamp=2.0)
+    keyboard.snapshot(2.001) # Release held back: it might be auto-repeat
+    keyboard.key_event("Right", True, timestamp=2.5) # Too late to be, so release and press both count
+    assert keyboard.snapshot(2.501) & game.INPUT_RIGHT
+    assert keyboard.take_consumed_event_times() == [1.0, 2.0, 2.5]
+    assert keyboard.coalesced_pairs == 0
+
+
+def test_full_ring_drops_the_oldest_events():
+    keyboard = game.KeyboardInput(ring_size=4)
+    for index in range(6):
+        keyboard.key_event("Left", index % 2 == 0, timestamp=index * 0.1)
+    assert keyboard.dropped_events == 2
+    assert len(keyboard.events) == 4
@@ -0,0 +1,97 @@
+"""TriggerSystem callbacks and the trigger volumes MarioSimulation acts on. No display needed."""
+import pytest
+
+import DELTAMARIO4K0 as game
+
+PS = game.PLAYER_SIZE
+
+
+def recording_system(volumes):
+    triggers, calls = game.TriggerSystem(volumes), []
+    for kind in game.TRIGGER_KINDS:
+        triggers.on(kind, enter=lambda volume: calls.append(("enter", volume["name"])),
+                    stay=lambda volume: calls.append(("stay", volume["name"])),
+                    exit=lambda volume: calls.append(("exit", volume["name"])))
+    return triggers, calls
+
+
+def box_at(x, y=0):
+    return (x, y, x + PS, y + PS)
+
+
+def test_enter_stay_exit_order():
+    volumes = [game.trigger_volume("checkpoint", (0, 0, 64, 16), respawn_nes=(0, 0), name="a"),
+               game.trigger_volume("camera_lock", (32, 0, 96, 16), camera_range_nes=(0, 0), name="b")]
+    triggers, calls = recording_system(volumes)
+    triggers.update(*box_at(10))
+    assert calls == [("enter", "a")]
+    calls.clear()
+    triggers.update(*box_at(40)) # In both now: a stays, b enters, in level order
+    assert calls == [("stay", "a"), ("enter", "b")]
+    calls.clear()
+    triggers.update(*box_at(70)) # Left a: exits come before anything else
+    assert calls == [("exit", "a"), ("stay", "b")]
+    calls.clear()
+    triggers.update(*box_at(200))
+    assert calls == [("exit", "b")]
+    calls.clear()
+    triggers.update(*box_at(300))
+    assert calls == []
+
+
+def test_touching_edges_do_not_count():
+    triggers, calls = recording_system([game.trigger_volume("goal", (16, 0, 32, 16), name="goal")])
+    triggers.update(*box_at(0)) # Flush against the left edge
+    triggers.update(*box_at(32)) # Flush against the right edge
+    assert calls == []
+
+
+def test_far_away_triggers_are_never_looked_at():
+    far = [game.trigger_volume("pipe", box_at(1000 + index * 32), destination_nes=(0, 0), name=index) for index in range(300)]
+    triggers, calls = recording_system(far)
+    assert triggers.grid.query_ids(*box_at(10)) == []
+    triggers.update(*box_at(10))
+    assert calls == []
+
+
+def test_unknown_kind_or_missing_parameter_is_refused():
+    with pytest.raises(ValueError):
+        game.trigger_volume("lava", box_at(0))
+    with pytest.raises(ValueError):
+        game.trigger_volume("pipe", box_at(0))
+
+
+def test_simulation_wins_at_the_flagpole():
+    simulation = game.MarioSimulation(game.build_smb_1_1_tiles())
+    simulation.player_x, simulation.player_y = 141 * PS, game.NES_SCREEN_HEIGHT - 10 * PS # On top of the staircase
+    events = []
+    for _ in range(200):
+        events += simulation.step(game.INPUT_RIGHT)
+    assert "won" in events and simulation.game_won
+
+
+def test_pipe_checkpoint_and_camera_lock_in_the_simulation():
+    tiles = game.build_smb_1_1_tiles()
+    triggers = game.level_trigger_volumes(tiles) + [
+        game.trigger_volume("checkpoint", (80, 0, 96, 240), respawn_nes=(400, 100)),
+        game.trigger_volume("camera_lock", (96, 0, 112, 240), camera_range_nes=(0, 0)),
+        game.trigger_volume("pipe", (128, 0, 144, 240), destination_nes=(600, 100)),
+    ]
+    simulation = game.MarioSimulation(tiles, level_triggers=triggers)
+    events = []
+    while "pipe" not in events and simulation.tick_count < 200:
+        events = simulation.step(game.INPUT_RIGHT)
+        if simulation.player_x + PS > 96 and simulation.player_x < 112: assert simulation.camera_x == 0
+    assert (simulation.player_x, simulation.player_y) == (600, 100)
+    assert simulation.respawn_point == (400, 100)
+
+
+def test_falling_below_the_death_zone_still_respawns():
+    tiles = game.build_smb_1_1_tiles()
+    triggers = game.level_trigger_volumes(tiles) + [game.trigger_volume("pipe", (128, 0, 144, 240), destination_nes=(600, game.WORLD_FLOOR_NES + 50))]
+    simulation = game.MarioSimulation(tiles, level_triggers=triggers)
+    events = []
+    for _ in range(200):
+        events += simulation.step(game.INPUT_RIGHT)
+    assert events.count("pipe") >= 1 and events.count("fell") >= 1
+    assert simulation.player_y <= game.NES_SCREEN_HEIGHT